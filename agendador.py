@@ -0,0 +1,398 @@
+"""
+Agendador de trabalhos pesados (simulações) compartilhado pelas sessões do app.
+
+Sem ele, cada sessão que roda um ensemble abre o seu próprio pool com um processo
+por CPU: poucas sessões ao mesmo tempo já disputam o servidor inteiro. Aqui há um
+único pool limitado de processos para todas as sessões:
+
+- cada sessão tem a sua fila; um processo livre pega o próximo trabalho da sessão
+  com menos trabalhos em execução (empate: a que foi atendida há mais tempo), então
+  uma sessão com muitos trabalhos não atrasa as outras indefinidamente;
+- `posicao()` informa quantos trabalhos começam antes de um trabalho na fila;
+- cada trabalho pode ter um tempo limite de execução e pode ser cancelado, mesmo
+  rodando: o processo dele é encerrado e substituído;
+- o resultado volta num `concurrent.futures.Future` do próprio trabalho, que só a
+  sessão que o submeteu conhece.
+
+Os processos são persistentes ("spawn", como em ensemble.py) e recebem os trabalhos
+por um Pipe; a função e os argumentos precisam ser serializáveis (funções de módulo).
+Com `importar_main=False`, eles nascem sem o módulo __main__ do processo principal:
+no Streamlit, ele é o script da página, que o "spawn" executaria de novo em cada processo.
+
+Exemplo:
+    agendador = AgendadorSimulacoes(max_processos=2)
+    trabalho = agendador.submeter("sessao-1", executar_replicacao, config, 100, 42, timeout=60)
+    agendador.posicao(trabalho)      # 0 = é o próximo (ou já está rodando)
+    trabalho.futuro.result()         # ou agendador.cancelar(trabalho)
+
+O teste com várias sessões concorrentes fica em verificar_agendador.py.
+"""
+import itertools
+import multiprocessing
+import os
+import sys
+import threading
+import time
+import types
+from collections import deque
+from concurrent.futures import CancelledError, as_completed
+from concurrent.futures import Future
+from multiprocessing.connection import wait as aguardar_conexoes
+
+# Intervalo máximo entre duas verificações do laço de despacho (novos trabalhos, cancelamentos, prazos)
+INTERVALO_DESPACHO = 0.05
+
+
+class FilaCheia(Exception):
+    """A sessão já tem o máximo de trabalhos esperando na fila."""
+
+
+def _laco_processo(conexao):
+    """Laço de cada processo do pool: recebe (funcao, args, kwargs), devolve (ok, resultado ou erro)."""
+    while True:
+        try:
+            pedido = conexao.recv()
+        except EOFError:  # O processo principal terminou
+            return
+        if pedido is None:
+            return
+        funcao, args, kwargs = pedido
+        try:
+            resposta = (True, funcao(*args, **kwargs))
+        except Exception as erro:
+            resposta = (False, erro)
+        try:
+            conexao.send(resposta)
+        except Exception as erro:  # Resultado ou exceção que não serializa
+            conexao.send((False, RuntimeError(f"Resultado não serializável: {erro!r}")))
+
+
+class _Processo:
+    """Um processo do pool e o trabalho que ele está executando (ou None)."""
+
+    def __init__(self, contexto, importar_main=True):
+        while True:
+            self.conexao, filho = contexto.Pipe()
+            self.processo = contexto.Process(target=_laco_processo, args=(filho,), daemon=True)
+            if importar_main:
+                self.processo.start()
+                break
+            if self._iniciar_sem_main():
+                break
+            # Um script começou durante o start: o filho pode ter recebido a página como __main__
+            self.processo.terminate()
+            self.processo.join()
+            self.conexao.close()
+            filho.close()
+        filho.close()
+        self.trabalho = None
+
+    def _iniciar_sem_main(self):
+        """
+        Inicia o processo com um __main__ vazio, sem arquivo (o "spawn" reexecuta no filho o
+        arquivo do __main__; no Streamlit, o script da página, que o ScriptRunner instala como
+        __main__ a cada execução). Devolve False se outro __main__ foi instalado durante o start.
+        """
+        principal = sys.modules["__main__"]
+        sys.modules["__main__"] = vazio = types.ModuleType("__main__")
+        try:
+            self.processo.start()
+        finally:
+            # Ninguém mais instala `vazio`: se ele continua lá, foi o __main__ durante todo o start
+            intacto = sys.modules["__main__"] is vazio
+            if intacto:
+                sys.modules["__main__"] = principal
+        return intacto
+
+    def encerrar(self, forcar=False):
+        if forcar:
+            self.processo.terminate()
+        else:
+            try:
+                self.conexao.send(None)
+            except OSError:
+                pass
+        self.processo.join(5)
+        self.conexao.close()
+
+
+class Trabalho:
+    """Um trabalho submetido: a sessão dona, a chamada, o prazo e o Future com o resultado."""
+
+    def __init__(self, id_trabalho, sessao, funcao, args, kwargs, timeout):
+        self.id = id_trabalho
+        self.sessao = sessao
+        self.funcao = funcao
+        self.args = args
+        self.kwargs = kwargs
+        self.timeout = timeout
+        self.futuro = Future()
+        self.submetido_em = time.monotonic()
+        self.iniciado_em = None
+        self.concluido_em = None
+        self._cancelar = False  # Pedido de cancelamento de um trabalho já em execução
+
+    @property
+    def estado(self):
+        if self.futuro.cancelled():
+            return "cancelado"
+        if self.futuro.done():
+            erro = self.futuro.exception()
+            if erro is None:
+                return "concluido"
+            return {CancelledError: "cancelado", TimeoutError: "expirado"}.get(type(erro), "erro")
+        return "executando" if self.iniciado_em is not None else "na_fila"
+
+    def resultado(self, timeout=None):
+        return self.futuro.result(timeout)
+
+
+def _cancelar_na_fila(trabalho):
+    trabalho.futuro.cancel()
+    # Como nos executores de concurrent.futures: sem isto, as_completed/wait não acordam
+    trabalho.futuro.set_running_or_notify_cancel()
+
+
+class AgendadorSimulacoes:
+    """
+    Pool limitado de processos com filas por sessão, divisão justa entre sessões,
+    tempo limite e cancelamento.
+
+    Args:
+        max_processos: processos simultâneos (padrão: nº de CPUs)
+        max_na_fila_por_sessao: trabalhos esperando por sessão antes de `submeter`
+            levantar FilaCheia (None = sem limite)
+        timeout_padrao: tempo limite de execução de cada trabalho, em segundos (None = sem limite)
+        importar_main: se os processos carregam o __main__ do processo principal, como o
+            "spawn" faz (necessário para trabalhos definidos nele). No Streamlit use False:
+            o __main__ é o script da página e os trabalhos precisam ser funções de módulo
+    """
+
+    def __init__(self, max_processos=None, max_na_fila_por_sessao=None, timeout_padrao=None, importar_main=True):
+        self.max_processos = max_processos or os.cpu_count() or 1
+        self.importar_main = importar_main
+        self.max_na_fila_por_sessao = max_na_fila_por_sessao
+        self.timeout_padrao = timeout_padrao
+        # "spawn": o processo do Streamlit tem várias threads, e fork com threads pode travar
+        self._contexto = multiprocessing.get_context("spawn")
+        self._processos = []
+        self._filas = {}  # sessão -> deque de Trabalho (ordem de chegada)
+        self._executando = {}  # sessão -> nº de trabalhos em execução
+        self._ultimo_atendimento = {}  # sessão -> nº do despacho mais recente (desempate da divisão justa)
+        self._despachos = itertools.count(1)
+        self._ids = itertools.count(1)
+        self._condicao = threading.Condition()
+        self._encerrando = False
+        self._despachante = threading.Thread(target=self._laco_despacho, name="agendador-simulacoes", daemon=True)
+        self._despachante.start()
+
+    # --- Interface das sessões ---
+
+    def submeter(self, sessao, funcao, *args, timeout=None, **kwargs):
+        """Põe `funcao(*args, **kwargs)` na fila da `sessao` e devolve o Trabalho."""
+        with self._condicao:
+            if self._encerrando:
+                raise RuntimeError("Agendador encerrado")
+            fila = self._filas.setdefault(sessao, deque())
+            if self.max_na_fila_por_sessao is not None and len(fila) >= self.max_na_fila_por_sessao:
+                raise FilaCheia(f"Sessão {sessao!r} já tem {len(fila)} trabalhos na fila")
+            trabalho = Trabalho(next(self._ids), sessao, funcao, args, kwargs,
+                                self.timeout_padrao if timeout is None else timeout)
+            fila.append(trabalho)
+            self._condicao.notify_all()
+        return trabalho
+
+    def cancelar(self, *trabalhos):
+        """
+        Cancela os trabalhos: os da fila saem dela na hora; os em execução têm o processo
+        encerrado pelo despachante (o Future termina com CancelledError). Concluídos ficam como estão.
+        """
+        with self._condicao:
+            for trabalho in trabalhos:
+                if trabalho.futuro.done():
+                    continue
+                if trabalho.iniciado_em is None:
+                    self._filas[trabalho.sessao].remove(trabalho)
+                    _cancelar_na_fila(trabalho)
+                    self._esquecer_se_ociosa(trabalho.sessao)
+                else:
+                    trabalho._cancelar = True
+            self._condicao.notify_all()
+
+    def cancelar_sessao(self, sessao):
+        """Cancela todos os trabalhos da sessão (na fila e em execução)."""
+        with self._condicao:
+            trabalhos = list(self._filas.get(sessao, ()))
+            trabalhos += [p.trabalho for p in self._processos if p.trabalho is not None and p.trabalho.sessao == sessao]
+        self.cancelar(*trabalhos)
+
+    def posicao(self, trabalho):
+        """
+        Quantos trabalhos ainda começam antes deste, pela divisão justa atual
+        (0 se é o próximo ou já começou). Trabalhos submetidos depois podem mudar a estimativa.
+        """
+        with self._condicao:
+            fila = self._filas.get(trabalho.sessao, ())
+            if trabalho not in fila:
+                return 0
+            indice = list(fila).index(trabalho)
+            # Em cada volta da divisão justa, cada sessão com fila começa um trabalho;
+            # na volta deste trabalho, só as sessões que vêm antes dela na ordem de atendimento
+            ordem = self._ordem_atendimento()
+            minha_vez = ordem.index(trabalho.sessao)
+            return indice + sum(min(len(self._filas[s]), indice + (1 if i < minha_vez else 0))
+                                for i, s in enumerate(ordem) if s != trabalho.sessao)
+
+    def trabalhos_da_sessao(self, sessao):
+        """Trabalhos da sessão que ainda não terminaram (na fila e em execução)."""
+        with self._condicao:
+            executando = [p.trabalho for p in self._processos if p.trabalho is not None and p.trabalho.sessao == sessao]
+            return executando + list(self._filas.get(sessao, ()))
+
+    def concluidos(self, trabalhos, timeout=None):
+        """Os trabalhos à medida que terminam (como `concurrent.futures.as_completed`)."""
+        por_futuro = {t.futuro: t for t in trabalhos}
+        for futuro in as_completed(por_futuro, timeout):
+            yield por_futuro[futuro]
+
+    @property
+    def em_execucao(self):
+        with self._condicao:
+            return sum(p.trabalho is not None for p in self._processos)
+
+    @property
+    def na_fila(self):
+        with self._condicao:
+            return sum(len(f) for f in self._filas.values())
+
+    @property
+    def sessoes(self):
+        """Sessões com trabalhos na fila ou em execução (as ociosas são esquecidas)."""
+        with self._condicao:
+            return list(self._filas)
+
+    def encerrar(self, cancelar_pendentes=True):
+        """Para o despachante e os processos; com `cancelar_pendentes`, cancela o que estiver na fila ou rodando."""
+        with self._condicao:
+            if cancelar_pendentes:
+                for fila in self._filas.values():
+                    for trabalho in fila:
+                        _cancelar_na_fila(trabalho)
+                    fila.clear()
+                for processo in self._processos:
+                    if processo.trabalho is not None:
+                        processo.trabalho._cancelar = True
+            self._encerrando = True
+            self._condicao.notify_all()
+        self._despachante.join()
+
+    # --- Despacho (thread do agendador) ---
+
+    def _esquecer_se_ociosa(self, sessao):
+        """Sessão sem nada na fila nem rodando sai dos registros (não acumulam com o número de sessões)."""
+        if not self._filas.get(sessao) and not self._executando.get(sessao):
+            self._filas.pop(sessao, None)
+            self._executando.pop(sessao, None)
+            self._ultimo_atendimento.pop(sessao, None)
+
+    def _ordem_atendimento(self):
+        """Sessões com fila, na ordem em que a divisão justa as atenderia."""
+        com_fila = [s for s, fila in self._filas.items() if fila]
+        return sorted(com_fila, key=lambda s: (self._executando.get(s, 0), self._ultimo_atendimento.get(s, 0)))
+
+    def _despachar(self):
+        """Ocupa os processos livres (chamado com o lock)."""
+        while True:
+            ordem = self._ordem_atendimento()
+            if not ordem:
+                return
+            livre = next((p for p in self._processos if p.trabalho is None), None)
+            if livre is None:
+                if len(self._processos) >= self.max_processos:
+                    return
+                livre = _Processo(self._contexto, self.importar_main)
+                self._processos.append(livre)
+            sessao = ordem[0]
+            trabalho = self._filas[sessao].popleft()
+            if not trabalho.futuro.set_running_or_notify_cancel():
+                self._esquecer_se_ociosa(sessao)
+                continue
+            try:
+                livre.conexao.send((trabalho.funcao, trabalho.args, trabalho.kwargs))
+            except OSError as erro:  # Processo morreu parado (pipe quebrado): substituído no próximo despacho
+                livre.encerrar(forcar=True)
+                self._processos.remove(livre)
+                self._falhar_antes_de_iniciar(trabalho, RuntimeError(f"Processo do agendador indisponível: {erro!r}"))
+                continue
+            except Exception as erro:  # Função ou argumentos não serializáveis (nada chegou ao processo)
+                self._falhar_antes_de_iniciar(trabalho, erro)
+                continue
+            trabalho.iniciado_em = time.monotonic()
+            livre.trabalho = trabalho
+            self._executando[sessao] = self._executando.get(sessao, 0) + 1
+            self._ultimo_atendimento[sessao] = next(self._despachos)
+
+    def _falhar_antes_de_iniciar(self, trabalho, erro):
+        """Trabalho que não chegou a um processo termina com `erro` (chamado com o lock)."""
+        trabalho.concluido_em = time.monotonic()
+        trabalho.futuro.set_exception(erro)
+        self._esquecer_se_ociosa(trabalho.sessao)
+
+    def _liberar(self, processo, encerrar=False):
+        """Tira o trabalho do processo (e encerra o processo, se ele ficou inutilizável). Chamado com o lock."""
+        trabalho = processo.trabalho
+        trabalho.concluido_em = time.monotonic()
+        self._executando[trabalho.sessao] -= 1
+        processo.trabalho = None
+        self._esquecer_se_ociosa(trabalho.sessao)
+        if encerrar:
+            processo.encerrar(forcar=True)
+            self._processos.remove(processo)  # Substituído no próximo despacho
+
+    def _verificar_prazos(self):
+        """Encerra os trabalhos cancelados ou fora do prazo (chamado com o lock)."""
+        agora = time.monotonic()
+        for processo in list(self._processos):
+            trabalho = processo.trabalho
+            if trabalho is None:
+                continue
+            if trabalho._cancelar:
+                self._liberar(processo, encerrar=True)
+                trabalho.futuro.set_exception(CancelledError())
+            elif trabalho.timeout is not None and agora - trabalho.iniciado_em > trabalho.timeout:
+                self._liberar(processo, encerrar=True)
+                trabalho.futuro.set_exception(TimeoutError(f"Trabalho {trabalho.id} passou de {trabalho.timeout} s"))
+
+    def _laco_despacho(self):
+        while True:
+            with self._condicao:
+                self._verificar_prazos()
+                if self._encerrando and not any(p.trabalho for p in self._processos):
+                    break
+                if not self._encerrando:
+                    self._despachar()
+                ocupados = {p.conexao: p for p in self._processos if p.trabalho is not None}
+                if not ocupados:
+                    # Nada rodando: dorme até chegar trabalho (ou encerrar)
+                    self._condicao.wait(INTERVALO_DESPACHO * 20)
+                    continue
+
+            for conexao in aguardar_conexoes(list(ocupados), INTERVALO_DESPACHO):
+                processo = ocupados[conexao]
+                try:
+                    ok, valor = conexao.recv()
+                except (EOFError, OSError):
+                    ok, valor = None, RuntimeError("Processo do agendador terminou inesperadamente")
+                with self._condicao:
+                    trabalho = processo.trabalho
+                    if trabalho is None:
+                        continue  # Cancelado enquanto a resposta chegava (processo já encerrado)
+                    self._liberar(processo, encerrar=ok is None)
+                    if ok:
+                        trabalho.futuro.set_result(valor)
+                    else:
+                        trabalho.futuro.set_exception(valor)
+
+        for processo in self._processos:
+            processo.encerrar()
+        self._processos = []
@@ -0,0 +1,79 @@
+"""
+Colunas só de acréscimo gravadas em disco e lidas por mapeamento em memória (np.memmap).
+
+Usado pela Simulacao quando `diretorio_dados` está configurado: as apostas de cada
+rodada, o índice das apostas por usuário e os saldos ao fim de cada rodada vão
+para arquivos binários (um por coluna)
+em vez de ficarem na memória do processo. A leitura devolve views do mapeamento:
+as páginas só são carregadas quando acessadas e ficam no cache de páginas do
+sistema operacional, que pode descartá-las. A memória residente não cresce com o
+número de rodadas.
+
+Exemplo:
+    colunas = ColunasEmDisco("dados/", {"valor": np.float64, "id": np.int32})
+    inicio, fim = colunas.acrescentar({"valor": valores, "id": ids})
+    colunas.ler(inicio, fim)["valor"]
+"""
+from pathlib import Path
+
+import numpy as np
+
+
+class ColunasEmDisco:
+    """Tabela colunar só de acréscimo: um arquivo `<coluna>.bin` por coluna em `diretorio`."""
+
+    def __init__(self, diretorio, colunas):
+        self.diretorio = Path(diretorio)
+        self.diretorio.mkdir(parents=True, exist_ok=True)
+        self.colunas = {nome: np.dtype(tipo) for nome, tipo in colunas.items()}
+        self._arquivos = {nome: open(self._caminho(nome), "ab") for nome in self.colunas}
+        self._linhas = 0
+        self._mapas = {}  # coluna -> memmap do arquivo inteiro (refeito quando o arquivo cresce além dele)
+
+    def _caminho(self, nome):
+        return self.diretorio / f"{nome}.bin"
+
+    def __len__(self):
+        return self._linhas
+
+    def acrescentar(self, valores):
+        """Grava as linhas de `valores` (coluna -> array, todas do mesmo tamanho) e devolve o trecho (inicio, fim)."""
+        inicio = self._linhas
+        tamanho = None
+        for nome, tipo in self.colunas.items():
+            dados = np.ascontiguousarray(valores[nome], dtype=tipo)
+            tamanho = len(dados) if tamanho is None else tamanho
+            if len(dados) != tamanho:
+                raise ValueError(f"Coluna {nome} com {len(dados)} linhas (esperadas {tamanho})")
+            self._arquivos[nome].write(dados.tobytes())
+            # Sem flush, o mapeamento (feito sobre o arquivo) ainda não enxerga as linhas novas
+            self._arquivos[nome].flush()
+        self._linhas += tamanho or 0
+        return inicio, self._linhas
+
+    def _mapa(self, nome, fim):
+        mapa = self._mapas.get(nome)
+        if mapa is None or len(mapa) < fim:
+            mapa = np.memmap(self._caminho(nome), dtype=self.colunas[nome], mode="r", shape=(self._linhas,))
+            self._mapas[nome] = mapa
+        return mapa
+
+    def ler(self, inicio, fim, colunas=None):
+        """Linhas [inicio, fim) de cada coluna, como views somente leitura do mapeamento."""
+        nomes = self.colunas if colunas is None else colunas
+        if fim <= inicio:
+            return {nome: np.zeros(0, dtype=self.colunas[nome]) for nome in nomes}
+        return {nome: self._mapa(nome, fim)[inicio:fim] for nome in nomes}
+
+    def fechar(self, apagar=False):
+        """Fecha os arquivos (e os apaga, com `apagar=True`). As views já devolvidas deixam de valer se apagados."""
+        for arquivo in self._arquivos.values():
+            arquivo.close()
+        self._mapas = {}
+        if apagar:
+            for nome in self.colunas:
+                self._caminho(nome).unlink(missing_ok=True)
+            try:
+                self.diretorio.rmdir()
+            except OSError:
+                pass  # Diretório com outros arquivos
@@ -0,0 +1,116 @@
+"""
+Benchmark das seções em fragmento do Simulador Principal (sim1.py), com o AppTest do Streamlit.
+
+Monta uma simulação (usuários e rodadas configuráveis) e mede, em mediana de
+várias repetições, o tempo da página inteira e o de cada seção @st.fragment ao
+trocar o usuário do histórico individual e a rodada do explorador. O AppTest
+sempre reexecuta a página toda; o tempo de cada fragmento é medido em volta da
+própria função e corresponde ao que o navegador espera quando só o fragmento
+roda de novo.
+
+Uso:
+    python benchmark_fragmentos.py                         # 1.000 usuários, 100 rodadas
+    python benchmark_fragmentos.py --usuarios 500 --rodadas 300 --repeticoes 9
+"""
+import argparse
+import os
+import statistics
+import time
+
+from streamlit.testing.v1 import AppTest
+
+CAMINHO_SIM1 = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sim1.py")
+
+
+def app_cronometrado(caminho_sim1):
+    """Roda o sim1.py com cada @st.fragment cronometrado (tempos em st.session_state._tempos_fragmentos)."""
+    import functools
+    import os
+    import runpy
+    import sys
+    import time
+
+    import streamlit as st
+
+    fragmento_original = st.fragment
+
+    def fragmento_cronometrado(funcao=None, **kwargs):
+        if funcao is None:  # @st.fragment(run_every=...)
+            return lambda f: fragmento_cronometrado(f, **kwargs)
+
+        @functools.wraps(funcao)
+        def cronometrada(*args, **kw):
+            inicio = time.perf_counter()
+            try:
+                return funcao(*args, **kw)
+            finally:
+                st.session_state.setdefault("_tempos_fragmentos", {})[funcao.__name__] = time.perf_counter() - inicio
+        return fragmento_original(cronometrada, **kwargs)
+
+    sys.path.insert(0, os.path.dirname(caminho_sim1))
+    st.fragment = fragmento_cronometrado
+    try:
+        runpy.run_path(caminho_sim1, run_name="__main__")
+    finally:
+        st.fragment = fragmento_original
+
+
+def botao(at, texto):
+    return next(b for b in at.button if texto in b.label)
+
+
+def preparar(num_usuarios, num_rodadas):
+    at = AppTest.from_function(app_cronometrado, kwargs={"caminho_sim1": CAMINHO_SIM1}, default_timeout=600)
+    at.run()
+    next(n for n in at.number_input if n.label.startswith("Número de Usuários")).set_value(num_usuarios)
+    at.number_input(key="num_rodadas_avanco").set_value(num_rodadas)
+    at.run()
+    botao(at, "Simular").click().run()
+    execucao = at.session_state["execucao_fundo"]
+    while execucao.ativa:  # Avanço rápido numa thread de fundo
+        time.sleep(0.1)
+    at.run()
+    if at.exception:
+        raise RuntimeError(at.exception)
+    return at
+
+
+def medir(at, repeticoes, mudar):
+    """Medianas do tempo da página inteira e de cada fragmento, com `mudar(i)` antes de cada execução."""
+    paginas, fragmentos = [], []
+    for i in range(repeticoes):
+        mudar(i)
+        at.session_state["_tempos_fragmentos"] = {}
+        inicio = time.perf_counter()
+        at.run()
+        paginas.append(time.perf_counter() - inicio)
+        fragmentos.append(dict(at.session_state["_tempos_fragmentos"]))
+    return statistics.median(paginas), {nome: statistics.median(f[nome] for f in fragmentos) for nome in fragmentos[0]}
+
+
+def mostrar(titulo, pagina, fragmentos):
+    print(f"{titulo}: página inteira {pagina:.3f} s")
+    for nome, tempo in fragmentos.items():
+        print(f"    {nome:<28} {tempo:.4f} s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--usuarios", type=int, default=1_000, help="usuários (máximo da interface: 1000)")
+    parser.add_argument("--rodadas", type=int, default=100)
+    parser.add_argument("--repeticoes", type=int, default=5)
+    args = parser.parse_args()
+
+    at = preparar(args.usuarios, args.rodadas)
+    print(f"{args.usuarios:,} usuários, {args.rodadas} rodadas (medido, mediana de {args.repeticoes})")
+
+    mostrar("Reexecução sem mudança (cache quente)", *medir(at, args.repeticoes, lambda i: None))
+
+    # Valores dos selectbox: id do usuário e número da rodada
+    mostrar("Trocar de usuário", *medir(
+        at, args.repeticoes, lambda i: at.selectbox(key="select_usuario_historico").set_value(10 + i)))
+
+    ultima = at.session_state["simulacao"].rodada_atual
+    mostrar("Trocar de rodada", *medir(
+        at, args.repeticoes,
+        lambda i: next(s for s in at.selectbox if s.label.startswith("Selecione a rodada")).set_value(ultima - 1 - i)))
@@ -0,0 +1,87 @@
+"""
+Benchmark da liquidação de uma rodada: busca com next() (sim1.py original) x liquidar_apostas (índice direto).
+
+A liquidação antiga procura o jogo e o usuário de cada aposta com next() em listas
+de dicts, então o custo é O(apostas × usuários). Por padrão ela é medida só em uma
+amostra das apostas e o tempo total é extrapolado (as buscas custam o mesmo para
+qualquer aposta); com --completo, todas as apostas são liquidadas.
+
+Uso:
+    python benchmark_liquidacao.py                      # 10 mil e 100 mil usuários
+    python benchmark_liquidacao.py --usuarios 10000 --completo
+"""
+import argparse
+import time
+
+import numpy as np
+
+from motor_simulacao import liquidar_apostas
+
+APOSTAS_POR_USUARIO = 2.5
+NUM_JOGOS = 10
+
+
+def gerar_rodada(num_usuarios, semente=0):
+    rng = np.random.default_rng(semente)
+    num_apostas = int(num_usuarios * APOSTAS_POR_USUARIO)
+    return {
+        "id_usuario": rng.integers(0, num_usuarios, num_apostas),
+        "id_jogo": rng.integers(0, NUM_JOGOS, num_apostas),
+        "idx_resultado_apostado": rng.integers(0, 3, num_apostas),
+        "valor_apostado": np.round(rng.uniform(5, 50, num_apostas), 2),
+        "odd_no_momento": np.round(rng.uniform(1.2, 6, num_apostas), 2),
+        "idx_resultado_final": rng.integers(0, 3, NUM_JOGOS),
+        "saldos": np.full(num_usuarios, 100.0),
+    }
+
+
+def liquidar_com_next(apostas, jogos, usuarios):
+    """Laço do sim1.py original (passo 4 da rodada), com as buscas next() por aposta."""
+    for aposta in apostas:
+        jogo_correspondente = next(j for j in jogos if j["id_jogo"] == aposta["id_jogo"])
+        user_da_aposta = next(u for u in usuarios if u["id"] == aposta["id_usuario"])
+        if aposta["idx_resultado_apostado"] == jogo_correspondente["idx_resultado_final"]:
+            aposta["ganhou"] = True
+            aposta["valor_ganho"] = round(aposta["valor_apostado"] * aposta["odd_no_momento"], 2)
+            user_da_aposta["saldo"] = round(user_da_aposta["saldo"] + aposta["valor_ganho"], 2)
+        else:
+            aposta["ganhou"] = False
+
+
+def medir(num_usuarios, amostra, completo, repeticoes=5):
+    rodada = gerar_rodada(num_usuarios)
+    num_apostas = len(rodada["id_usuario"])
+
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        liquidar_apostas(rodada["id_usuario"], rodada["id_jogo"], rodada["idx_resultado_apostado"],
+                         rodada["valor_apostado"], rodada["odd_no_momento"], rodada["idx_resultado_final"],
+                         rodada["saldos"])
+        tempos.append(time.perf_counter() - inicio)
+    indexado = float(np.median(tempos))
+
+    usuarios = [{"id": i, "saldo": 100.0} for i in range(num_usuarios)]
+    jogos = [{"id_jogo": j, "idx_resultado_final": int(r)} for j, r in enumerate(rodada["idx_resultado_final"])]
+    apostas = [{"id_usuario": int(u), "id_jogo": int(j), "idx_resultado_apostado": int(r),
+                "valor_apostado": float(v), "odd_no_momento": float(o)}
+               for u, j, r, v, o in zip(rodada["id_usuario"], rodada["id_jogo"], rodada["idx_resultado_apostado"],
+                                        rodada["valor_apostado"], rodada["odd_no_momento"])]
+    medidas = apostas if completo else apostas[:amostra]
+    inicio = time.perf_counter()
+    liquidar_com_next(medidas, jogos, usuarios)
+    com_next = (time.perf_counter() - inicio) * num_apostas / len(medidas)
+
+    forma = "medido" if len(medidas) == num_apostas else f"estimado a partir de {len(medidas):,} apostas"
+    print(f"{num_usuarios:>9,} usuários / {num_apostas:>9,} apostas: "
+          f"next() {com_next:8.2f} s ({forma})  |  indexado {indexado * 1000:7.2f} ms (medido, mediana de {repeticoes})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--usuarios", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--amostra", type=int, default=2_000, help="apostas liquidadas com next() (padrão: 2000)")
+    parser.add_argument("--completo", action="store_true", help="liquida todas as apostas com next() (lento)")
+    args = parser.parse_args()
+    for num_usuarios in args.usuarios:
+        medir(num_usuarios, args.amostra, args.completo)
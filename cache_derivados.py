@@ -0,0 +1,52 @@
+"""
+Cache dos objetos derivados da simulação (DataFrames e figuras do painel de sim1.py).
+
+O Streamlit reexecuta o script inteiro a cada interação, mas os dados só mudam
+quando uma rodada termina. Cada item do cache guarda a versão da simulação em
+que foi construído (`Simulacao.versao_cache`) e só é reconstruído quando essa
+versão muda. Quando aparece uma versão nova, os itens das versões antigas são
+descartados de uma vez, e o número de itens é limitado (LRU).
+"""
+from collections import OrderedDict
+
+
+class CacheDerivados:
+    """
+    Cache LRU de itens derivados, válidos enquanto a versão não muda.
+
+    Exemplo:
+        cache = CacheDerivados()
+        df = cache.obter("df_historico", sim.versao_cache, sim.dataframe_historico)
+    """
+
+    def __init__(self, max_itens=32):
+        self.max_itens = max_itens
+        self._itens = OrderedDict()  # chave -> valor (todos da versão atual)
+        self._versao = None
+        self.acertos = 0
+        self.falhas = 0
+
+    def __len__(self):
+        return len(self._itens)
+
+    def obter(self, chave, versao, construir):
+        """Devolve o item `chave` da `versao`, chamando `construir()` só se ainda não estiver no cache."""
+        if versao != self._versao:
+            # Dados mudaram: nada do que está guardado serve mais
+            self._itens.clear()
+            self._versao = versao
+        if chave in self._itens:
+            self._itens.move_to_end(chave)
+            self.acertos += 1
+            return self._itens[chave]
+
+        self.falhas += 1
+        valor = construir()
+        self._itens[chave] = valor
+        while len(self._itens) > self.max_itens:
+            self._itens.popitem(last=False)
+        return valor
+
+    def limpar(self):
+        self._itens.clear()
+        self._versao = None
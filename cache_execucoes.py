@@ -0,0 +1,108 @@
+"""
+Cache de execuções concluídas, compartilhado por todas as sessões do processo.
+
+No app hospedado, vários visitantes rodam o mesmo cenário (a configuração padrão
+com a mesma semente). Como a simulação é determinística, o estado depois de N
+rodadas só depende de (configuração, semente, N): a primeira sessão calcula e
+guarda o estado (`Simulacao.estado()`), as seguintes o recebem pronto.
+
+Os arrays guardados são cópias marcadas como somente leitura. Uma sessão que
+recebe o estado monta a sua própria Simulacao com `Simulacao.de_estado`, que
+copia só o que muda no lugar e compartilha o histórico (copy-on-write); uma
+escrita acidental num array compartilhado levanta erro em vez de corromper as
+outras sessões. O tamanho total é limitado em bytes (descarta o menos usado).
+
+Exemplo:
+    cache = CacheExecucoes()
+    chave = chave_execucao(config, semente=42, rodadas=50)
+    estado = cache.obter(chave)
+    if estado is None:
+        sim = Simulacao(config, semente=42)
+        sim.avancar(50)
+        cache.guardar(chave, sim.estado())
+    else:
+        sim = Simulacao.de_estado(estado)
+"""
+import copy
+import json
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from motor_simulacao import CONFIG_PADRAO
+
+# Limite padrão do cache (todas as execuções somadas)
+MAX_BYTES_PADRAO = 256 * 2**20
+
+
+def chave_execucao(config, semente, rodadas):
+    """
+    Chave do cenário: configuração completa (com os padrões do motor), semente e número de rodadas.
+    O diretório de dados não entra (não muda o resultado).
+    """
+    completa = copy.deepcopy(CONFIG_PADRAO)
+    completa.update(config or {})
+    completa.pop("diretorio_dados", None)
+    return (json.dumps(completa, sort_keys=True), int(semente), int(rodadas))
+
+
+class CacheExecucoes:
+    """
+    Cache LRU de estados de simulação, limitado pelo total de bytes e seguro entre threads
+    (cada sessão do Streamlit roda numa thread).
+    """
+
+    def __init__(self, max_bytes=MAX_BYTES_PADRAO):
+        self.max_bytes = max_bytes
+        self._itens = OrderedDict()  # chave -> (estado somente leitura, bytes)
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.acertos = 0
+        self.falhas = 0
+
+    def __len__(self):
+        return len(self._itens)
+
+    def __contains__(self, chave):
+        return chave in self._itens
+
+    def obter(self, chave):
+        """Estado guardado para `chave` (arrays somente leitura) ou None."""
+        with self._lock:
+            item = self._itens.get(chave)
+            if item is None:
+                self.falhas += 1
+                return None
+            self._itens.move_to_end(chave)
+            self.acertos += 1
+            return item[0]
+
+    def guardar(self, chave, estado):
+        """
+        Guarda uma cópia somente leitura de `estado`. Devolve False se ele sozinho
+        passa do limite (não é guardado).
+        """
+        tamanho = sum(valores.nbytes for valores in estado.values())
+        if tamanho > self.max_bytes:
+            return False
+        # Cópia fora do lock: a simulação de origem continua avançando e mudando os próprios arrays
+        congelado = {}
+        for nome, valores in estado.items():
+            valores = np.array(valores)
+            valores.flags.writeable = False
+            congelado[nome] = valores
+
+        with self._lock:
+            if chave in self._itens:
+                self.bytes -= self._itens.pop(chave)[1]
+            self._itens[chave] = (congelado, tamanho)
+            self.bytes += tamanho
+            while self.bytes > self.max_bytes:
+                self.bytes -= self._itens.popitem(last=False)[1][1]
+        return True
+
+    def limpar(self):
+        with self._lock:
+            self._itens.clear()
+            self.bytes = 0
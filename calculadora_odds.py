@@ -116,65 +116,71 @@ with st.sidebar:
     st.subheader("🏠 Margem da Casa")
     margem_casa = st.slider("Margem da Casa (%)", 0.0, 25.0, 5.0, 0.5) / 100
 
-# Inputs na página principal
-st.subheader("🏆 Probabilidades Reais")
-col1, col2, col3 = st.columns(3)
-
-with col1:
-    prob_vitoria = st.slider("Probabilidade de Vitória (%)", 0, 100, 50, 1) / 100
-
-with col2:
-    prob_empate = st.slider("Probabilidade de Empate (%)", 0, 100, 25, 1) / 100
-
-with col3:
-    # Coluna vazia conforme solicitado
-    pass
-
-# Calcular automaticamente a probabilidade de derrota
-prob_derrota = 1.0 - prob_vitoria - prob_empate
-if prob_derrota < 0:
-    prob_derrota = 0
-    prob_empate = 1.0 - prob_vitoria
-
-# Validação
-total_prob = prob_vitoria + prob_empate + prob_derrota
-if abs(total_prob - 1.0) > 0.001:
-    st.warning("⚠️ As probabilidades devem somar 100%!")
-
-# Calcular odds
-odds_justas = [1/prob_vitoria if prob_vitoria > 0 else 999, 
-               1/prob_empate if prob_empate > 0 else 999, 
-               1/prob_derrota if prob_derrota > 0 else 999]
-
-odds_com_margem = [odd * (1 - margem_casa) for odd in odds_justas]
-
-# Calcular retorno esperado
-retornos_esperados = [prob * odd - 1 for prob, odd in zip([prob_vitoria, prob_empate, prob_derrota], odds_com_margem)]
-
-# Display dos resultados
-col1, col2, col3 = st.columns(3)
-
-resultados = ["Vitória", "Empate", "Derrota"]
-probabilidades = [prob_vitoria, prob_empate, prob_derrota]
-cores = ["#28a745", "#ffc107", "#dc3545"]
-
-for i, (col, resultado, prob, cor) in enumerate(zip([col1, col2, col3], resultados, probabilidades, cores)):
-    with col:
-        st.markdown(f"""
-        <div style="background-color: {cor}; color: white; padding: 15px; border-radius: 10px; text-align: center; margin-bottom: 10px;">
-            <h3>{resultado}</h3>
-            <h4>{prob:.1%}</h4>
-        </div>
-        """, unsafe_allow_html=True)
-        
-        # Métricas de odds em 3 colunas
-        subcol1, subcol2, subcol3 = st.columns(3)
-        with subcol1:
-            st.metric("Odd Justa", f"{odds_justas[i]:.2f}", border=True)
-        with subcol2:
-            st.metric("Odd Final", f"{odds_com_margem[i]:.2f}", border=True)
-        with subcol3:
-            st.metric("Retorno Esperado", f"{retornos_esperados[i]:.1%}", border=True)
+# Sliders de probabilidade e resultados num fragmento: mexer neles reexecuta só esta parte da página
+@st.fragment
+def calculadora_interativa(margem_casa):
+    # Inputs na página principal
+    st.subheader("🏆 Probabilidades Reais")
+    col1, col2, col3 = st.columns(3)
+
+    with col1:
+        prob_vitoria = st.slider("Probabilidade de Vitória (%)", 0, 100, 50, 1) / 100
+
+    with col2:
+        prob_empate = st.slider("Probabilidade de Empate (%)", 0, 100, 25, 1) / 100
+
+    with col3:
+        # Coluna vazia conforme solicitado
+        pass
+
+    # Calcular automaticamente a probabilidade de derrota
+    prob_derrota = 1.0 - prob_vitoria - prob_empate
+    if prob_derrota < 0:
+        prob_derrota = 0
+        prob_empate = 1.0 - prob_vitoria
+
+    # Validação
+    total_prob = prob_vitoria + prob_empate + prob_derrota
+    if abs(total_prob - 1.0) > 0.001:
+        st.warning("⚠️ As probabilidades devem somar 100%!")
+
+    # Calcular odds
+    odds_justas = [1/prob_vitoria if prob_vitoria > 0 else 999, 
+                   1/prob_empate if prob_empate > 0 else 999, 
+                   1/prob_derrota if prob_derrota > 0 else 999]
+
+    odds_com_margem = [odd * (1 - margem_casa) for odd in odds_justas]
+
+    # Calcular retorno esperado
+    retornos_esperados = [prob * odd - 1 for prob, odd in zip([prob_vitoria, prob_empate, prob_derrota], odds_com_margem)]
+
+    # Display dos resultados
+    col1, col2, col3 = st.columns(3)
+
+    resultados = ["Vitória", "Empate", "Derrota"]
+    probabilidades = [prob_vitoria, prob_empate, prob_derrota]
+    cores = ["#28a745", "#ffc107", "#dc3545"]
+
+    for i, (col, resultado, prob, cor) in enumerate(zip([col1, col2, col3], resultados, probabilidades, cores)):
+        with col:
+            st.markdown(f"""
+            <div style="background-color: {cor}; color: white; padding: 15px; border-radius: 10px; text-align: center; margin-bottom: 10px;">
+                <h3>{resultado}</h3>
+                <h4>{prob:.1%}</h4>
+            </div>
+            """, unsafe_allow_html=True)
+
+            # Métricas de odds em 3 colunas
+            subcol1, subcol2, subcol3 = st.columns(3)
+            with subcol1:
+                st.metric("Odd Justa", f"{odds_justas[i]:.2f}", border=True)
+            with subcol2:
+                st.metric("Odd Final", f"{odds_com_margem[i]:.2f}", border=True)
+            with subcol3:
+                st.metric("Retorno Esperado", f"{retornos_esperados[i]:.1%}", border=True)
+
+
+calculadora_interativa(margem_casa)
 
 # === SEÇÃO 3: DICAS E CONCLUSÕES ===
 st.markdown("---")
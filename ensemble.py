@@ -0,0 +1,182 @@
+"""
+Ensemble de Monte Carlo: K replicações independentes da simulação de sim1.py
+executadas em paralelo num pool de processos.
+
+Uma simulação é só uma trajetória possível. Aqui cada replicação roda a mesma
+configuração com a sua própria semente e devolve apenas séries por rodada
+(alguns KB), que são empilhadas numa matriz replicações × rodadas por métrica.
+As faixas de quantis por rodada saem dessas matrizes.
+
+Exemplo:
+    ens = executar_ensemble({"num_usuarios": 1000}, num_rodadas=200, num_replicacoes=64)
+    ens.quantis("lucro_acumulado")       # DataFrame: rodada × p5, p25, p50, p75, p95
+    ens.rodada_de_ruina(50)              # rodada em que 50% dos usuários faliram, por replicação
+"""
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, as_completed, wait
+import multiprocessing
+
+import numpy as np
+import pandas as pd
+
+from motor_simulacao import LISTA_PERFIS, Simulacao
+
+# Quantis usados nas faixas (mediana + faixas de 50% e 90%)
+QUANTIS_PADRAO = (0.05, 0.25, 0.5, 0.75, 0.95)
+
+# Métricas por rodada guardadas de cada replicação
+METRICAS_ENSEMBLE = {
+    "lucro_acumulado": "Lucro Acumulado",
+    "margem_ggr_acumulada": "Margem Lucro Acum. (%)",
+    "saldo_medio": "Saldo Médio",
+    "fracao_falidos": "Usuários Falidos (%)",
+}
+
+
+def executar_replicacao(config, num_rodadas, semente):
+    """
+    Executa uma replicação completa e devolve só as séries por rodada.
+    Roda dentro de um processo do pool: não devolve a Simulacao (livro de apostas etc.).
+
+    Returns:
+        dict: métrica -> array (num_rodadas,) e "fracao_falidos_por_perfil" -> array (num_rodadas, nº de perfis)
+    """
+    # Só as séries por rodada interessam: detalhe das apostas apenas da rodada corrente
+    sim = Simulacao({**config, "rodadas_com_detalhe": 1}, semente=semente)
+    sim.avancar(num_rodadas)
+    historico = sim.historico_casa
+
+    ggr = np.array([h["ggr_rodada"] for h in historico])
+    faturamento = np.array([h["total_apostado_rodada"] for h in historico])
+    lucro_acumulado = np.cumsum(ggr)
+    faturamento_acumulado = np.cumsum(faturamento)
+    usuarios_por_perfil = np.bincount(sim.usuarios.codigos_perfil, minlength=len(LISTA_PERFIS))
+    ativos_por_perfil = np.array([[h["usuarios_ativos_por_perfil"][p] for p in LISTA_PERFIS] for h in historico])
+
+    return {
+        "lucro_acumulado": lucro_acumulado,
+        "margem_ggr_acumulada": np.divide(lucro_acumulado * 100, faturamento_acumulado,
+                                          out=np.zeros(len(historico)), where=faturamento_acumulado > 0),
+        "saldo_medio": np.array([h["saldo_medio_fim_rodada"] for h in historico]),
+        "fracao_falidos": np.array([h["usuarios_zerados"] for h in historico]) / max(len(sim.usuarios), 1) * 100,
+        # Quem não está ativo (saldo > 0) está zerado
+        "fracao_falidos_por_perfil": (usuarios_por_perfil - ativos_por_perfil) / np.maximum(usuarios_por_perfil, 1) * 100,
+    }
+
+
+class ResultadoEnsemble:
+    """
+    Séries de todas as replicações, uma matriz replicações × rodadas por métrica
+    (`fracao_falidos_por_perfil` tem um eixo a mais, de perfis).
+    """
+
+    def __init__(self, config, num_rodadas, sementes, series):
+        self.config = config
+        self.num_rodadas = num_rodadas
+        self.sementes = sementes
+        self.metricas = {nome: np.vstack([s[nome] for s in series]) for nome in METRICAS_ENSEMBLE}
+        self.fracao_falidos_por_perfil = np.stack([s["fracao_falidos_por_perfil"] for s in series])
+
+    @property
+    def num_replicacoes(self):
+        return len(self.sementes)
+
+    @property
+    def rodadas(self):
+        return np.arange(1, self.num_rodadas + 1)
+
+    def quantis(self, metrica, niveis=QUANTIS_PADRAO):
+        """Quantis da métrica em cada rodada: DataFrame indexado pela rodada, colunas p5, p25, ..."""
+        valores = np.quantile(self.metricas[metrica], niveis, axis=0)
+        return pd.DataFrame(valores.T, index=pd.Index(self.rodadas, name="rodada"),
+                            columns=[f"p{round(q * 100)}" for q in niveis])
+
+    def rodada_de_ruina(self, percentual):
+        """
+        Primeira rodada em que pelo menos `percentual`% dos usuários estavam falidos,
+        por replicação (NaN se não aconteceu dentro das rodadas simuladas).
+        """
+        atingiu = self.metricas["fracao_falidos"] >= percentual
+        return np.where(atingiu.any(axis=1), atingiu.argmax(axis=1) + 1, np.nan)
+
+    def resumo_final(self):
+        """Uma linha por replicação com os valores da última rodada."""
+        resumo = pd.DataFrame({nome: valores[:, -1] for nome, valores in self.metricas.items()})
+        for i, perfil in enumerate(LISTA_PERFIS):
+            resumo[f"fracao_falidos_{perfil}"] = self.fracao_falidos_por_perfil[:, -1, i]
+        resumo.insert(0, "semente", self.sementes)
+        return resumo
+
+
+def executar_ensemble(config, num_rodadas, num_replicacoes, semente=None, max_processos=None, ao_concluir=None,
+                      agendador=None, sessao=None, timeout=None, ao_aguardar=None):
+    """
+    Executa `num_replicacoes` replicações independentes em um pool de processos.
+
+    Cada replicação recebe uma semente própria derivada de `semente` (SeedSequence.spawn),
+    com os 128 bits de estado da sequência filha inteiros (um int Python, que a Simulacao
+    aceita como semente e que também vai para o resumo), então o resultado não depende de quantos processos há nem da ordem em que terminam.
+
+    Args:
+        config: configuração da Simulacao (a mesma para todas as replicações)
+        num_rodadas: rodadas por replicação
+        num_replicacoes: K
+        semente: semente do ensemble (None = aleatória)
+        max_processos: tamanho do pool (padrão: nº de CPUs)
+        ao_concluir: função opcional chamada com (concluidas, num_replicacoes) a cada replicação
+        agendador: AgendadorSimulacoes compartilhado; se dado, as replicações vão para a fila
+            de `sessao` nele em vez de um pool próprio (`max_processos` é ignorado)
+        timeout: tempo limite de cada replicação no agendador, em segundos
+        ao_aguardar: função opcional chamada a cada intervalo sem replicação concluída, com a
+            posição na fila da próxima replicação a começar (0 = rodando ou é a próxima; só com agendador)
+
+    Returns:
+        ResultadoEnsemble
+    """
+    raiz = np.random.SeedSequence(semente)
+    sementes = [_semente_completa(filha) for filha in raiz.spawn(num_replicacoes)]
+    if agendador is not None:
+        series = _executar_no_agendador(agendador, sessao, config, num_rodadas, sementes, timeout,
+                                        ao_concluir, ao_aguardar)
+        return ResultadoEnsemble(config, num_rodadas, sementes, series)
+    max_processos = min(max_processos or os.cpu_count() or 1, num_replicacoes)
+
+    series = [None] * num_replicacoes
+    # "spawn": o processo do Streamlit tem várias threads, e fork com threads pode travar
+    with ProcessPoolExecutor(max_workers=max_processos, mp_context=multiprocessing.get_context("spawn")) as pool:
+        futuros = {pool.submit(executar_replicacao, config, num_rodadas, s): i for i, s in enumerate(sementes)}
+        for concluidas, futuro in enumerate(as_completed(futuros), start=1):
+            series[futuros[futuro]] = futuro.result()
+            if ao_concluir is not None:
+                ao_concluir(concluidas, num_replicacoes)
+
+    return ResultadoEnsemble(config, num_rodadas, sementes, series)
+
+
+def _semente_completa(sequencia):
+    """Estado de 128 bits (4 palavras de 32) de uma SeedSequence como um único int."""
+    return int.from_bytes(sequencia.generate_state(4, np.uint32).astype("<u4").tobytes(), "little")
+
+
+def _executar_no_agendador(agendador, sessao, config, num_rodadas, sementes, timeout, ao_concluir, ao_aguardar):
+    """
+    Replicações como trabalhos da `sessao` no agendador; um erro, timeout ou interrupção cancela as restantes.
+    Se a fila da sessão encher no meio da submissão (FilaCheia), as já submetidas também são canceladas.
+    """
+    trabalhos = []
+    series = [None] * len(sementes)
+    try:
+        for s in sementes:
+            trabalhos.append(agendador.submeter(sessao, executar_replicacao, config, num_rodadas, s, timeout=timeout))
+        pendentes = {t.futuro: i for i, t in enumerate(trabalhos)}
+        while pendentes:
+            prontos, _ = wait(pendentes, timeout=0.5, return_when=FIRST_COMPLETED)
+            if not prontos and ao_aguardar is not None:
+                ao_aguardar(min(agendador.posicao(t) for t in trabalhos if t.futuro in pendentes))
+            for futuro in prontos:
+                series[pendentes.pop(futuro)] = futuro.result()  # Erro, timeout ou cancelamento sobem daqui
+                if ao_concluir is not None:
+                    ao_concluir(len(trabalhos) - len(pendentes), len(trabalhos))
+    finally:
+        agendador.cancelar(*trabalhos)  # Nada acontece com as concluídas
+    return series
@@ -0,0 +1,215 @@
+"""
+Avanço da simulação numa thread de fundo, com progresso, pausa, retomada e cancelamento.
+
+No sim1.py, o avanço rápido roda aqui em vez de bloquear a thread do script: a
+sessão guarda a ExecucaoEmFundo no session_state, a página continua respondendo
+(sidebar, outras páginas) e um fragmento consulta o progresso periodicamente.
+
+Com um `agendador` (agendador.AgendadorSimulacoes), as rodadas não rodam no
+processo da sessão: a thread só submete trechos do avanço ao pool compartilhado,
+cada um com o `estado()` da simulação, e espera. O processo do pool reconstrói a
+simulação, avança por até SEGUNDOS_POR_TRECHO e devolve o estado novo, do qual a
+thread reconstrói a simulação da sessão (`sim` passa a ser outro objeto a cada
+trecho). Assim o avanço entra na fila da sessão, com divisão justa entre as
+sessões e limite de processos, como as replicações do ensemble.
+
+Só a thread de fundo altera (ou troca) a simulação enquanto ela está ativa. Quem
+lê por fora usa `rodadas_feitas` e `historico_parcial()`, que só enxergam rodadas
+concluídas; o resto do estado só deve ser lido com a execução pausada (`pausada`)
+ou encerrada.
+
+Exemplo:
+    execucao = ExecucaoEmFundo(sim, 500)   # ou ExecucaoEmFundo(sim, 500, agendador=agendador, sessao=id_sessao)
+    execucao.pausar()      # espera a rodada em andamento terminar
+    execucao.retomar()
+    execucao.cancelar()    # para ao fim da rodada em andamento
+"""
+import threading
+import time
+from concurrent.futures import CancelledError, wait
+
+from agendador import FilaCheia
+from motor_simulacao import Simulacao
+
+# Estados da execução
+EXECUTANDO = "executando"
+PAUSADA = "pausada"
+CONCLUIDA = "concluida"
+CANCELADA = "cancelada"
+ERRO = "erro"
+
+# Duração alvo de cada trecho do avanço no agendador: cada trecho paga uma ida e volta do
+# estado inteiro, e só entre dois trechos as outras sessões ganham o processo
+SEGUNDOS_POR_TRECHO = 1.0
+
+# Intervalo entre as verificações de pausa e cancelamento enquanto um trecho está no agendador
+INTERVALO_ESPERA = 0.1
+
+
+def avancar_estado(estado, max_rodadas, segundos):
+    """
+    Trabalho do agendador: reconstrói a simulação de `estado`, executa rodadas até
+    `max_rodadas` ou até passar de `segundos` (pelo menos uma) e devolve o estado novo.
+    """
+    sim = Simulacao.de_estado(estado)
+    limite = time.perf_counter() + segundos
+    for _ in range(max_rodadas):
+        sim.executar_rodada()
+        if time.perf_counter() >= limite:
+            break
+    return sim.estado()
+
+
+class ExecucaoEmFundo:
+    """
+    Executa `num_rodadas` rodadas de `sim` numa thread daemon, começando já na criação.
+
+    Args:
+        sim: Simulacao que passa a pertencer à thread até ela terminar
+        num_rodadas: rodadas a executar
+        ao_concluir: função opcional chamada na thread com a simulação ao fim
+            (também depois de um cancelamento; não é chamada se houver erro)
+        agendador: AgendadorSimulacoes opcional onde as rodadas rodam, em trechos;
+            sem ele, rodam na própria thread
+        sessao: dona dos trechos no agendador
+        timeout: tempo limite de cada trecho no agendador (padrão: o do agendador)
+
+    Com `agendador`, o primeiro trecho é submetido já aqui (FilaCheia chega a quem
+    criou a execução) e cada trecho concluído troca `sim` por uma simulação
+    reconstruída; a anterior é fechada com `apagar=True`. Cancelar encerra o
+    trecho em andamento: ficam as rodadas dos trechos concluídos.
+    """
+
+    def __init__(self, sim, num_rodadas, ao_concluir=None, agendador=None, sessao=None, timeout=None):
+        self.sim = sim
+        self.num_rodadas = num_rodadas
+        self.rodada_inicial = sim.rodada_atual
+        self.ao_concluir = ao_concluir
+        self.rodadas_feitas = 0
+        self.erro = None
+        self.estado = EXECUTANDO
+        self.inicio = time.perf_counter()
+        self.fim = None
+        self._condicao = threading.Condition()
+        self._pedido_pausa = False
+        self._pedido_cancelamento = False
+        self.agendador = agendador
+        self.sessao = sessao
+        self.timeout = timeout
+        self._trabalho = self._submeter_trecho() if agendador is not None and num_rodadas else None
+        self._thread = threading.Thread(target=self._executar, name="simulacao-em-fundo", daemon=True)
+        self._thread.start()
+
+    def _executar(self):
+        try:
+            while self.rodadas_feitas < self.num_rodadas:
+                with self._condicao:
+                    while self._pedido_pausa and not self._pedido_cancelamento:
+                        self.estado = PAUSADA
+                        self._condicao.notify_all()
+                        self._condicao.wait()
+                    if self._pedido_cancelamento:
+                        break
+                    self.estado = EXECUTANDO
+                # Fora do lock: pausar/cancelar não esperam a rodada para registrar o pedido
+                if self.agendador is None:
+                    self.sim.executar_rodada()
+                    self.rodadas_feitas += 1
+                else:
+                    self._avancar_trecho()
+            if self.ao_concluir is not None:
+                self.ao_concluir(self.sim)
+            estado_final = CANCELADA if self._pedido_cancelamento else CONCLUIDA
+        except Exception as erro:  # A thread não tem a quem propagar: fica registrado para a interface
+            self.erro = erro
+            estado_final = ERRO
+        with self._condicao:
+            self.estado = estado_final
+            self.fim = time.perf_counter()
+            self._condicao.notify_all()
+
+    def _submeter_trecho(self):
+        return self.agendador.submeter(self.sessao, avancar_estado, self.sim.estado(),
+                                       self.num_rodadas - self.rodadas_feitas, SEGUNDOS_POR_TRECHO,
+                                       timeout=self.timeout)
+
+    def _avancar_trecho(self):
+        """Espera o trecho no agendador (submetendo-o, se preciso) e troca `sim` pela simulação avançada."""
+        if self._trabalho is None:
+            try:
+                self._trabalho = self._submeter_trecho()
+            except FilaCheia:  # Fila da sessão cheia (ex.: um ensemble): tenta de novo, atento a pausa e cancelamento
+                time.sleep(INTERVALO_ESPERA)
+                return
+        trabalho = self._trabalho
+        while not wait([trabalho.futuro], INTERVALO_ESPERA).done:
+            # Cancelamento encerra o trecho até em execução; pausa só tira da fila o que ainda não começou
+            if self._pedido_cancelamento or (self._pedido_pausa and trabalho.estado == "na_fila"):
+                self.agendador.cancelar(trabalho)
+        self._trabalho = None
+        try:
+            estado = trabalho.resultado()
+        except CancelledError:
+            with self._condicao:
+                self._pedido_cancelamento |= not self._pedido_pausa  # Cancelado por fora do agendador: encerra
+            return
+        anterior = self.sim
+        self.sim = Simulacao.de_estado(estado, diretorio_dados=anterior.config["diretorio_dados"])
+        self.rodadas_feitas = self.sim.rodada_atual - self.rodada_inicial
+        anterior.fechar(apagar=True)
+
+    @property
+    def ativa(self):
+        """True enquanto a thread não terminou (inclusive pausada)."""
+        return self.estado in (EXECUTANDO, PAUSADA)
+
+    @property
+    def pausada(self):
+        """True se a thread está parada entre duas rodadas (a simulação pode ser lida)."""
+        return self.estado == PAUSADA
+
+    @property
+    def posicao_na_fila(self):
+        """Trabalhos que começam antes do trecho atual no agendador (None se ele não está na fila)."""
+        trabalho = self._trabalho
+        if trabalho is None or trabalho.estado != "na_fila":
+            return None
+        return self.agendador.posicao(trabalho)
+
+    @property
+    def progresso(self):
+        return self.rodadas_feitas / self.num_rodadas if self.num_rodadas else 1.0
+
+    @property
+    def rodadas_por_segundo(self):
+        decorrido = (self.fim or time.perf_counter()) - self.inicio
+        return self.rodadas_feitas / decorrido if decorrido > 0 else 0.0
+
+    def historico_parcial(self):
+        """`historico_casa` das rodadas já concluídas (cópia rasa da lista)."""
+        return self.sim.historico_casa[:self.rodada_inicial + self.rodadas_feitas]
+
+    def pausar(self, esperar=True, timeout=None):
+        """Pede pausa ao fim da rodada em andamento; com `esperar`, só volta quando a thread parar."""
+        with self._condicao:
+            self._pedido_pausa = True
+            if esperar:
+                self._condicao.wait_for(lambda: self.estado != EXECUTANDO, timeout)
+
+    def retomar(self):
+        with self._condicao:
+            self._pedido_pausa = False
+            if self.estado == PAUSADA:
+                self.estado = EXECUTANDO  # Já aqui: um `pausar` logo em seguida espera a thread de novo
+            self._condicao.notify_all()
+
+    def cancelar(self, esperar=True, timeout=None):
+        """
+        Pede o fim da execução ao fim da rodada em andamento, ou encerra o trecho em andamento
+        no agendador (as rodadas feitas ficam na simulação).
+        """
+        with self._condicao:
+            self._pedido_cancelamento = True
+            self._condicao.notify_all()
+        if esperar:
+            self._thread.join(timeout)
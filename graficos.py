@@ -0,0 +1,184 @@
+"""
+Gráficos pesados do Simulador Principal, montados com orçamento de pontos.
+
+O gráfico de saldo de todos os usuários é desenhado com um único trace WebGL
+(usuários separados por NaN) e, acima do orçamento, com séries reduzidas por
+LTTB ou com faixas de quantis por rodada. O tamanho do gráfico fica limitado
+pelo orçamento, independente do número de usuários e de rodadas; só o usuário
+selecionado é desenhado com todos os pontos.
+"""
+import numpy as np
+import plotly.graph_objects as go
+
+# Máximo de pontos dos usuários de fundo (todas as séries somadas)
+MAX_PONTOS_GRAFICO = 60_000
+
+# Abaixo disso por usuário, as séries individuais deixam de ser legíveis e viram faixas de quantis
+MIN_PONTOS_POR_USUARIO = 40
+
+# Elementos da matriz de saldos lidos de uma vez ao calcular as faixas de quantis
+ELEMENTOS_POR_BLOCO = 2**22
+
+COR_FUNDO = 'rgba(192, 192, 192, 0.5)'
+COR_SELECIONADO = '#2ca02c'
+
+
+def lttb_lote(x, series, num_pontos):
+    """
+    Largest-Triangle-Three-Buckets aplicado a várias séries de uma vez.
+
+    Args:
+        x: array (n,) crescente, comum a todas as séries
+        series: array (num_series, n)
+        num_pontos: pontos por série na saída (>= 3)
+
+    Returns:
+        array (num_series, num_pontos) com os índices escolhidos de cada série
+        (o primeiro e o último ponto sempre ficam)
+    """
+    x = np.asarray(x, dtype=float)
+    series = np.asarray(series, dtype=float)
+    num_series, n = series.shape
+    if num_pontos >= n or num_pontos < 3:
+        return np.broadcast_to(np.arange(n), (num_series, n))
+
+    linhas = np.arange(num_series)
+    indices = np.empty((num_series, num_pontos), dtype=np.int64)
+    indices[:, 0] = 0
+    indices[:, -1] = n - 1
+    # Limites dos baldes internos (o primeiro e o último ponto ficam fora deles)
+    limites = np.linspace(1, n - 1, num_pontos - 1).astype(np.int64)
+
+    anterior = np.zeros(num_series, dtype=np.int64)
+    for b in range(num_pontos - 2):
+        inicio, fim = limites[b], max(limites[b + 1], limites[b] + 1)
+        # Média do balde seguinte (no último balde, o ponto final)
+        prox_inicio, prox_fim = fim, (limites[b + 2] if b + 2 < len(limites) else n)
+        media_x = x[prox_inicio:max(prox_fim, prox_inicio + 1)].mean()
+        media_y = series[:, prox_inicio:max(prox_fim, prox_inicio + 1)].mean(axis=1)
+
+        # Área do triângulo (anterior, candidato, média do próximo) para cada candidato do balde
+        xa, ya = x[anterior], series[linhas, anterior]
+        area = np.abs((xa[:, None] - media_x) * (series[:, inicio:fim] - ya[:, None])
+                      - (xa[:, None] - x[None, inicio:fim]) * (media_y[:, None] - ya[:, None]))
+        anterior = inicio + area.argmax(axis=1)
+        indices[:, b + 1] = anterior
+    return indices
+
+
+def _trace_unico(x, series):
+    """Todas as séries num trace WebGL só, separadas por NaN (linhas não se conectam)."""
+    num_series = len(series)
+    xs = np.column_stack([x, np.full(num_series, np.nan)]) if x.ndim == 2 else \
+        np.tile(np.append(x, np.nan), num_series)
+    ys = np.column_stack([series, np.full(num_series, np.nan)])
+    # float32 basta para o desenho e deixa o payload (arrays binários) com metade do tamanho
+    return go.Scattergl(x=xs.ravel().astype(np.float32), y=ys.ravel().astype(np.float32), mode='lines',
+                        line=dict(color=COR_FUNDO, width=1), connectgaps=False, showlegend=False, hoverinfo='skip')
+
+
+def _quantis_por_linha(matriz, niveis):
+    """
+    Quantis de cada linha (interpolação linear, como o padrão de np.quantile), ordenando `matriz`
+    no lugar. Com vários níveis, ordenar a linha sai mais barato que o np.partition do np.quantile.
+    """
+    matriz.sort(axis=1)
+    posicoes = np.asarray(niveis) * (matriz.shape[1] - 1)
+    abaixo = np.floor(posicoes).astype(np.int64)
+    acima = np.minimum(abaixo + 1, matriz.shape[1] - 1)
+    fracao = posicoes - abaixo
+    return (matriz[:, abaixo] + (matriz[:, acima] - matriz[:, abaixo]) * fracao).T
+
+
+def _faixas_quantis(x, saldos_por_rodada, excluido, max_pontos):
+    """
+    Faixas p5–p95 e p25–p75 e mediana dos saldos por rodada, sem o usuário `excluido`
+    (rodadas espaçadas se passar do orçamento).
+
+    Só as rodadas escolhidas são lidas da matriz (que pode ser um memmap), em blocos
+    de linhas, e os quantis saem direto de cada bloco.
+    """
+    num_rodadas = len(x)
+    pontos_por_serie = max(max_pontos // 5, 2)
+    selecao = np.arange(num_rodadas)
+    if num_rodadas > pontos_por_serie:
+        selecao = np.unique(np.linspace(0, num_rodadas - 1, pontos_por_serie).astype(np.int64))
+    x = x[selecao]
+
+    quantis = np.empty((5, len(selecao)))
+    linhas_por_bloco = max(ELEMENTOS_POR_BLOCO // saldos_por_rodada.shape[1], 1)
+    for inicio in range(0, len(selecao), linhas_por_bloco):
+        linhas = selecao[inicio:inicio + linhas_por_bloco]
+        bloco = np.delete(saldos_por_rodada[linhas], excluido, axis=1)
+        quantis[:, inicio:inicio + len(linhas)] = _quantis_por_linha(bloco, [0.05, 0.25, 0.5, 0.75, 0.95])
+    p5, p25, p50, p75, p95 = quantis
+
+    traces = []
+    for inferior, superior, opacidade, nome in ((p5, p95, 0.25, "p5–p95"), (p25, p75, 0.45, "p25–p75")):
+        traces.append(go.Scattergl(x=x, y=superior, mode='lines', line=dict(width=0), showlegend=False, hoverinfo='skip'))
+        traces.append(go.Scattergl(x=x, y=inferior, mode='lines', line=dict(width=0), fill='tonexty',
+                                   fillcolor=f'rgba(192, 192, 192, {opacidade})', name=f"Usuários {nome}",
+                                   hovertemplate=f'{nome}<br>Rodada: %{{x}}<br>Saldo: R$ %{{y:.2f}}<extra></extra>'))
+    traces.append(go.Scattergl(x=x, y=p50, mode='lines', line=dict(color='rgb(150, 150, 150)', width=1, dash='dot'),
+                               name="Mediana dos usuários",
+                               hovertemplate='Mediana<br>Rodada: %{x}<br>Saldo: R$ %{y:.2f}<extra></extra>'))
+    return traces
+
+
+def figura_saldos_usuarios(saldos_por_rodada, id_selecionado, nome_selecionado, saldo_inicial,
+                           max_pontos=MAX_PONTOS_GRAFICO):
+    """
+    Gráfico "Evolução do Saldo - Todos os Usuários".
+
+    Args:
+        saldos_por_rodada: matriz (rodadas + 1) × usuários (HistoricoSaldos.matriz)
+        id_selecionado: usuário desenhado por cima, com todos os pontos
+        nome_selecionado: nome do usuário selecionado (hover)
+        saldo_inicial: linha de referência
+        max_pontos: orçamento de pontos para os demais usuários
+
+    Até `max_pontos`, os demais usuários vão completos num único trace WebGL.
+    Acima disso, cada série é reduzida por LTTB; se sobrarem menos de
+    MIN_PONTOS_POR_USUARIO pontos por usuário, eles viram faixas de quantis por rodada.
+    """
+    num_linhas, num_usuarios = saldos_por_rodada.shape
+    rodadas = np.arange(num_linhas)
+    num_outros = num_usuarios - 1
+
+    fig = go.Figure()
+    if num_outros:
+        # +1 ponto por usuário para o separador NaN
+        pontos_por_usuario = max_pontos // num_outros - 1
+        if pontos_por_usuario >= MIN_PONTOS_POR_USUARIO:
+            # Séries individuais: poucos usuários (no máximo max_pontos / MIN_PONTOS_POR_USUARIO colunas)
+            series = np.delete(saldos_por_rodada, id_selecionado, axis=1).T
+            if pontos_por_usuario >= num_linhas:
+                fig.add_trace(_trace_unico(rodadas, series))
+            else:
+                indices = lttb_lote(rodadas, series, pontos_por_usuario)
+                fig.add_trace(_trace_unico(rodadas[indices], np.take_along_axis(series, indices, axis=1)))
+        else:
+            for trace in _faixas_quantis(rodadas, saldos_por_rodada, id_selecionado, max_pontos):
+                fig.add_trace(trace)
+
+    fig.add_trace(go.Scatter(
+        x=rodadas,
+        y=saldos_por_rodada[:, id_selecionado],
+        mode='lines',
+        name=f'{nome_selecionado} (Selecionado)',
+        line=dict(color=COR_SELECIONADO, width=3),
+        showlegend=False,
+        hovertemplate=f'<b>{nome_selecionado} (Selecionado)</b><br>Rodada: %{{x}}<br>Saldo: R$ %{{y:.2f}}<extra></extra>'
+    ))
+
+    # Adicionar linha horizontal do saldo inicial
+    fig.add_hline(y=saldo_inicial, line_dash="dash", line_color="green",
+                  opacity=0.5, annotation_text=f"Saldo Inicial (R$ {saldo_inicial:.2f})")
+    fig.update_layout(
+        title="Evolução do Saldo - Todos os Usuários",
+        xaxis_title="Rodada",
+        yaxis_title="Saldo (R$)",
+        showlegend=False,
+        height=500
+    )
+    return fig
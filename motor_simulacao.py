@@ -0,0 +1,1387 @@
+import copy
+import json
+import uuid
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from armazenamento_disco import ColunasEmDisco
+
+# --- Constantes e Configurações Iniciais ---
+VALOR_APOSTA_MINIMA = 5
+
+# Perfis de Jogador e suas configurações (AGORA AJUSTÁVEL NA SIDEBAR)
+# Estes serão os valores padrão que podem ser sobrescritos pela UI
+PERFIS_CONFIG_DEFAULT = {
+    "Conservador": {
+        "lambda_poisson": 1.5,
+        "prob_decidir_apostar": 0.6, # 60% de chance de apostar
+        "cor": "#1f77b4" # Azul padrão plotly
+    },
+    "Moderado": {
+        "lambda_poisson": 2.5,
+        "prob_decidir_apostar": 0.8, # 80% de chance de apostar
+        "cor": "#ff7f0e" # Laranja padrão plotly
+    },
+    "Arriscado": {
+        "lambda_poisson": 3.5,
+        "prob_decidir_apostar": 0.95, # 95% de chance de apostar
+        "cor": "#d62728" # Vermelho padrão plotly
+    }
+}
+LISTA_PERFIS = list(PERFIS_CONFIG_DEFAULT.keys())
+
+RESULTADOS_POSSIVEIS = ["Vitória", "Empate", "Derrota"] # Fixo para Futebol
+
+# Configuração padrão de uma simulação (mesmos valores iniciais da sidebar de sim1.py)
+CONFIG_PADRAO = {
+    "num_usuarios": 100,
+    "saldo_inicial": 100.0,
+    "margem_casa": 0.05,
+    "num_jogos_por_rodada": 10,
+    "rodadas_janela": 10,  # Janela das métricas recentes (lucro, margem e nº de apostas nas últimas N rodadas)
+    "rodadas_com_detalhe": None,  # Apostas uma a uma só das últimas N rodadas (None = todas); as demais viram resumo
+    "diretorio_dados": None,  # Se definido, apostas e saldos por rodada vão para arquivos mapeados em memória
+    "perfis": PERFIS_CONFIG_DEFAULT,
+}
+
+# Versão do formato dos arquivos de `Simulacao.salvar` (muda se as colunas guardadas mudarem)
+FORMATO_SNAPSHOT = 2
+# Formatos que `Simulacao.de_estado` ainda lê (o 1 guardava o índice por usuário com `fim` em int64)
+FORMATOS_SNAPSHOT_LIDOS = (1, 2)
+
+# Usuários são sorteados em blocos de tamanho fixo, cada um com o seu gerador.
+# Qualquer divisão em shards que respeite os blocos reproduz exatamente a execução em um processo.
+TAMANHO_BLOCO_USUARIOS = 8192
+
+# Poisson truncada: até este λ, inversão da CDF; acima, Poisson com rejeição do zero (P(0) < 1e-13)
+LAMBDA_MAX_INVERSAO = 30.0
+
+
+# --- Geradores Aleatórios ---
+
+def nova_semente():
+    """Semente aleatória (32 bits, curta o bastante para mostrar e digitar na interface)."""
+    return int(np.random.SeedSequence().generate_state(1)[0])
+
+class FluxosAleatorios:
+    """
+    Toda a aleatoriedade de uma simulação, derivada de uma única semente.
+
+    Cada etapa de cada rodada tem o seu próprio gerador (SeedSequence com
+    spawn_key), independente dos demais:
+        jogos(rodada)                 probabilidades dos jogos
+        resultados(rodada)            resultados finais dos jogos
+        usuarios(rodada, bloco)       decisões e apostas de um bloco de usuários
+
+    Como o gerador de um bloco não depende de nenhum outro, os blocos podem ser
+    executados em qualquer ordem ou processo com resultado idêntico.
+    """
+
+    JOGOS, RESULTADOS, USUARIOS = 0, 1, 2
+
+    def __init__(self, semente=None):
+        self.semente = nova_semente() if semente is None else int(semente)
+
+    def gerador(self, *chave):
+        return np.random.Generator(np.random.PCG64(np.random.SeedSequence(self.semente, spawn_key=chave)))
+
+    def jogos(self, rodada):
+        return self.gerador(rodada, self.JOGOS)
+
+    def resultados(self, rodada):
+        return self.gerador(rodada, self.RESULTADOS)
+
+    def usuarios(self, rodada, bloco):
+        return self.gerador(rodada, self.USUARIOS, bloco)
+
+# --- Funções Auxiliares (vetorizadas, NumPy) ---
+
+def poisson_truncada_em_1_lote(lambdas, rng):
+    """
+    Poisson truncada em 1 (valores >= 1) em lote, com um λ por posição (perfis misturados).
+
+    Inversão exata da CDF, sem rejeição: um único uniforme por posição e a CDF
+    truncada percorrida para todas as posições ao mesmo tempo, a partir de
+        P(K = 1) = λ / (e^λ - 1)    e    P(K = k + 1) = P(K = k) · λ / (k + 1)
+    Cada passo só olha as posições que ainda não chegaram ao seu uniforme, então
+    o custo é O(n · média de K).
+
+    Acima de LAMBDA_MAX_INVERSAO, e^λ estoura (λ ≳ 709) e a CDF levaria λ passos;
+    lá P(K = 0) é desprezível e a Poisson comum com rejeição do zero é exata e barata.
+    """
+    lambdas = np.asarray(lambdas, dtype=float)
+    u = rng.random(lambdas.shape)
+    valores = np.ones(lambdas.shape, dtype=np.int64)
+
+    grandes = np.flatnonzero(lambdas > LAMBDA_MAX_INVERSAO)
+    if grandes.size:
+        lambdas_grandes = lambdas.flat[grandes]
+        amostras = rng.poisson(lambdas_grandes)
+        while (zeros := np.flatnonzero(amostras == 0)).size:
+            amostras[zeros] = rng.poisson(lambdas_grandes[zeros])
+        valores.flat[grandes] = amostras
+
+    pendentes = np.flatnonzero(lambdas <= LAMBDA_MAX_INVERSAO)
+    lambdas_pend, u_pend = lambdas.flat[pendentes], u.flat[pendentes]
+    prob = lambdas_pend / np.expm1(lambdas_pend)  # P(K = 1)
+    acumulada = prob.copy()
+    k = 1
+    while pendentes.size:
+        # Continuam só as posições com uniforme acima da CDF (e ainda com massa à frente)
+        continua = (u_pend > acumulada) & (prob > 0)
+        pendentes, lambdas_pend, u_pend = pendentes[continua], lambdas_pend[continua], u_pend[continua]
+        prob, acumulada = prob[continua], acumulada[continua]
+        k += 1
+        valores.flat[pendentes] = k
+        prob = prob * lambdas_pend / k
+        acumulada = acumulada + prob
+    return valores
+
+def calcular_valor_aposta_lote(saldos):
+    """
+    Valor da aposta de cada saldo: 10% do saldo, no mínimo VALOR_APOSTA_MINIMA e no
+    máximo o próprio saldo (quem tem menos que o mínimo aposta tudo; saldo zero não aposta).
+    """
+    saldos = np.asarray(saldos, dtype=float)
+    # 10% do saldo, com piso no valor mínimo e teto no saldo disponível
+    # (se o saldo é menor que o mínimo, o teto faz o usuário apostar tudo)
+    valores = np.minimum(np.maximum(saldos * 0.10, VALOR_APOSTA_MINIMA), saldos)
+    valores = np.where(saldos > 0, valores, 0.0)
+    return np.round(valores, 2)
+
+def gerar_probabilidades_futebol_lote(formato, rng):
+    """
+    Probabilidades (Vitória, Empate, Derrota) de vários jogos de uma vez:
+    - Vitória: U(0.05, 0.70)
+    - Empate: U(0.10, 0.25)
+    - Derrota: 1 - Vitória - Empate
+    Tudo arredondado em 2 casas.
+
+    Args:
+        formato: número de jogos, ou uma tupla (ex.: (num_rodadas, num_jogos) para
+            gerar uma temporada inteira de uma vez)
+        rng: np.random.Generator
+
+    Returns:
+        array (*formato, 3) com as probabilidades de Vitória, Empate e Derrota
+    """
+    formato = (formato,) if np.isscalar(formato) else tuple(formato)
+    # Vitória e empate de cada jogo sorteados em sequência
+    sorteio = rng.uniform([0.05, 0.10], [0.70, 0.25], size=formato + (2,))
+    prob_vitoria = np.round(sorteio[..., 0], 2)
+    prob_empate = np.round(sorteio[..., 1], 2)
+    prob_derrota = np.round(1.0 - prob_vitoria - prob_empate, 2)
+
+    # Derrota negativa: empate fica com o restante e derrota vai a zero
+    negativa = prob_derrota < 0
+    prob_empate = np.where(negativa, np.round(1.0 - prob_vitoria, 2), prob_empate)
+    prob_derrota = np.where(negativa, 0.0, prob_derrota)
+
+    # Normalizar para garantir que soma seja exatamente 1.0
+    total = prob_vitoria + prob_empate + prob_derrota
+    prob_derrota = np.where(total != 1.0, np.round(1.0 - prob_vitoria - prob_empate, 2), prob_derrota)
+    return np.stack([prob_vitoria, prob_empate, prob_derrota], axis=-1)
+
+def calcular_odds_casa_lote(probabilidades, margem_casa_global):
+    """
+    Odds da casa para uma matriz de probabilidades (..., 3): odd = 1/p com a margem,
+    arredondada em 2 casas, mínimo 1.01 e 999.0 quando p = 0.
+    """
+    probabilidades = np.asarray(probabilidades, dtype=float)
+    com_prob = probabilidades != 0
+    odds_justas = np.divide(1.0, probabilidades, out=np.zeros_like(probabilidades), where=com_prob)
+    odds = np.maximum(1.01, np.round(odds_justas * (1 - margem_casa_global), 2))
+    return np.where(com_prob, odds, 999.0)
+
+def sortear_resultados_jogos(probabilidades, rng):
+    """Sorteia o índice do resultado final de cada jogo (uma linha de `probabilidades` por jogo)."""
+    acumuladas = np.cumsum(probabilidades, axis=1)
+    u = rng.random(len(probabilidades)) * acumuladas[:, -1]
+    idx = (u[:, None] >= acumuladas).sum(axis=1)
+    return np.minimum(idx, probabilidades.shape[1] - 1)
+
+def liquidar_apostas(id_usuario, id_jogo, idx_resultado_apostado, valor_apostado, odd_no_momento,
+                     idx_resultado_final, saldos):
+    """
+    Liquida as apostas de uma rodada.
+
+    Cada aposta guarda a posição do seu jogo (em `idx_resultado_final`) e do seu
+    usuário (em `saldos`), então o jogo e o usuário são acessados diretamente,
+    sem busca: custo O(apostas + usuários).
+
+    Returns:
+        tuple: (ganhou, valor_ganho, saldos) - saldos já creditados e limitados a >= 0
+    """
+    ganhou = idx_resultado_apostado == idx_resultado_final[id_jogo]
+    valor_ganho = np.where(ganhou, np.round(valor_apostado * odd_no_momento, 2), 0.0)
+    saldos = np.round(saldos + np.bincount(id_usuario, weights=valor_ganho, minlength=len(saldos)), 2)
+    return ganhou, valor_ganho, np.maximum(saldos, 0.0)
+
+def selecionar_apostas(apostas, indices):
+    """Subconjunto das colunas de apostas nas posições `indices` (ex.: as maiores premiações)."""
+    return {col: valores[indices] for col, valores in apostas.items()}
+
+def simular_bloco_usuarios(saldos, codigos_perfil, inicio, perfis_config, odds, idx_resultado_final, fluxos, rodada, bloco):
+    """
+    Apostas e liquidação de um bloco de usuários (ids `inicio` .. `inicio + len(saldos) - 1`).
+
+    Toda a aleatoriedade vem de `fluxos.usuarios(rodada, bloco)`, então o resultado
+    só depende do próprio bloco: pode rodar em qualquer processo. Os resultados dos
+    jogos já vêm sorteados, mas as apostas não dependem deles.
+
+    Returns:
+        dict: saldos finais do bloco, quem apostou e as colunas das apostas (ids globais)
+    """
+    rng = fluxos.usuarios(rodada, bloco)
+    saldos = np.array(saldos, dtype=float)
+    codigos_perfil = np.asarray(codigos_perfil)
+    num_usuarios = len(saldos)
+
+    prob_apostar = np.array([perfis_config[p]["prob_decidir_apostar"] for p in LISTA_PERFIS])[codigos_perfil]
+    lambdas = np.array([perfis_config[p]["lambda_poisson"] for p in LISTA_PERFIS])[codigos_perfil]
+
+    # PASSO 1: Quem decide apostar na rodada
+    apostou = rng.random(num_usuarios) < prob_apostar
+
+    # PASSO 2: Quantas apostas cada um deseja fazer (Poisson truncada em 1)
+    qtde_apostas_desejadas = np.zeros(num_usuarios, dtype=np.int64)
+    qtde_apostas_desejadas[apostou] = poisson_truncada_em_1_lote(lambdas[apostou], rng)
+
+    # PASSO 3: A j-ésima aposta de todos os usuários é feita de uma vez, enquanto houver saldo
+    blocos_usuario, blocos_valor, blocos_num_aposta = [], [], []
+    for j in range(int(qtde_apostas_desejadas.max()) if num_usuarios else 0):
+        ativos = np.flatnonzero((qtde_apostas_desejadas > j) & (saldos > 0))
+        valores = calcular_valor_aposta_lote(saldos[ativos])
+        ativos, valores = ativos[valores > 0], valores[valores > 0]
+        if not ativos.size:
+            break
+        saldos[ativos] = np.round(saldos[ativos] - valores, 2)
+        blocos_usuario.append(ativos)
+        blocos_valor.append(valores)
+        blocos_num_aposta.append(np.full(ativos.size, j))
+
+    if blocos_usuario:
+        id_usuario = np.concatenate(blocos_usuario)
+        valor_apostado = np.concatenate(blocos_valor)
+        num_aposta = np.concatenate(blocos_num_aposta)
+        # Reordena para a mesma ordem do loop original (usuário, depois aposta)
+        ordem = np.argsort(id_usuario, kind="stable")
+        id_usuario, valor_apostado, num_aposta = id_usuario[ordem], valor_apostado[ordem], num_aposta[ordem]
+    else:
+        id_usuario = np.zeros(0, dtype=np.int64)
+        valor_apostado = np.zeros(0)
+        num_aposta = np.zeros(0, dtype=np.int64)
+    num_apostas = len(id_usuario)
+
+    # Escolha de jogo e resultado para cada aposta
+    id_jogo = rng.integers(0, odds.shape[0], size=num_apostas)
+    idx_resultado_apostado = rng.integers(0, odds.shape[1], size=num_apostas)
+    odd_no_momento = odds[id_jogo, idx_resultado_apostado]
+
+    # Liquidar apostas
+    ganhou, valor_ganho, saldos = liquidar_apostas(
+        id_usuario, id_jogo, idx_resultado_apostado, valor_apostado, odd_no_momento, idx_resultado_final, saldos
+    )
+    return {
+        "saldos": saldos,
+        "apostou": apostou,
+        "apostas": {
+            "id_usuario": id_usuario + inicio,
+            "num_aposta": num_aposta,
+            "id_jogo": id_jogo,
+            "idx_resultado_apostado": idx_resultado_apostado,
+            "valor_apostado": valor_apostado,
+            "odd_no_momento": odd_no_momento,
+            "ganhou": ganhou,
+            "valor_ganho": valor_ganho,
+        },
+    }
+
+def simular_rodada_vetorizada(saldos, codigos_perfil, perfis_config, probabilidades, odds, fluxos, rodada, mapear=map):
+    """
+    Executa uma rodada completa com operações em lote, equivalente ao loop por usuário de sim1.py.
+
+    Args:
+        saldos: array (n_usuarios,) com o saldo de cada usuário no início da rodada
+        codigos_perfil: array (n_usuarios,) com o índice do perfil em LISTA_PERFIS
+        perfis_config: dicionário de configuração dos perfis (como PERFIS_CONFIG_DEFAULT)
+        probabilidades: array (n_jogos, 3) com as probabilidades reais de cada jogo
+        odds: array (n_jogos, 3) com as odds da casa de cada jogo
+        fluxos: FluxosAleatorios da simulação
+        rodada: número da rodada (seleciona os geradores da rodada)
+        mapear: função com a assinatura de `map` usada para executar os blocos de usuários
+            (ex.: `ProcessPoolExecutor.map` para dividir os usuários entre processos;
+            o resultado é idêntico ao de `map`)
+
+    Returns:
+        dict: saldos finais, quem apostou, resultados dos jogos, apostas (colunas
+        alinhadas, na ordem usuário → aposta) e agregados por perfil.
+    """
+    saldos = np.asarray(saldos, dtype=float)
+    codigos_perfil = np.asarray(codigos_perfil)
+    probabilidades = np.asarray(probabilidades, dtype=float)
+    odds = np.asarray(odds, dtype=float)
+    num_usuarios = len(saldos)
+    num_perfis = len(LISTA_PERFIS)
+
+    # Resultados dos jogos (gerador próprio da rodada, independente das apostas)
+    idx_resultado_final = sortear_resultados_jogos(probabilidades, fluxos.resultados(rodada))
+
+    # Apostas e liquidação, bloco a bloco de usuários
+    inicios = list(range(0, num_usuarios, TAMANHO_BLOCO_USUARIOS))
+    fins = [min(inicio + TAMANHO_BLOCO_USUARIOS, num_usuarios) for inicio in inicios]
+    partes = list(mapear(
+        simular_bloco_usuarios,
+        [saldos[i:f] for i, f in zip(inicios, fins)],
+        [codigos_perfil[i:f] for i, f in zip(inicios, fins)],
+        inicios,
+        [perfis_config] * len(inicios), [odds] * len(inicios), [idx_resultado_final] * len(inicios),
+        [fluxos] * len(inicios), [rodada] * len(inicios), range(len(inicios))
+    ))
+    if partes:
+        saldos = np.concatenate([p["saldos"] for p in partes])
+        apostou = np.concatenate([p["apostou"] for p in partes])
+        apostas = {col: np.concatenate([p["apostas"][col] for p in partes]) for col in partes[0]["apostas"]}
+    else:
+        saldos, apostou = saldos.copy(), np.zeros(0, dtype=bool)
+        apostas = simular_bloco_usuarios(saldos, codigos_perfil, 0, perfis_config, odds, idx_resultado_final,
+                                         fluxos, rodada, 0)["apostas"]
+
+    # Agregados por perfil
+    id_usuario, valor_apostado, valor_ganho = apostas["id_usuario"], apostas["valor_apostado"], apostas["valor_ganho"]
+    perfil_aposta = codigos_perfil[id_usuario]
+    return {
+        "saldos": saldos,
+        "apostou": apostou,
+        "idx_resultado_final": idx_resultado_final,
+        "apostas": {"id_usuario": id_usuario, "perfil": perfil_aposta,
+                    **{col: valores for col, valores in apostas.items() if col != "id_usuario"}},
+        "apostado_por_usuario": np.bincount(id_usuario, weights=valor_apostado, minlength=num_usuarios),
+        "apostado_por_perfil": np.bincount(perfil_aposta, weights=valor_apostado, minlength=num_perfis),
+        "pago_por_perfil": np.bincount(perfil_aposta, weights=valor_ganho, minlength=num_perfis),
+        "num_apostas_por_perfil": np.bincount(perfil_aposta, minlength=num_perfis),
+    }
+
+def estatisticas_rodada(rodada, resultado, usuarios):
+    """
+    Monta o dicionário `stats_rodada_casa` (mesmas chaves de sim1.py) a partir de uma
+    rodada vetorizada, com `usuarios` (TabelaUsuarios) já atualizado pela rodada.
+    """
+    apostas = resultado["apostas"]
+    total_apostado = float(apostas["valor_apostado"].sum())
+    total_pago = float(apostas["valor_ganho"].sum())
+
+    def por_perfil(valores, tipo=float):
+        return {p: tipo(valores[i]) for i, p in enumerate(LISTA_PERFIS)}
+
+    return {
+        "rodada": rodada,
+        "total_apostado_rodada": total_apostado,
+        "total_pago_rodada": total_pago,
+        "ggr_rodada": total_apostado - total_pago,
+        "num_apostas_rodada": int(len(apostas["id_usuario"])),
+        "apostado_por_perfil_rodada": por_perfil(resultado["apostado_por_perfil"]),
+        "pago_por_perfil_rodada": por_perfil(resultado["pago_por_perfil"]),
+        "ggr_por_perfil_rodada": por_perfil(resultado["apostado_por_perfil"] - resultado["pago_por_perfil"]),
+        "num_apostas_por_perfil_rodada": por_perfil(resultado["num_apostas_por_perfil"], int),
+        "saldo_medio_fim_rodada": usuarios.saldo_medio(),
+        "usuarios_ativos": usuarios.usuarios_ativos(),
+        "usuarios_lucrativos": usuarios.usuarios_lucrativos(),
+        "usuarios_zerados": usuarios.usuarios_zerados(),
+        "usuarios_ativos_por_perfil": por_perfil(usuarios.usuarios_ativos_por_perfil(), int),
+    }
+
+
+# --- Tabela Colunar de Usuários ---
+
+class TabelaUsuarios:
+    """
+    Usuários da simulação em formato colunar (um array NumPy por campo).
+
+    O id do usuário é a sua posição nos arrays. Os nomes ficam num array à
+    parte, fora das colunas numéricas usadas pelo motor.
+    """
+
+    def __init__(self, nomes, codigos_perfil, saldo_inicial):
+        num_usuarios = len(codigos_perfil)
+        self.nomes = np.asarray(nomes, dtype=object)
+        self.codigos_perfil = np.asarray(codigos_perfil, dtype=np.int8)
+        self.saldo_inicial = float(saldo_inicial)
+        self.saldos = np.full(num_usuarios, self.saldo_inicial)
+        self.rodadas_apostou = np.zeros(num_usuarios, dtype=np.int32)
+        self.total_apostado_pessoal = np.zeros(num_usuarios)
+        # Contadores acumulados na liquidação (evitam varrer o histórico de apostas)
+        self.num_apostas = np.zeros(num_usuarios, dtype=np.int32)
+        self.apostas_vencedoras = np.zeros(num_usuarios, dtype=np.int32)
+        self.total_ganho_pessoal = np.zeros(num_usuarios)
+        self.ultima_rodada = np.zeros(num_usuarios, dtype=np.int32)  # 0 = nunca apostou
+
+    @classmethod
+    def criar(cls, nomes, saldo_inicial):
+        """Cria a tabela distribuindo os perfis de forma uniforme (usuário i recebe o perfil i % nº de perfis)."""
+        codigos_perfil = np.arange(len(nomes)) % len(LISTA_PERFIS)
+        return cls(nomes, codigos_perfil, saldo_inicial)
+
+    def __len__(self):
+        return len(self.saldos)
+
+    @property
+    def ids(self):
+        return np.arange(len(self))
+
+    @property
+    def perfis(self):
+        return np.array(LISTA_PERFIS, dtype=object)[self.codigos_perfil]
+
+    @property
+    def balanco_pessoal(self):
+        return np.round(self.saldos - self.saldo_inicial, 2)
+
+    def registrar_rodada(self, rodada, resultado):
+        """Aplica aos usuários o resultado de `simular_rodada_vetorizada` da rodada `rodada`."""
+        apostas = resultado["apostas"]
+        num_usuarios = len(self)
+        self.saldos = resultado["saldos"]
+        self.rodadas_apostou += resultado["apostou"]
+        self.total_apostado_pessoal = np.round(self.total_apostado_pessoal + resultado["apostado_por_usuario"], 2)
+
+        apostas_na_rodada = np.bincount(apostas["id_usuario"], minlength=num_usuarios)
+        self.num_apostas += apostas_na_rodada.astype(np.int32)
+        self.apostas_vencedoras += np.bincount(apostas["id_usuario"][apostas["ganhou"]], minlength=num_usuarios).astype(np.int32)
+        self.total_ganho_pessoal = np.round(
+            self.total_ganho_pessoal + np.bincount(apostas["id_usuario"], weights=apostas["valor_ganho"], minlength=num_usuarios), 2)
+        self.ultima_rodada[apostas_na_rodada > 0] = rodada
+
+    def resumo_usuario(self, id_usuario):
+        """Totais de um usuário, lidos direto dos contadores (O(1))."""
+        num_apostas = int(self.num_apostas[id_usuario])
+        vencedoras = int(self.apostas_vencedoras[id_usuario])
+        return {
+            "num_apostas": num_apostas,
+            "total_apostado": float(self.total_apostado_pessoal[id_usuario]),
+            "total_ganho": float(self.total_ganho_pessoal[id_usuario]),
+            "apostas_vencedoras": vencedoras,
+            "taxa_acerto": vencedoras / num_apostas * 100 if num_apostas > 0 else 0.0,
+            "ultima_rodada": int(self.ultima_rodada[id_usuario]),
+        }
+
+    def usuarios_ativos(self):
+        return int(np.count_nonzero(self.saldos > 0))
+
+    def usuarios_lucrativos(self):
+        return int(np.count_nonzero(self.saldos > self.saldo_inicial))
+
+    def usuarios_zerados(self):
+        return int(np.count_nonzero(self.saldos == 0))
+
+    def usuarios_ativos_por_perfil(self):
+        return np.bincount(self.codigos_perfil[self.saldos > 0], minlength=len(LISTA_PERFIS))
+
+    def saldo_medio(self):
+        return float(self.saldos.mean()) if len(self) else 0.0
+
+    # Colunas guardadas em `estado()` além dos nomes
+    _COLUNAS_ESTADO = ("codigos_perfil", "saldos", "rodadas_apostou", "total_apostado_pessoal",
+                       "num_apostas", "apostas_vencedoras", "total_ganho_pessoal", "ultima_rodada")
+
+    def estado(self):
+        """Arrays que reconstroem a tabela (nomes como texto de largura fixa, sem objetos Python)."""
+        estado = {col: getattr(self, col) for col in self._COLUNAS_ESTADO}
+        estado["nomes"] = self.nomes.astype(str)
+        estado["saldo_inicial"] = np.array(self.saldo_inicial)
+        return estado
+
+    @classmethod
+    def de_estado(cls, estado):
+        tabela = cls(estado["nomes"].astype(object), estado["codigos_perfil"], float(estado["saldo_inicial"]))
+        for col in cls._COLUNAS_ESTADO:
+            setattr(tabela, col, estado[col].copy())  # Muda a cada rodada; o estado pode ser compartilhado
+        return tabela
+
+    def para_dataframe(self):
+        """DataFrame com as colunas da tabela (as colunas numéricas não são copiadas)."""
+        return pd.DataFrame({
+            "id": self.ids,
+            "nome": self.nomes,
+            "perfil": self.perfis,
+            "saldo": self.saldos,
+            "rodadas_apostou": self.rodadas_apostou,
+            "num_apostas": self.num_apostas,
+            "apostas_vencedoras": self.apostas_vencedoras,
+            "total_apostado_pessoal": self.total_apostado_pessoal,
+            "total_ganho_pessoal": self.total_ganho_pessoal,
+            "ultima_rodada": self.ultima_rodada,
+            "balanco_pessoal": self.balanco_pessoal,
+        }, copy=False)
+
+
+# --- Livro de Apostas Colunar ---
+
+# Colunas guardadas para cada aposta e seus tipos
+COLUNAS_APOSTAS = {
+    "id_usuario": np.int32,
+    "perfil": np.int8,
+    "id_jogo": np.int16,
+    "idx_resultado_apostado": np.int8,
+    "valor_apostado": np.float64,
+    "odd_no_momento": np.float64,
+    "valor_ganho": np.float64,
+    "ganhou": np.bool_,
+}
+
+# Colunas do índice por usuário: cada linha é o trecho de um usuário numa rodada
+# (as `quantidade` apostas a partir da posição `inicio` do bloco da rodada)
+COLUNAS_INDICE = {
+    "id_usuario": np.int32,
+    "rodada": np.int32,
+    "inicio": np.int32,
+    "quantidade": np.int32,
+}
+
+class LivroApostas:
+    """
+    Histórico de apostas colunar e só de acréscimo, com um bloco de arrays por rodada.
+
+    O bloco da rodada r fica na posição r - 1, então buscar uma rodada é O(1).
+    Dentro de cada bloco as apostas ficam ordenadas por usuário, então as apostas
+    de um usuário numa rodada são um trecho contíguo [inicio, fim).
+
+    Índice por usuário: cada rodada registrada gera os trechos (usuário, rodada,
+    inicio, quantidade) dos usuários que apostaram. Os trechos das últimas rodadas
+    ficam pendentes e, a cada RODADAS_POR_FUSAO rodadas, são fundidos num índice
+    ordenado por usuário. Buscar as apostas de um usuário custa O(log) no índice
+    mais as apostas dele, e não depende do tamanho do histórico.
+
+    Retenção: com `rodadas_com_detalhe` = N, só as últimas N rodadas guardam as
+    apostas uma a uma. As mais antigas ficam só com o resumo (totais, por perfil
+    e por jogo), que é gerado para toda rodada no registro. Saldos por rodada
+    (HistoricoSaldos), contadores por usuário (TabelaUsuarios) e `historico_casa`
+    não dependem do detalhe e continuam exatos.
+
+    Com `diretorio`, os blocos vão para arquivos (ColunasEmDisco) e na memória fica
+    só o trecho (inicio, fim) de cada rodada; ler uma rodada devolve views mapeadas.
+    O índice também vai para o disco (subdiretório "indice"): cada fusão acrescenta
+    os trechos pendentes, ordenados por usuário, como um segmento novo, e a busca
+    procura o usuário em cada segmento. Na memória ficam só os trechos pendentes
+    e o trecho (inicio, fim) de cada segmento.
+    """
+
+    RODADAS_POR_FUSAO = 32
+
+    def __init__(self, rodadas_com_detalhe=None, num_jogos=0, num_perfis=len(LISTA_PERFIS), diretorio=None):
+        if rodadas_com_detalhe is not None and rodadas_com_detalhe < 1:
+            raise ValueError("rodadas_com_detalhe deve ser pelo menos 1 (a última rodada sempre tem detalhe)")
+        self.rodadas_com_detalhe = rodadas_com_detalhe  # None = guarda o detalhe de todas as rodadas
+        self.num_jogos = num_jogos
+        self.num_perfis = num_perfis
+        self._blocos = []  # Bloco de cada rodada, ou o seu trecho no disco (None depois de resumida)
+        self._disco = ColunasEmDisco(diretorio, COLUNAS_APOSTAS) if diretorio is not None else None
+        self._resumos = []  # Resumo de cada rodada (todas)
+        self.primeira_detalhada = 1
+        # Índice fundido (ordenado por usuário e, dentro do usuário, por rodada); no modo em disco fica vazio
+        self._indice = {col: np.zeros(0, dtype=tipo) for col, tipo in COLUNAS_INDICE.items()}
+        self._indice_disco = ColunasEmDisco(Path(diretorio) / "indice", COLUNAS_INDICE) if diretorio is not None else None
+        self._segmentos = []  # Trecho (inicio, fim) de cada segmento do índice no disco
+        self._trechos_pendentes = []  # Trechos das rodadas ainda não fundidas, um dict por rodada
+
+    def __len__(self):
+        return len(self._blocos)
+
+    @property
+    def rodadas(self):
+        return list(range(1, len(self._blocos) + 1))
+
+    @property
+    def rodadas_detalhadas(self):
+        """Rodadas que ainda guardam as apostas uma a uma."""
+        return list(range(self.primeira_detalhada, len(self._blocos) + 1))
+
+    def detalhada(self, rodada):
+        return self.primeira_detalhada <= rodada <= len(self._blocos)
+
+    @property
+    def num_apostas(self):
+        return sum(r["num_apostas"] for r in self._resumos)
+
+    def _resumir(self, bloco):
+        """Agregados da rodada que sobrevivem ao descarte do detalhe."""
+        id_jogo, perfil = bloco["id_jogo"], bloco["perfil"]
+        apostado, ganho = bloco["valor_apostado"], bloco["valor_ganho"]
+        return {
+            "num_apostas": int(len(apostado)),
+            "total_apostado": float(apostado.sum()),
+            "total_pago": float(ganho.sum()),
+            "apostas_vencedoras": int(np.count_nonzero(bloco["ganhou"])),
+            "apostado_por_jogo": np.bincount(id_jogo, weights=apostado, minlength=self.num_jogos),
+            "pago_por_jogo": np.bincount(id_jogo, weights=ganho, minlength=self.num_jogos),
+            "num_apostas_por_jogo": np.bincount(id_jogo, minlength=self.num_jogos),
+            "apostado_por_perfil": np.bincount(perfil, weights=apostado, minlength=self.num_perfis),
+            "pago_por_perfil": np.bincount(perfil, weights=ganho, minlength=self.num_perfis),
+            "num_apostas_por_perfil": np.bincount(perfil, minlength=self.num_perfis),
+        }
+
+    def resumo(self, rodada):
+        """Resumo da rodada (existe para todas, detalhadas ou não)."""
+        return self._resumos[rodada - 1]
+
+    def registrar_rodada(self, rodada, apostas):
+        """Acrescenta as apostas (colunas de `simular_rodada_vetorizada`) da rodada seguinte."""
+        if rodada != len(self._blocos) + 1:
+            raise ValueError(f"Rodada {rodada} fora de ordem (esperada {len(self._blocos) + 1})")
+        bloco = {col: np.asarray(apostas[col], dtype=tipo) for col, tipo in COLUNAS_APOSTAS.items()}
+        if np.any(np.diff(bloco["id_usuario"]) < 0):
+            ordem = np.argsort(bloco["id_usuario"], kind="stable")
+            bloco = {col: valores[ordem] for col, valores in bloco.items()}
+        self._blocos.append(self._disco.acrescentar(bloco) if self._disco is not None else bloco)
+        self._resumos.append(self._resumir(bloco))
+
+        # Trechos [inicio, fim) de cada usuário que apostou na rodada
+        ids = bloco["id_usuario"]
+        if len(ids):
+            inicios = np.flatnonzero(np.r_[True, ids[1:] != ids[:-1]])
+            fins = np.r_[inicios[1:], len(ids)]
+        else:  # Rodada sem apostas: nenhum trecho (np.r_ acima daria um `fim` sem `inicio`)
+            inicios = fins = np.zeros(0, dtype=np.int64)
+        self._trechos_pendentes.append({
+            "id_usuario": ids[inicios].astype(np.int32),
+            "rodada": np.full(len(inicios), rodada, dtype=np.int32),
+            "inicio": inicios.astype(np.int32),
+            "quantidade": (fins - inicios).astype(np.int32),
+        })
+        if len(self._trechos_pendentes) >= self.RODADAS_POR_FUSAO:
+            self._fundir_indice()
+
+        # Rodada que saiu da janela de detalhe: fica só o resumo
+        if self.rodadas_com_detalhe is not None and rodada - self.primeira_detalhada >= self.rodadas_com_detalhe:
+            self._blocos[self.primeira_detalhada - 1] = None
+            self.primeira_detalhada += 1
+
+    def _fundir_indice(self):
+        """
+        Funde os trechos pendentes no índice ordenado por usuário (ordenação estável: rodadas continuam em ordem).
+        Trechos de rodadas já resumidas saem do índice aqui. No modo em disco, os pendentes viram um
+        segmento novo no arquivo do índice, sem reler nem regravar os segmentos anteriores.
+        """
+        if self._indice_disco is None:
+            partes = [self._indice] + self._trechos_pendentes
+        else:
+            partes = self._trechos_pendentes
+        self._trechos_pendentes = []
+        if not partes:
+            return
+        juntos = {col: np.concatenate([p[col] for p in partes]) for col in COLUNAS_INDICE}
+        if self.primeira_detalhada > 1:
+            manter = juntos["rodada"] >= self.primeira_detalhada
+            juntos = {col: valores[manter] for col, valores in juntos.items()}
+        ordem = np.argsort(juntos["id_usuario"], kind="stable")
+        fundido = {col: valores[ordem] for col, valores in juntos.items()}
+        if self._indice_disco is None:
+            self._indice = fundido
+        elif len(ordem):
+            self._segmentos.append(self._indice_disco.acrescentar(fundido))
+
+    def _partes_indice(self):
+        """Partes do índice, cada uma ordenada por usuário: o índice fundido (ou os segmentos no disco) e os pendentes."""
+        if self._indice_disco is None:
+            fundidas = [self._indice]
+        else:
+            fundidas = [self._indice_disco.ler(inicio, fim) for inicio, fim in self._segmentos]
+        return fundidas + self._trechos_pendentes
+
+    def _trechos_do_usuario(self, id_usuario):
+        """(rodadas, inicios, fins) dos trechos de um usuário, em ordem de rodada."""
+        rodadas, inicios, quantidades = [], [], []
+        for parte in self._partes_indice():
+            ids = parte["id_usuario"]
+            a, b = np.searchsorted(ids, id_usuario, side="left"), np.searchsorted(ids, id_usuario, side="right")
+            if a < b:
+                rodadas.append(parte["rodada"][a:b])
+                inicios.append(parte["inicio"][a:b])
+                quantidades.append(parte["quantidade"][a:b])
+        if not rodadas:
+            vazio = np.zeros(0, dtype=np.int32)
+            return vazio, vazio, vazio
+        rodadas, inicios = np.concatenate(rodadas), np.concatenate(inicios)
+        fins = inicios + np.concatenate(quantidades)
+        detalhadas = rodadas >= self.primeira_detalhada  # O índice fundido ainda pode ter rodadas já resumidas
+        return rodadas[detalhadas], inicios[detalhadas], fins[detalhadas]
+
+    def _bloco(self, rodada):
+        bloco = self._blocos[rodada - 1]
+        if bloco is None or self._disco is None:
+            return bloco
+        return self._disco.ler(*bloco)
+
+    def rodada(self, rodada):
+        """Colunas das apostas da rodada (views, sem cópia), ou None se a rodada já foi resumida."""
+        return self._bloco(rodada)
+
+    def ultima_rodada(self):
+        return self._bloco(len(self._blocos)) if self._blocos else None
+
+    def apostas_do_usuario(self, id_usuario):
+        """Apostas de um usuário nas rodadas detalhadas, com a coluna extra `rodada` (pelo índice por usuário)."""
+        rodadas, inicios, fins = self._trechos_do_usuario(id_usuario)
+        blocos = [self._bloco(r) for r in rodadas]
+        apostas = {col: np.concatenate([b[col][i:f] for b, i, f in zip(blocos, inicios, fins)])
+                   if blocos else np.zeros(0, dtype=tipo) for col, tipo in COLUNAS_APOSTAS.items()}
+        apostas["rodada"] = np.repeat(rodadas, fins - inicios).astype(np.int32)
+        return apostas
+
+    def estado(self):
+        """
+        Arrays que reconstroem o livro: as apostas das rodadas detalhadas concatenadas
+        (mais o tamanho de cada bloco), os resumos empilhados e o índice por usuário.
+        """
+        self._fundir_indice()  # Não muda o resultado das buscas
+        blocos = [self._bloco(r) for r in self.rodadas_detalhadas]
+        estado = {f"apostas.{col}": np.concatenate([b[col] for b in blocos]) if blocos else np.zeros(0, dtype=tipo)
+                  for col, tipo in COLUNAS_APOSTAS.items()}
+        estado["tamanhos_blocos"] = np.array([len(b["id_usuario"]) for b in blocos], dtype=np.int64)
+        estado["primeira_detalhada"] = np.array(self.primeira_detalhada)
+        for chave in (self._resumos[0] if self._resumos else {}):
+            estado[f"resumos.{chave}"] = np.array([r[chave] for r in self._resumos])
+        if self._indice_disco is None:
+            indice = self._indice
+        else:  # Segmentos do disco num índice só, ordenado por usuário (como o do modo em memória)
+            partes = self._partes_indice()
+            juntos = {col: np.concatenate([p[col] for p in partes]) if partes else np.zeros(0, dtype=tipo)
+                      for col, tipo in COLUNAS_INDICE.items()}
+            ordem = np.argsort(juntos["id_usuario"], kind="stable")
+            indice = {col: valores[ordem] for col, valores in juntos.items()}
+        estado.update({f"indice.{col}": valores for col, valores in indice.items()})
+        return estado
+
+    @classmethod
+    def de_estado(cls, estado, rodadas_com_detalhe=None, num_jogos=0, num_perfis=len(LISTA_PERFIS), diretorio=None):
+        livro = cls(rodadas_com_detalhe, num_jogos, num_perfis, diretorio)
+        colunas = {col: estado[f"apostas.{col}"] for col in COLUNAS_APOSTAS}
+        fins = np.cumsum(estado["tamanhos_blocos"]).tolist()
+        inicios = [0] + fins[:-1]
+        if livro._disco is not None:
+            livro._disco.acrescentar(colunas)  # Uma escrita por coluna; os trechos são os mesmos do arquivo salvo
+            detalhados = list(zip(inicios, fins))
+        else:
+            detalhados = [{col: valores[i:f] for col, valores in colunas.items()} for i, f in zip(inicios, fins)]
+        livro.primeira_detalhada = int(estado["primeira_detalhada"])
+        livro._blocos = [None] * (livro.primeira_detalhada - 1) + detalhados
+
+        resumos = {chave[len("resumos."):]: valores for chave, valores in estado.items() if chave.startswith("resumos.")}
+        livro._resumos = [{chave: (valores[r].item() if valores.ndim == 1 else valores[r]) for chave, valores in resumos.items()}
+                          for r in range(len(livro._blocos))]
+        if "indice.fim" in estado:  # Formato 1: `fim` em vez de `quantidade`, em int64
+            estado = {**estado, "indice.quantidade": estado["indice.fim"] - estado["indice.inicio"]}
+        indice = {col: np.asarray(estado[f"indice.{col}"], dtype=tipo) for col, tipo in COLUNAS_INDICE.items()}
+        if livro._indice_disco is not None:
+            if len(indice["id_usuario"]):
+                livro._segmentos.append(livro._indice_disco.acrescentar(indice))
+        else:
+            livro._indice = indice
+        return livro
+
+    def fechar(self, apagar=False):
+        if self._indice_disco is not None:
+            self._indice_disco.fechar(apagar)  # Antes: o diretório "indice" fica dentro do das apostas
+        if self._disco is not None:
+            self._disco.fechar(apagar)
+
+
+# --- Maiores Pagamentos ---
+
+def indices_maiores(valores, k):
+    """
+    Posições dos k maiores valores, do maior para o menor, com empates pela posição
+    (o mesmo resultado de `np.argsort(-valores, kind="stable")[:k]`), em O(n) em vez de O(n log n).
+    """
+    if k >= len(valores):
+        return np.argsort(-valores, kind="stable")
+    # k-ésimo maior valor: entram todos os acima dele e, dos empatados com ele, os primeiros
+    limite = -np.partition(-valores, k - 1)[k - 1]
+    acima = np.flatnonzero(valores > limite)
+    empatados = np.flatnonzero(valores == limite)[:k - len(acima)]
+    candidatos = np.concatenate([acima, empatados])
+    return candidatos[np.argsort(-valores[candidatos], kind="stable")]
+
+
+class MaioresPagamentos:
+    """
+    Maiores prêmios da última rodada e de todas as rodadas (ranking histórico), K de cada.
+
+    Atualizado na liquidação: os K maiores da rodada saem por seleção parcial (O(apostas),
+    sem ordenar a rodada) e são fundidos com os K do ranking histórico (O(K)). A interface
+    só lê os dois rankings, sem varrer nem ordenar o histórico de apostas.
+    """
+
+    def __init__(self, k=10):
+        self.k = k
+        self.da_rodada = self._vazio()  # Colunas das apostas + `rodada`, do maior prêmio para o menor
+        self.historico = self._vazio()  # Só apostas vencedoras, de qualquer rodada
+
+    @staticmethod
+    def _vazio():
+        vazio = {col: np.zeros(0, dtype=tipo) for col, tipo in COLUNAS_APOSTAS.items()}
+        vazio["rodada"] = np.zeros(0, dtype=np.int32)
+        return vazio
+
+    def registrar_rodada(self, rodada, apostas):
+        maiores = selecionar_apostas(apostas, indices_maiores(apostas["valor_ganho"], self.k))
+        maiores["rodada"] = np.full(len(maiores["valor_ganho"]), rodada, dtype=np.int32)
+        self.da_rodada = maiores
+
+        # Ranking histórico: os K atuais + os vencedores da rodada (em empate, fica a rodada mais antiga)
+        vencedoras = maiores["ganhou"]
+        juntos = {col: np.concatenate([self.historico[col], valores[vencedoras]]) for col, valores in maiores.items()}
+        self.historico = selecionar_apostas(juntos, indices_maiores(juntos["valor_ganho"], self.k))
+
+    def estado(self):
+        estado = {"k": np.array(self.k)}
+        estado.update({f"da_rodada.{col}": valores for col, valores in self.da_rodada.items()})
+        estado.update({f"historico.{col}": valores for col, valores in self.historico.items()})
+        return estado
+
+    @classmethod
+    def de_estado(cls, estado):
+        maiores = cls(int(estado["k"]))
+        maiores.da_rodada = {col: estado[f"da_rodada.{col}"] for col in maiores.da_rodada}
+        maiores.historico = {col: estado[f"historico.{col}"] for col in maiores.historico}
+        return maiores
+
+
+# --- Histórico de Saldos ---
+
+class HistoricoSaldos:
+    """
+    Saldo de cada usuário ao fim de cada rodada, numa matriz (rodadas + 1) × usuários
+    que cresce por acréscimo (a linha 0 é o saldo inicial).
+
+    Os saldos são gravados na liquidação, já com o limite em zero, então o gráfico
+    lê exatamente o saldo que o usuário tinha (sem reconstruir a partir das apostas).
+    A capacidade dobra quando enche, então acrescentar uma rodada é O(usuários) amortizado.
+
+    Com `diretorio`, as linhas são acrescentadas a um arquivo (ColunasEmDisco) e a
+    matriz é uma view mapeada dele, lida sob demanda.
+    """
+
+    def __init__(self, saldos_iniciais, capacidade_inicial=64, diretorio=None):
+        saldos_iniciais = np.asarray(saldos_iniciais, dtype=float)
+        self._num_usuarios = len(saldos_iniciais)
+        self._num_linhas = 1
+        self._disco = None
+        if diretorio is not None:
+            self._disco = ColunasEmDisco(diretorio, {"saldos": np.float64})
+            self._disco.acrescentar({"saldos": saldos_iniciais})
+            return
+        self._dados = np.empty((capacidade_inicial, self._num_usuarios))
+        self._dados[0] = saldos_iniciais
+
+    def __len__(self):
+        """Número de rodadas registradas (sem contar a linha inicial)."""
+        return self._num_linhas - 1
+
+    def registrar_rodada(self, saldos):
+        if self._disco is not None:
+            self._disco.acrescentar({"saldos": saldos})
+            self._num_linhas += 1
+            return
+        if self._num_linhas == len(self._dados):
+            novos = np.empty((2 * len(self._dados), self._dados.shape[1]))
+            novos[:self._num_linhas] = self._dados[:self._num_linhas]
+            self._dados = novos
+        self._dados[self._num_linhas] = saldos
+        self._num_linhas += 1
+
+    @property
+    def matriz(self):
+        """View (rodadas + 1) × usuários, sem cópia."""
+        if self._disco is not None:
+            saldos = self._disco.ler(0, self._num_linhas * self._num_usuarios)["saldos"]
+            return saldos.reshape(self._num_linhas, self._num_usuarios)
+        return self._dados[:self._num_linhas]
+
+    def do_usuario(self, id_usuario):
+        """Saldo do usuário da rodada 0 até a última (view)."""
+        return self.matriz[:, id_usuario]
+
+    def estado(self):
+        return {"matriz": self.matriz}
+
+    @classmethod
+    def de_estado(cls, estado, diretorio=None):
+        matriz = estado["matriz"]
+        historico = cls(matriz[0], capacidade_inicial=1, diretorio=diretorio)
+        if historico._disco is not None:
+            historico._disco.acrescentar({"saldos": matriz[1:].ravel()})
+        else:
+            historico._dados = matriz  # Capacidade = linhas salvas; dobra na próxima rodada
+        historico._num_linhas = len(matriz)
+        return historico
+
+    def fechar(self, apagar=False):
+        if self._disco is not None:
+            self._disco.fechar(apagar)
+
+# --- Histórico de Jogos ---
+
+class HistoricoJogos:
+    """
+    Jogos de cada rodada indexados pelo número da rodada (rodada r na posição r - 1).
+
+    Guarda só as matrizes (probabilidades, odds e resultado de cada jogo); os dicts
+    por jogo usados na interface são montados sob demanda para a rodada pedida.
+    """
+
+    def __init__(self):
+        self._rodadas = []
+
+    def __len__(self):
+        return len(self._rodadas)
+
+    @property
+    def rodadas(self):
+        return list(range(1, len(self._rodadas) + 1))
+
+    def registrar_rodada(self, rodada, probabilidades, odds, idx_resultado_final):
+        if rodada != len(self._rodadas) + 1:
+            raise ValueError(f"Rodada {rodada} fora de ordem (esperada {len(self._rodadas) + 1})")
+        self._rodadas.append({
+            "probabilidades": np.asarray(probabilidades, dtype=float),
+            "odds": np.asarray(odds, dtype=float),
+            "idx_resultado_final": np.asarray(idx_resultado_final, dtype=np.int8),
+        })
+
+    def rodada(self, rodada):
+        """Matrizes da rodada: probabilidades e odds (num_jogos, 3) e idx_resultado_final (num_jogos,)."""
+        return self._rodadas[rodada - 1]
+
+    def estado(self):
+        """Matrizes de todas as rodadas empilhadas: (rodadas, num_jogos, 3) e (rodadas, num_jogos)."""
+        return {campo: np.stack([r[campo] for r in self._rodadas]) if self._rodadas else np.zeros((0, 0, 3))
+                for campo in ("probabilidades", "odds", "idx_resultado_final")}
+
+    @classmethod
+    def de_estado(cls, estado):
+        historico = cls()
+        historico._rodadas = [{"probabilidades": p, "odds": o, "idx_resultado_final": i} for p, o, i in zip(
+            estado["probabilidades"], estado["odds"], estado["idx_resultado_final"].astype(np.int8))]
+        return historico
+
+    def descricoes(self, rodada):
+        return [f"Jogo {j + 1}" for j in range(len(self._rodadas[rodada - 1]["odds"]))]
+
+    def jogos(self, rodada):
+        """Jogos da rodada como lista de dicts (formato usado nas tabelas de sim1.py)."""
+        dados = self._rodadas[rodada - 1]
+        return [{
+            "id_jogo": f"JOGO_{rodada}_{j + 1}",
+            "descricao": f"Jogo {j + 1}",
+            "resultados_possiveis": RESULTADOS_POSSIVEIS,
+            "probabilidades_reais": probabilidades_reais,
+            "odds_casa": odds_casa,
+            "resultado_final": RESULTADOS_POSSIVEIS[idx_final],
+            "idx_resultado_final": idx_final
+        } for j, (probabilidades_reais, odds_casa, idx_final) in enumerate(zip(
+            dados["probabilidades"].tolist(), dados["odds"].tolist(), dados["idx_resultado_final"].tolist()))]
+
+
+def dataframe_apostas(apostas, nomes_usuarios, descricoes_jogos):
+    """
+    DataFrame de exibição a partir das colunas do livro de apostas.
+    Os rótulos (usuário, perfil, jogo e resultado) são obtidos por indexação direta.
+    """
+    df = pd.DataFrame({col: valores for col, valores in apostas.items()}, copy=False)
+    df["nome_usuario"] = np.asarray(nomes_usuarios, dtype=object)[apostas["id_usuario"]]
+    df["perfil_usuario"] = pd.Categorical.from_codes(apostas["perfil"], LISTA_PERFIS)
+    df["jogo_desc"] = np.asarray(descricoes_jogos, dtype=object)[apostas["id_jogo"]]
+    df["resultado_apostado"] = pd.Categorical.from_codes(apostas["idx_resultado_apostado"], RESULTADOS_POSSIVEIS)
+    return df
+
+
+# --- Simulação Completa ---
+
+class JanelaMovel:
+    """
+    Somas das últimas `tamanho` rodadas, para vários campos ao mesmo tempo.
+
+    Buffer circular (tamanho × campos) mais a soma corrente: cada rodada nova
+    entra na posição da que sai da janela, e a soma é corrigida só por essas
+    duas linhas. Atualizar e consultar custa O(campos), qualquer que seja o histórico.
+    """
+
+    def __init__(self, tamanho, num_campos):
+        self.tamanho = tamanho
+        self._valores = np.zeros((tamanho, num_campos))
+        self._soma = np.zeros(num_campos)
+        self._proxima = 0
+        self.preenchidas = 0  # Rodadas dentro da janela (< tamanho no começo da simulação)
+
+    def acrescentar(self, valores):
+        saindo = self._valores[self._proxima]
+        self._soma += valores - saindo
+        saindo[:] = valores
+        self._proxima = (self._proxima + 1) % self.tamanho
+        self.preenchidas = min(self.preenchidas + 1, self.tamanho)
+
+    @property
+    def soma(self):
+        return self._soma
+
+    def estado(self):
+        return {"valores": self._valores, "soma": self._soma,
+                "proxima": np.array(self._proxima), "preenchidas": np.array(self.preenchidas)}
+
+    @classmethod
+    def de_estado(cls, estado):
+        janela = cls(*estado["valores"].shape)
+        janela._valores, janela._soma = estado["valores"].copy(), estado["soma"].copy()
+        janela._proxima, janela.preenchidas = int(estado["proxima"]), int(estado["preenchidas"])
+        return janela
+
+
+class AcumuladosCasa:
+    """
+    Estatísticas acumuladas da casa, em arrays indexados pelo código do perfil
+    (a mesma ordem de LISTA_PERFIS / TabelaUsuarios.codigos_perfil).
+
+    Cada rodada soma os agregados por perfil de `simular_rodada_vetorizada` (um
+    array por campo, seja qual for o número de perfis) e alimenta a janela móvel
+    das últimas `rodadas_janela` rodadas.
+    """
+
+    # Campos da janela móvel: faturamento, pagamentos e nº de apostas de cada rodada
+    _APOSTADO, _PAGO, _NUM_APOSTAS = range(3)
+
+    def __init__(self, num_perfis, rodadas_janela=10):
+        self.num_rodadas = 0
+        self.apostado_por_perfil = np.zeros(num_perfis)
+        self.pago_por_perfil = np.zeros(num_perfis)
+        self.num_apostas_por_perfil = np.zeros(num_perfis, dtype=np.int64)
+        self.janela = JanelaMovel(rodadas_janela, 3)
+
+    def registrar_rodada(self, resultado):
+        """Soma os agregados por perfil da rodada (saída de `simular_rodada_vetorizada`)."""
+        apostado, pago = resultado["apostado_por_perfil"], resultado["pago_por_perfil"]
+        num_apostas = resultado["num_apostas_por_perfil"]
+        self.num_rodadas += 1
+        self.apostado_por_perfil += apostado
+        self.pago_por_perfil += pago
+        self.num_apostas_por_perfil += num_apostas
+        self.janela.acrescentar([apostado.sum(), pago.sum(), num_apostas.sum()])
+
+    @property
+    def ggr_por_perfil(self):
+        return self.apostado_por_perfil - self.pago_por_perfil
+
+    @property
+    def total_apostado(self):
+        return float(self.apostado_por_perfil.sum())
+
+    @property
+    def total_pago(self):
+        return float(self.pago_por_perfil.sum())
+
+    @property
+    def ggr(self):
+        return self.total_apostado - self.total_pago
+
+    @property
+    def num_apostas(self):
+        return int(self.num_apostas_por_perfil.sum())
+
+    @property
+    def margem_ggr(self):
+        """Lucro acumulado em % do faturamento acumulado."""
+        return self.ggr / self.total_apostado * 100 if self.total_apostado > 0 else 0.0
+
+    @property
+    def lucro_medio_por_rodada(self):
+        return self.ggr / self.num_rodadas if self.num_rodadas > 0 else 0.0
+
+    def recentes(self):
+        """Lucro, margem (%) e nº de apostas nas últimas rodadas da janela, sem olhar o histórico."""
+        apostado, pago, num_apostas = self.janela.soma.tolist()
+        ggr = apostado - pago
+        return {
+            "rodadas": self.janela.preenchidas,
+            "ggr": ggr,
+            "margem_ggr": ggr / apostado * 100 if apostado > 0 else 0.0,
+            "num_apostas": int(round(num_apostas)),
+        }
+
+    def estado(self):
+        estado = {"num_rodadas": np.array(self.num_rodadas), "apostado_por_perfil": self.apostado_por_perfil,
+                  "pago_por_perfil": self.pago_por_perfil, "num_apostas_por_perfil": self.num_apostas_por_perfil}
+        estado.update({f"janela.{campo}": valores for campo, valores in self.janela.estado().items()})
+        return estado
+
+    @classmethod
+    def de_estado(cls, estado):
+        acumulados = cls(len(estado["apostado_por_perfil"]))
+        acumulados.num_rodadas = int(estado["num_rodadas"])
+        for campo in ("apostado_por_perfil", "pago_por_perfil", "num_apostas_por_perfil"):
+            setattr(acumulados, campo, estado[campo].copy())
+        acumulados.janela = JanelaMovel.de_estado(
+            {campo[len("janela."):]: valores for campo, valores in estado.items() if campo.startswith("janela.")})
+        return acumulados
+
+def historico_casa_para_colunas(historico_casa):
+    """`historico_casa` como um array por campo (campos por perfil viram matrizes rodadas × perfis)."""
+    if not historico_casa:
+        return {}
+    return {chave: np.array([[h[chave][p] for p in LISTA_PERFIS] for h in historico_casa])
+            if isinstance(valor, dict) else np.array([h[chave] for h in historico_casa])
+            for chave, valor in historico_casa[0].items()}
+
+def historico_casa_de_colunas(colunas, chaves):
+    """Inverso de `historico_casa_para_colunas`: uma lista de dicts (uma por rodada), com as chaves em `chaves`."""
+    listas = {chave: colunas[chave].tolist() for chave in chaves}
+    num_rodadas = len(listas[chaves[0]]) if chaves else 0
+    return [{chave: (dict(zip(LISTA_PERFIS, listas[chave][r])) if colunas[chave].ndim == 2 else listas[chave][r])
+             for chave in chaves} for r in range(num_rodadas)]
+
+class Simulacao:
+    """
+    Simulação da casa de apostas, sem nenhuma dependência do Streamlit.
+
+    Exemplo:
+        sim = Simulacao({"num_usuarios": 10_000, "margem_casa": 0.05}, semente=42)
+        sim.avancar(500)
+        sim.casa_stats_acumuladas.ggr, sim.dataframe_historico()
+
+    `perfis_config` pode ser alterado entre rodadas (a sidebar de sim1.py faz isso).
+    Com a mesma configuração e a mesma `semente`, duas simulações são idênticas.
+    """
+
+    def __init__(self, config=None, nomes=None, semente=None):
+        self.config = copy.deepcopy(CONFIG_PADRAO)
+        self.config.update(copy.deepcopy(config or {}))
+        self.perfis_config = self.config["perfis"]
+        self.fluxos = FluxosAleatorios(semente)
+
+        num_usuarios = int(self.config["num_usuarios"])
+        if nomes is None:
+            nomes = [f"Usuário {i + 1}" for i in range(num_usuarios)]
+        self.usuarios = TabelaUsuarios.criar(nomes, float(self.config["saldo_inicial"]))
+
+        self.rodada_atual = 0
+        self.versao = 0  # Incrementada a cada rodada concluída (invalida os caches da interface)
+        self.id_execucao = uuid.uuid4().hex
+        self._preparar_diretorio()
+        self.historico_jogos = HistoricoJogos()  # Jogos de cada rodada, indexados pelo número da rodada
+        # Histórico colunar das apostas, um bloco por rodada (só as últimas `rodadas_com_detalhe` com detalhe)
+        self.historico_apostas = LivroApostas(self.config["rodadas_com_detalhe"], int(self.config["num_jogos_por_rodada"]),
+                                              diretorio=self._subdiretorio("apostas"))
+        self.historico_casa = []  # stats_rodada_casa de cada rodada
+        # Saldo de cada usuário ao fim de cada rodada
+        self.historico_saldos = HistoricoSaldos(self.usuarios.saldos, diretorio=self._subdiretorio("saldos"))
+        self.maiores_pagamentos = MaioresPagamentos()  # Top K prêmios da rodada e de todas as rodadas
+        self.casa_stats_acumuladas = AcumuladosCasa(len(LISTA_PERFIS), int(self.config["rodadas_janela"]))
+
+    def _preparar_diretorio(self):
+        # Arquivos desta execução (apostas e saldos por rodada), se a configuração pedir armazenamento em disco
+        self.diretorio = None
+        if self.config.get("diretorio_dados") is not None:
+            self.diretorio = Path(self.config["diretorio_dados"]) / self.id_execucao
+
+    def _subdiretorio(self, nome):
+        return self.diretorio / nome if self.diretorio is not None else None
+
+    @property
+    def saldo_inicial(self):
+        return self.usuarios.saldo_inicial
+
+    @property
+    def semente(self):
+        return self.fluxos.semente
+
+    @property
+    def versao_cache(self):
+        """Identifica o estado atual da simulação: muda só quando uma rodada termina (ou é outra simulação)."""
+        return (self.id_execucao, self.versao)
+
+    @property
+    def jogos_da_rodada_anterior(self):
+        """Jogos da última rodada executada, como dicts (lista vazia antes da primeira rodada)."""
+        return self.historico_jogos.jogos(self.rodada_atual) if self.rodada_atual > 0 else []
+
+    def gerar_jogos_rodada(self):
+        """
+        Gera os jogos da próxima rodada, ainda sem resultado.
+
+        Returns:
+            tuple: (probabilidades (num_jogos, 3), odds (num_jogos, 3))
+        """
+        # Todos os jogos da rodada de uma vez
+        probabilidades = gerar_probabilidades_futebol_lote(self.config["num_jogos_por_rodada"],
+                                                           self.fluxos.jogos(self.rodada_atual + 1))
+        odds = calcular_odds_casa_lote(probabilidades, self.config["margem_casa"])
+        return probabilidades, odds
+
+    def executar_rodada(self, mapear=map):
+        """
+        Executa uma rodada completa e devolve o seu `stats_rodada_casa`.
+        `mapear` executa os blocos de usuários (veja `simular_rodada_vetorizada`).
+        """
+        # 1. Gerar Jogos para a Rodada
+        probabilidades, odds = self.gerar_jogos_rodada()
+        self.rodada_atual += 1
+
+        # 2-4. Apostas, resultados dos jogos e liquidação em lote
+        resultado_rodada = simular_rodada_vetorizada(
+            saldos=self.usuarios.saldos,
+            codigos_perfil=self.usuarios.codigos_perfil,
+            perfis_config=self.perfis_config,
+            probabilidades=probabilidades,
+            odds=odds,
+            fluxos=self.fluxos,
+            rodada=self.rodada_atual,
+            mapear=mapear
+        )
+
+        # 5. Atualizar usuários (saldos, rodadas com aposta e total apostado)
+        self.usuarios.registrar_rodada(self.rodada_atual, resultado_rodada)
+        self.historico_saldos.registrar_rodada(self.usuarios.saldos)
+
+        # Salvar no histórico (apostas vão direto para o livro colunar)
+        self.historico_jogos.registrar_rodada(self.rodada_atual, probabilidades, odds,
+                                              resultado_rodada["idx_resultado_final"])
+        self.historico_apostas.registrar_rodada(self.rodada_atual, resultado_rodada["apostas"])
+        self.maiores_pagamentos.registrar_rodada(self.rodada_atual, self.historico_apostas.ultima_rodada())
+
+        stats_rodada_casa = estatisticas_rodada(self.rodada_atual, resultado_rodada, self.usuarios)
+        self.historico_casa.append(stats_rodada_casa)
+
+        # Atualizar estatísticas acumuladas (arrays por código de perfil + janela das últimas rodadas)
+        self.casa_stats_acumuladas.registrar_rodada(resultado_rodada)
+        self.versao += 1
+        return stats_rodada_casa
+
+    def avancar(self, num_rodadas=1, ao_fim_da_rodada=None, mapear=map):
+        """
+        Executa `num_rodadas` rodadas em sequência.
+
+        Args:
+            num_rodadas: quantas rodadas executar
+            ao_fim_da_rodada: função opcional chamada com a simulação após cada rodada
+                (usada para progresso; se levantar exceção, as rodadas já feitas ficam registradas)
+            mapear: executa os blocos de usuários de cada rodada (padrão: `map`, no próprio processo)
+
+        Returns:
+            list: `stats_rodada_casa` das rodadas executadas
+        """
+        stats = []
+        for _ in range(num_rodadas):
+            stats.append(self.executar_rodada(mapear))
+            if ao_fim_da_rodada is not None:
+                ao_fim_da_rodada(self)
+        return stats
+
+    def estado(self):
+        """
+        Estado completo como um dict plano de arrays ("componente.campo"), mais os
+        metadados em JSON na chave "meta". É o conteúdo do arquivo de `salvar`.
+
+        Os arrays podem ser views da simulação: copie-os se ela ainda for avançar.
+        """
+        componentes = {
+            "usuarios": self.usuarios.estado(),
+            "jogos": self.historico_jogos.estado(),
+            "apostas": self.historico_apostas.estado(),
+            "saldos": self.historico_saldos.estado(),
+            "maiores": self.maiores_pagamentos.estado(),
+            "acumuladas": self.casa_stats_acumuladas.estado(),
+            "casa": historico_casa_para_colunas(self.historico_casa),
+        }
+        estado = {f"{nome}.{campo}": valores for nome, campos in componentes.items() for campo, valores in campos.items()}
+        meta = {
+            "formato": FORMATO_SNAPSHOT,
+            # Perfis como estão agora (a sidebar pode tê-los mudado); o diretório de dados é de quem carrega
+            "config": {**self.config, "perfis": self.perfis_config, "diretorio_dados": None},
+            "semente": self.semente,
+            "rodada_atual": self.rodada_atual,
+            "versao": self.versao,
+            "chaves_casa": list(self.historico_casa[0]) if self.historico_casa else [],
+        }
+        estado["meta"] = np.array(json.dumps(meta, ensure_ascii=False))
+        return estado
+
+    @classmethod
+    def de_estado(cls, estado, diretorio_dados=None):
+        """
+        Reconstrói a simulação a partir de `estado()` (ou do conteúdo de um arquivo de `salvar`).
+
+        Os arrays que a simulação altera no lugar (contadores dos usuários, acumulados)
+        são copiados; os do histórico são só de acréscimo e ficam compartilhados com
+        `estado`. Por isso o mesmo estado, mesmo somente leitura, pode originar
+        várias simulações independentes (copy-on-write: veja CacheExecucoes).
+
+        `diretorio_dados` liga o armazenamento em disco na simulação reconstruída
+        (o estado não guarda o diretório da simulação original).
+        """
+        meta = json.loads(str(estado["meta"]))
+        if meta["formato"] not in FORMATOS_SNAPSHOT_LIDOS:
+            raise ValueError(f"Formato de arquivo {meta['formato']} não suportado (esperado {FORMATO_SNAPSHOT})")
+        estados = {}
+        for chave, valores in estado.items():
+            if chave != "meta":
+                nome, campo = chave.split(".", 1)
+                estados.setdefault(nome, {})[campo] = valores
+
+        sim = cls.__new__(cls)
+        sim.config = copy.deepcopy(CONFIG_PADRAO)
+        sim.config.update(meta["config"])
+        sim.config["diretorio_dados"] = str(diretorio_dados) if diretorio_dados is not None else None
+        sim.perfis_config = sim.config["perfis"]
+        sim.fluxos = FluxosAleatorios(meta["semente"])
+        sim.usuarios = TabelaUsuarios.de_estado(estados["usuarios"])
+
+        sim.rodada_atual = meta["rodada_atual"]
+        sim.versao = meta["versao"]
+        sim.id_execucao = uuid.uuid4().hex  # Execução nova: não reaproveita caches nem arquivos da original
+        sim._preparar_diretorio()
+        sim.historico_jogos = HistoricoJogos.de_estado(estados["jogos"])
+        sim.historico_apostas = LivroApostas.de_estado(
+            estados["apostas"], sim.config["rodadas_com_detalhe"], int(sim.config["num_jogos_por_rodada"]),
+            diretorio=sim._subdiretorio("apostas"))
+        sim.historico_casa = historico_casa_de_colunas(estados.get("casa", {}), meta["chaves_casa"])
+        sim.historico_saldos = HistoricoSaldos.de_estado(estados["saldos"], diretorio=sim._subdiretorio("saldos"))
+        sim.maiores_pagamentos = MaioresPagamentos.de_estado(estados["maiores"])
+        sim.casa_stats_acumuladas = AcumuladosCasa.de_estado(estados["acumuladas"])
+        return sim
+
+    def salvar(self, destino, comprimir=False):
+        """
+        Grava o estado completo num único arquivo .npz (um array por coluna, sem pickle).
+
+        `destino` pode ser um caminho ou um arquivo aberto em modo binário (ex.: io.BytesIO).
+        Como os geradores de cada rodada derivam só da semente e do número da rodada,
+        guardar a semente e a rodada atual basta para continuar a simulação exatamente
+        de onde parou. Com `comprimir=True` o arquivo fica menor e a gravação e a leitura, mais lentas.
+        """
+        (np.savez_compressed if comprimir else np.savez)(destino, **self.estado())
+
+    @classmethod
+    def carregar(cls, origem, diretorio_dados=None):
+        """
+        Reconstrói uma simulação gravada por `salvar` (caminho ou arquivo binário aberto).
+        Continuar a simulação carregada dá o mesmo resultado que continuar a original.
+        `diretorio_dados`: como em `de_estado`.
+        """
+        with np.load(origem, allow_pickle=False) as arquivo:
+            estado = {chave: arquivo[chave] for chave in arquivo.files}
+        return cls.de_estado(estado, diretorio_dados)
+
+    def fechar(self, apagar=False):
+        """Fecha os arquivos do armazenamento em disco (e os apaga, com `apagar=True`). Sem efeito se tudo está na memória."""
+        self.historico_apostas.fechar(apagar)
+        self.historico_saldos.fechar(apagar)
+        if apagar and self.diretorio is not None:
+            try:
+                self.diretorio.rmdir()
+            except OSError:
+                pass
+
+    def dataframe_historico(self):
+        """`historico_casa` como DataFrame (uma linha por rodada)."""
+        return pd.DataFrame(self.historico_casa)
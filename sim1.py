@@ -1,145 +1,184 @@
+import copy
+import io
+import os
+import uuid
 import streamlit as st
 import numpy as np
 import pandas as pd
-import random
 import matplotlib.pyplot as plt
 import plotly.graph_objects as go
 from faker import Faker # Adicionado
-
-# --- Constantes e Configurações Iniciais ---
-VALOR_APOSTA_MINIMA = 5
-
-# Perfis de Jogador e suas configurações (AGORA AJUSTÁVEL NA SIDEBAR)
-# Estes serão os valores padrão que podem ser sobrescritos pela UI
-PERFIS_CONFIG_DEFAULT = {
-    "Conservador": {
-        "lambda_poisson": 1.5,
-        "prob_decidir_apostar": 0.6, # 60% de chance de apostar
-        "cor": "#1f77b4" # Azul padrão plotly
-    },
-    "Moderado": {
-        "lambda_poisson": 2.5,
-        "prob_decidir_apostar": 0.8, # 80% de chance de apostar
-        "cor": "#ff7f0e" # Laranja padrão plotly
-    },
-    "Arriscado": {
-        "lambda_poisson": 3.5,
-        "prob_decidir_apostar": 0.95, # 95% de chance de apostar
-        "cor": "#d62728" # Vermelho padrão plotly
-    }
-}
-LISTA_PERFIS = list(PERFIS_CONFIG_DEFAULT.keys())
+from motor_simulacao import (
+    PERFIS_CONFIG_DEFAULT, LISTA_PERFIS,
+    Simulacao, dataframe_apostas, nova_semente, selecionar_apostas
+)
+from ensemble import QUANTIS_PADRAO, executar_ensemble
+from graficos import figura_saldos_usuarios
+from cache_derivados import CacheDerivados
+from cache_execucoes import CacheExecucoes, chave_execucao
+from execucao_fundo import ExecucaoEmFundo, CANCELADA, ERRO
+from agendador import AgendadorSimulacoes, FilaCheia
 
 fake = Faker('pt_BR')
 
-# --- Funções Auxiliares ---
+# Apostas uma a uma só das últimas N rodadas; as anteriores ficam resumidas (limita a memória da sessão)
+RODADAS_COM_DETALHE = 200
 
-def gerar_probabilidades_futebol():
-    """
-    Gera probabilidades para jogos de futebol (Vitória, Empate, Derrota)
-    - Vitória: U(0.05, 0.70)
-    - Empate: U(0.10, 0.25)  
-    - Derrota: 1 - Vitória - Empate
-    """
-    # Gerar probabilidade de vitória
-    prob_vitoria = round(random.uniform(0.05, 0.70), 2)
-    
-    # Gerar probabilidade de empate
-    prob_empate = round(random.uniform(0.10, 0.25), 2)
-    
-    # Calcular probabilidade de derrota
-    prob_derrota = round(1.0 - prob_vitoria - prob_empate, 2)
-    
-    # Garantir que as probabilidades sejam válidas
-    if prob_derrota < 0:
-        # Se derrota ficou negativa, ajustar empate
-        prob_empate = round(1.0 - prob_vitoria, 2)
-        prob_derrota = 0.0
-    
-    # Normalizar para garantir que soma seja exatamente 1.0
-    total = prob_vitoria + prob_empate + prob_derrota
-    if total != 1.0:
-        prob_derrota = round(1.0 - prob_vitoria - prob_empate, 2)
-    
-    return [prob_vitoria, prob_empate, prob_derrota]
+# Com esta variável de ambiente, apostas e saldos por rodada vão para arquivos mapeados nesse diretório
+# (memória residente limitada e todas as rodadas exploráveis, então o detalhe não é descartado)
+DIRETORIO_DADOS = os.environ.get("CASA_APOSTAS_DIRETORIO_DADOS")
 
-def calcular_odds_casa(probabilidades_reais, margem_casa_global):
-    final_odds = []
-    for p_real in probabilidades_reais:
-        if p_real == 0:
-            final_odds.append(999.0)
-        else:
-            fair_odd = 1 / p_real
-            house_odd = round(fair_odd * (1 - margem_casa_global), 2)
-            final_odds.append(max(1.01, house_odd)) # Garante odd mínima
-    return final_odds
+# Tempo limite de cada replicação do ensemble e de cada trecho do avanço rápido no agendador compartilhado (segundos)
+TIMEOUT_REPLICACAO = 300
 
-def simular_resultado_jogo(probabilidades_reais, resultados_possiveis):
-    return np.random.choice(resultados_possiveis, p=probabilidades_reais)
+# Maior ensemble da interface; também é o limite de trabalhos esperando por sessão no agendador
+# (um ensemble sempre cabe, e uma sessão não empilha um segundo enquanto o primeiro está na fila)
+MAX_REPLICACOES = 1000
 
-def poisson_truncada_em_1(lambda_param):
-    """
-    Gera um número aleatório de uma distribuição Poisson truncada em 1.
-    Ou seja, só retorna valores >= 1.
-    
-    Args:
-        lambda_param: Parâmetro lambda da distribuição Poisson
-    
-    Returns:
-        int: Número >= 1 seguindo distribuição Poisson truncada
-    """
-    while True:
-        valor = np.random.poisson(lambda_param)
-        if valor >= 1:
-            return valor
-
-# FUNÇÃO para calcular valor da aposta com base no perfil e regras
-def calcular_valor_aposta(saldo_usuario, perfil_usuario_config):
-    if saldo_usuario <= 0:
-        return 0.0
-
-    # REGRA 3 PRIMEIRO: Se valor mínimo > saldo do usuário → aposta todo o saldo
-    if VALOR_APOSTA_MINIMA > saldo_usuario:
-        return round(saldo_usuario, 2)
-
-    # 1. SEMPRE gera valor da aposta baseado no perfil (uniforme entre min e max %)
-    valor_proposto = saldo_usuario * 0.10 # FIXO em 10% do saldo
-
-    # 2. Se valor proposto < valor mínimo → aposta valor mínimo
-    if valor_proposto < VALOR_APOSTA_MINIMA:
-        valor_final_aposta = VALOR_APOSTA_MINIMA
-    else:
-        valor_final_aposta = valor_proposto
-    
-    # Garantir que não aposta mais que o saldo disponível
-    valor_final_aposta = min(valor_final_aposta, saldo_usuario)
-    
-    return round(valor_final_aposta, 2)
+
+@st.cache_resource
+def cache_execucoes():
+    """Execuções concluídas, compartilhadas entre todas as sessões deste processo."""
+    return CacheExecucoes()
+
+
+@st.cache_resource
+def agendador_simulacoes():
+    """Pool limitado de processos para os trabalhos pesados de todas as sessões (filas por sessão)."""
+    # Sem o __main__ (este script) nos processos: os trabalhos são funções de ensemble.py e execucao_fundo.py
+    return AgendadorSimulacoes(max_na_fila_por_sessao=MAX_REPLICACOES, importar_main=False)
 
 
 # --- Inicialização do Estado da Sessão Streamlit ---
-if 'simulacao_iniciada' not in st.session_state:
-    st.session_state.simulacao_iniciada = False
-    st.session_state.rodada_atual = 0
-    st.session_state.usuarios = []
-    st.session_state.historico_casa = []
-    st.session_state.jogos_da_rodada_anterior = []
-    st.session_state.apostas_da_rodada_anterior = []
-    st.session_state.historico_jogos = []  # Histórico de todos os jogos por rodada
-    st.session_state.historico_apostas = []  # Histórico de todas as apostas por rodada
+if 'simulacao' not in st.session_state:
+    st.session_state.simulacao = None  # Simulacao (motor_simulacao.py), criada na primeira rodada
     
     # Inicializa configs dos perfis no session_state para serem ajustáveis
-    st.session_state.perfis_config_dinamico = PERFIS_CONFIG_DEFAULT.copy()
-
-    # Estatísticas acumuladas (incluindo por perfil)
-    st.session_state.casa_stats_acumuladas = {
-        "total_apostado": 0.0, "total_pago": 0.0, "ggr": 0.0,
-        "num_apostas": 0,
-        "apostado_por_perfil": {p: 0.0 for p in LISTA_PERFIS},
-        "pago_por_perfil": {p: 0.0 for p in LISTA_PERFIS},
-        "ggr_por_perfil": {p: 0.0 for p in LISTA_PERFIS},
-        "num_apostas_por_perfil": {p: 0 for p in LISTA_PERFIS}
-    }
+    st.session_state.perfis_config_dinamico = copy.deepcopy(PERFIS_CONFIG_DEFAULT)
+
+if 'id_sessao' not in st.session_state:
+    st.session_state.id_sessao = uuid.uuid4().hex  # Dona dos trabalhos desta sessão no agendador
+
+if 'cache_derivados' not in st.session_state:
+    # Tabelas e gráficos do painel, reconstruídos só quando a simulação avança
+    st.session_state.cache_derivados = CacheDerivados()
+
+simulacao_iniciada = st.session_state.simulacao is not None
+
+# Avanço rápido em andamento (thread de fundo); ao terminar, os avisos vão para a sidebar e o painel volta
+execucao_fundo = st.session_state.get("execucao_fundo")
+if execucao_fundo is not None:
+    # Cada trecho concluído no agendador troca a simulação da execução: a da sessão é sempre a dela
+    st.session_state.simulacao = execucao_fundo.sim
+if execucao_fundo is not None and not execucao_fundo.ativa:
+    del st.session_state.execucao_fundo
+    if execucao_fundo.estado == ERRO:
+        st.session_state.erro_avanco = repr(execucao_fundo.erro)
+    elif execucao_fundo.estado == CANCELADA:
+        st.session_state.avanco_cancelado_na_rodada = execucao_fundo.sim.rodada_atual
+    execucao_fundo = None
+
+# --- Execução das Rodadas ---
+
+def executar_rodadas(num_rodadas, num_usuarios_input, saldo_inicial_input, margem_casa_input, semente_input,
+                     em_fundo=False):
+    """
+    Cria a simulação na primeira rodada e avança `num_rodadas` rodadas.
+    Não renderiza nada: toda a lógica fica no motor (Simulacao).
+    Com `em_fundo`, as rodadas rodam numa ExecucaoEmFundo guardada no session_state, em
+    trechos no agendador compartilhado (levanta FilaCheia se a fila da sessão estiver cheia).
+
+    Com semente escolhida e perfis sem mudança desde a criação, o resultado depende
+    só de (configuração, semente, rodadas) e passa pelo cache compartilhado entre sessões.
+    Só o fim de um avanço rápido completo é guardado: as rodadas avulsas são baratas de
+    refazer e, no cache limitado em bytes, tirariam o lugar dos avanços longos.
+    """
+    perfis_atuais = copy.deepcopy(st.session_state.perfis_config_dinamico)
+    sim = st.session_state.simulacao
+    if sim is None:
+        semente = nova_semente() if semente_input is None else int(semente_input)
+        config = config_inicial = {
+            "num_usuarios": int(num_usuarios_input),
+            "saldo_inicial": float(saldo_inicial_input),
+            "margem_casa": float(margem_casa_input),  # Margem fixa durante toda a simulação
+            "rodadas_com_detalhe": None if DIRETORIO_DADOS else RODADAS_COM_DETALHE,
+            "perfis": perfis_atuais
+        }
+        if semente_input is None:
+            config = None  # Semente aleatória não se repete entre sessões: não adianta guardar
+        st.session_state.config_compartilhavel = config
+        rodada_inicial = 0
+    else:
+        semente = sim.semente
+        config = st.session_state.get("config_compartilhavel")
+        if config is not None and config["perfis"] != perfis_atuais:
+            # Perfis mudaram no meio da simulação: o resultado passa a depender do histórico de cliques
+            config = st.session_state.config_compartilhavel = None
+        rodada_inicial = sim.rodada_atual
+
+    cache = cache_execucoes()
+    if config is not None:
+        estado = cache.obter(chave_execucao(config, semente, rodada_inicial + num_rodadas))
+        if estado is not None:
+            if sim is not None:
+                sim.fechar(apagar=True)
+            st.session_state.simulacao = Simulacao.de_estado(estado, diretorio_dados=DIRETORIO_DADOS)
+            st.session_state.simulacao.perfis_config = perfis_atuais
+            return
+
+    if sim is None:
+        fake.seed_instance(semente)  # Nomes também reproduzíveis
+        st.session_state.simulacao = sim = Simulacao(
+            config={**config_inicial, "diretorio_dados": DIRETORIO_DADOS},
+            nomes=[fake.name() for _ in range(num_usuarios_input)],
+            semente=semente
+        )
+    # Os parâmetros dos perfis podem mudar na sidebar entre rodadas. Vale a cópia de agora:
+    # mexer nos sliders durante um avanço em fundo não altera as rodadas em andamento
+    sim.perfis_config = perfis_atuais
+
+    def guardar_no_cache(sim):
+        # Avanço cancelado no meio não é guardado
+        if config is not None and sim.rodada_atual == rodada_inicial + num_rodadas:
+            cache.guardar(chave_execucao(config, semente, sim.rodada_atual), sim.estado())
+
+    if em_fundo:
+        st.session_state.execucao_fundo = ExecucaoEmFundo(sim, num_rodadas, ao_concluir=guardar_no_cache,
+                                                          agendador=agendador_simulacoes(),
+                                                          sessao=st.session_state.id_sessao,
+                                                          timeout=TIMEOUT_REPLICACAO)
+    else:
+        sim.avancar(num_rodadas)
+
+
+def gerar_arquivo_simulacao():
+    # Callback do botão Gerar: grava o estado atual em memória para o botão de download
+    sim = st.session_state.simulacao
+    destino = io.BytesIO()
+    sim.salvar(destino)
+    st.session_state.arquivo_simulacao = (sim.versao_cache, destino.getvalue())
+
+
+def carregar_simulacao():
+    # Callback do botão Carregar: roda antes dos widgets, então dá para ajustar os sliders dos perfis
+    arquivo = st.session_state.get("upload_simulacao")
+    if arquivo is None:
+        return
+    try:
+        sim = Simulacao.carregar(arquivo, diretorio_dados=DIRETORIO_DADOS)
+    except (ValueError, KeyError, OSError) as erro:
+        st.session_state.erro_carregamento = str(erro)
+        return
+    if st.session_state.simulacao is not None:
+        st.session_state.simulacao.fechar(apagar=True)
+    st.session_state.simulacao = sim
+    st.session_state.cache_derivados.limpar()
+    st.session_state.config_compartilhavel = None  # Histórico de perfis desconhecido
+    st.session_state.perfis_config_dinamico = copy.deepcopy(sim.perfis_config)
+    for perfil in LISTA_PERFIS:
+        st.session_state[f"prob_apostar_{perfil}"] = sim.perfis_config[perfil]["prob_decidir_apostar"]
+        st.session_state[f"lambda_{perfil}"] = sim.perfis_config[perfil]["lambda_poisson"]
+
 
 # --- Interface Streamlit ---
 
@@ -147,9 +186,11 @@ if 'simulacao_iniciada' not in st.session_state:
 with st.sidebar:
     st.header("⚙️ Controles da Simulação")
     
-    num_usuarios_input = st.number_input("Número de Usuários Iniciais", min_value=1, max_value=1000, value=100, step=10, disabled=st.session_state.simulacao_iniciada)
-    saldo_inicial_input = st.number_input("Saldo Inicial por Usuário (R$)", min_value=10, max_value=1000, value=100, step=10, disabled=st.session_state.simulacao_iniciada)
-    margem_casa_input = st.slider("Margem da Casa nas Odds (%)", min_value=0.0, max_value=20.0, value=5.0, step=0.1, format="%.1f%%", disabled=st.session_state.simulacao_iniciada) / 100.0
+    num_usuarios_input = st.number_input("Número de Usuários Iniciais", min_value=1, max_value=1000, value=100, step=10, disabled=simulacao_iniciada)
+    saldo_inicial_input = st.number_input("Saldo Inicial por Usuário (R$)", min_value=10, max_value=1000, value=100, step=10, disabled=simulacao_iniciada)
+    margem_casa_input = st.slider("Margem da Casa nas Odds (%)", min_value=0.0, max_value=20.0, value=5.0, step=0.1, format="%.1f%%", disabled=simulacao_iniciada) / 100.0
+    semente_input = st.number_input("Semente", min_value=0, max_value=2**32 - 1, value=None, step=1, placeholder="Aleatória",
+                                    disabled=simulacao_iniciada, help="Mesma semente e mesmos parâmetros = mesma simulação.")
     
   
     st.subheader("Comportamento dos Usuários")
@@ -157,7 +198,7 @@ with st.sidebar:
     st.caption("Parâmetros por Perfil de Apostador:")
     # Usar st.session_state para configs de perfil para persistência entre reruns de botões
     if 'perfis_config_dinamico' not in st.session_state:
-        st.session_state.perfis_config_dinamico = PERFIS_CONFIG_DEFAULT.copy()
+        st.session_state.perfis_config_dinamico = copy.deepcopy(PERFIS_CONFIG_DEFAULT)
 
     for perfil in LISTA_PERFIS:
         with st.expander(f"**Perfil: {perfil}**", expanded=False):
@@ -197,452 +238,151 @@ with st.sidebar:
 
     # Validação global antes de permitir iniciar/continuar
     pode_continuar = True # Adicionado para manter a variável, agora sempre permite se não houver outros erros
+    # Durante um avanço rápido em fundo, a simulação pertence à thread dele
+    simulacao_livre = execucao_fundo is None
 
     col1_btn, col2_btn = st.columns(2)
     with col1_btn:
-        if st.button("▶️ Iniciar / Próxima Rodada", type="primary", use_container_width=True, disabled=not pode_continuar):
-            st.session_state.simulacao_iniciada = True
-            st.session_state.rodada_atual += 1
-
-            # Inicializar usuários na primeira rodada (COM NOVOS CAMPOS)
-            if st.session_state.rodada_atual == 1:
-                # Salvar saldo inicial no session_state para uso posterior
-                st.session_state.saldo_inicial = float(saldo_inicial_input)
-                st.session_state.margem_casa_fixa = float(margem_casa_input) # Salvar margem da casa
-                st.session_state.usuarios = []
-                for i in range(num_usuarios_input):
-                    # Distribuição de perfis mais uniforme
-                    perfil_usuario = LISTA_PERFIS[i % len(LISTA_PERFIS)]
-                    st.session_state.usuarios.append({
-                        "id": i,
-                        "nome": fake.name(), # NOVO
-                        "email": fake.email(), # NOVO
-                        "perfil": perfil_usuario, # NOVO
-                        "saldo": float(saldo_inicial_input),
-                        "rodadas_apostou": 0,
-                        "total_apostado_pessoal": 0.0,
-                        "balanco_pessoal": 0.0
-                    })
-                # Resetar estatísticas acumuladas
-                st.session_state.casa_stats_acumuladas = {
-                    "total_apostado": 0.0, "total_pago": 0.0, "ggr": 0.0,
-                    "num_apostas": 0,
-                    "apostado_por_perfil": {p: 0.0 for p in LISTA_PERFIS},
-                    "pago_por_perfil": {p: 0.0 for p in LISTA_PERFIS},
-                    "ggr_por_perfil": {p: 0.0 for p in LISTA_PERFIS},
-                    "num_apostas_por_perfil": {p: 0 for p in LISTA_PERFIS}
-                }
-                st.session_state.historico_casa = []
-
-
-            # --- LÓGICA DA RODADA ---
-            # Estatísticas da rodada (incluindo por perfil)
-            stats_rodada_casa = {
-                "rodada": st.session_state.rodada_atual,
-                "total_apostado_rodada": 0.0,
-                "total_pago_rodada": 0.0,
-                "ggr_rodada": 0.0,
-                "num_apostas_rodada": 0,
-                "apostado_por_perfil_rodada": {p: 0.0 for p in LISTA_PERFIS},
-                "pago_por_perfil_rodada": {p: 0.0 for p in LISTA_PERFIS},
-                "ggr_por_perfil_rodada": {p: 0.0 for p in LISTA_PERFIS},
-                "num_apostas_por_perfil_rodada": {p: 0 for p in LISTA_PERFIS},
-                "saldo_medio_fim_rodada": 0.0
-            }
-            
-            apostas_nesta_rodada = []
-            jogos_da_rodada = []
-
-            # 1. Gerar Jogos para a Rodada (sempre 10 jogos)
-            num_jogos_desta_rodada = 10 # Valor fixo
-            jogos_da_rodada = []
-            # Usar a margem da casa definida no início da simulação se já tiver sido iniciada
-            margem_casa_atual = st.session_state.margem_casa_fixa if 'margem_casa_fixa' in st.session_state and st.session_state.rodada_atual > 1 else margem_casa_input
-
-            for j in range(num_jogos_desta_rodada):
-                resultados_possiveis = ["Vitória", "Empate", "Derrota"] # Fixo para Futebol
-                probabilidades_reais = gerar_probabilidades_futebol()
-                odds_casa = calcular_odds_casa(probabilidades_reais, margem_casa_atual)
-                
-                jogos_da_rodada.append({
-                    "id_jogo": f"JOGO_{st.session_state.rodada_atual}_{j+1}",
-                    "descricao": f"Jogo {j+1}",
-                    "resultados_possiveis": resultados_possiveis,
-                    "probabilidades_reais": probabilidades_reais,
-                    "odds_casa": odds_casa,
-                    "resultado_final": None, # Será definido após as apostas
-                    "idx_resultado_final": -1
-                })
-
-            # st.session_state.jogos_da_rodada_anterior = jogos_da_rodada # Movido para depois da resolução
-            st.session_state.apostas_da_rodada_anterior = [] # Limpar apostas antes de coletar novas
-
-            # 2. Usuários Decidem Apostar e Realizam Apostas (COM LÓGICA DE PERFIL)
-            for user in st.session_state.usuarios:
-                perfil_config_atual = st.session_state.perfis_config_dinamico[user["perfil"]]
-                prob_apostar_perfil = perfil_config_atual["prob_decidir_apostar"]
-                
-                # PASSO 1: Usuário decide SE vai apostar na rodada
-                if random.random() < prob_apostar_perfil:
-                    user["rodadas_apostou"] += 1
-                    
-                    # PASSO 2: Decide QUANTAS apostas vai fazer (Poisson truncada em 1)
-                    lambda_usuario = perfil_config_atual["lambda_poisson"]
-                    qtde_apostas_desejadas = poisson_truncada_em_1(lambda_usuario)
-                    
-                    # PASSO 3: Faz as apostas enquanto tiver dinheiro
-                    apostas_feitas = 0
-                    for _ in range(qtde_apostas_desejadas):
-                        # Verifica se ainda tem dinheiro para apostar
-                        if user["saldo"] <= 0:
-                            break
-                        
-                        # Calcula valor da aposta
-                        valor_aposta_calculado = calcular_valor_aposta(user["saldo"], perfil_config_atual)
-                        
-                        # Se não consegue apostar nem o valor mínimo, para
-                        if valor_aposta_calculado <= 0:
-                            break
-
-                        # Escolhe jogo e resultado para apostar
-                        jogo_escolhido = random.choice(jogos_da_rodada)
-                        idx_resultado_escolhido = random.randint(0, len(jogo_escolhido["resultados_possiveis"]) - 1)
-                        resultado_apostado_desc = jogo_escolhido["resultados_possiveis"][idx_resultado_escolhido]
-                        odd_apostada = jogo_escolhido["odds_casa"][idx_resultado_escolhido]
-
-                        # Registra a aposta
-                        apostas_nesta_rodada.append({
-                            "id_aposta": f"AP_{user['id']}_{user['rodadas_apostou']}_{apostas_feitas}", 
-                            "id_usuario": user["id"], "perfil_usuario": user["perfil"],
-                            "id_jogo": jogo_escolhido["id_jogo"], "jogo_desc": jogo_escolhido["descricao"],
-                            "resultado_apostado": resultado_apostado_desc, "idx_resultado_apostado": idx_resultado_escolhido,
-                            "valor_apostado": valor_aposta_calculado, "odd_no_momento": odd_apostada,
-                            "ganhou": None, "valor_ganho": 0.0
-                        })
-                        
-                        # Debita do saldo do usuário
-                        user["saldo"] = round(user["saldo"] - valor_aposta_calculado, 2)
-                        user["total_apostado_pessoal"] = round(user["total_apostado_pessoal"] + valor_aposta_calculado, 2)
-                        user["balanco_pessoal"] = round(user["balanco_pessoal"] - valor_aposta_calculado, 2)
-                        
-                        # Atualiza estatísticas da rodada
-                        stats_rodada_casa["total_apostado_rodada"] += valor_aposta_calculado
-                        stats_rodada_casa["num_apostas_rodada"] += 1
-                        stats_rodada_casa["apostado_por_perfil_rodada"][user["perfil"]] += valor_aposta_calculado
-                        stats_rodada_casa["num_apostas_por_perfil_rodada"][user["perfil"]] += 1
-                        
-                        apostas_feitas += 1
-            
-            st.session_state.apostas_da_rodada_anterior = apostas_nesta_rodada
-            
-            # Salvar apostas no histórico
-            st.session_state.historico_apostas.append({
-                "rodada": st.session_state.rodada_atual,
-                "apostas": apostas_nesta_rodada.copy()
-            })
-
-            # 3. Resolver Jogos (Simular resultado DEPOIS das apostas)
-            for jogo in jogos_da_rodada:
-                if jogo["resultado_final"] is None: # Só simula se ainda não tiver resultado
-                    jogo["resultado_final"] = simular_resultado_jogo(jogo["probabilidades_reais"], jogo["resultados_possiveis"])
-                    jogo["idx_resultado_final"] = jogo["resultados_possiveis"].index(jogo["resultado_final"])
-            
-            st.session_state.jogos_da_rodada_anterior = jogos_da_rodada # Agora atualiza com resultados
-            
-            # Salvar no histórico
-            st.session_state.historico_jogos.append({
-                "rodada": st.session_state.rodada_atual,
-                "jogos": jogos_da_rodada.copy()
-            })
-
-            # 4. Liquidar Apostas (COM LÓGICA DE PERFIL)
-            for aposta in apostas_nesta_rodada:
-                jogo_correspondente = next(j for j in jogos_da_rodada if j["id_jogo"] == aposta["id_jogo"])
-                # Não precisa buscar user aqui, já temos o perfil na aposta.
-                # Mas para atualizar saldo, precisamos do user:
-                user_da_aposta = next(u for u in st.session_state.usuarios if u["id"] == aposta["id_usuario"])
-
-                if aposta["idx_resultado_apostado"] == jogo_correspondente["idx_resultado_final"]:
-                    aposta["ganhou"] = True
-                    valor_ganho_bruto = round(aposta["valor_apostado"] * aposta["odd_no_momento"], 2)
-                    aposta["valor_ganho"] = valor_ganho_bruto
-                    
-                    user_da_aposta["saldo"] = round(user_da_aposta["saldo"] + valor_ganho_bruto, 2)
-                    user_da_aposta["balanco_pessoal"] = round(user_da_aposta["balanco_pessoal"] + valor_ganho_bruto, 2)
-                    
-                    stats_rodada_casa["total_pago_rodada"] += valor_ganho_bruto
-                    stats_rodada_casa["pago_por_perfil_rodada"][aposta["perfil_usuario"]] += valor_ganho_bruto
-                else:
-                    aposta["ganhou"] = False
-
-            # 5. Atualizar Estatísticas Finais da Rodada
-            for user in st.session_state.usuarios:
-                # Garante que saldo não fique negativo e arredonda para evitar problemas de precisão
-                user["saldo"] = max(0, round(user["saldo"], 2))
-                # Recalcular balanço pessoal de forma consistente para evitar erros de arredondamento
-                saldo_inicial_ref = getattr(st.session_state, 'saldo_inicial', 100.0)
-                user["balanco_pessoal"] = round(user["saldo"] - saldo_inicial_ref, 2)
-            
-            stats_rodada_casa["ggr_rodada"] = stats_rodada_casa["total_apostado_rodada"] - stats_rodada_casa["total_pago_rodada"]
-            for p in LISTA_PERFIS:
-                stats_rodada_casa["ggr_por_perfil_rodada"][p] = stats_rodada_casa["apostado_por_perfil_rodada"][p] - \
-                                                              stats_rodada_casa["pago_por_perfil_rodada"][p]
-
-            saldos_usuarios = [u['saldo'] for u in st.session_state.usuarios]
-            stats_rodada_casa["saldo_medio_fim_rodada"] = sum(saldos_usuarios) / len(saldos_usuarios) if saldos_usuarios else 0.0
-            
-            # Adicionar estatísticas de usuários por categoria
-            saldo_inicial_ref = getattr(st.session_state, 'saldo_inicial', 100.0)
-            stats_rodada_casa["usuarios_ativos"] = sum(1 for u in st.session_state.usuarios if u['saldo'] > 0)
-            stats_rodada_casa["usuarios_lucrativos"] = sum(1 for u in st.session_state.usuarios if u['saldo'] > saldo_inicial_ref)
-            stats_rodada_casa["usuarios_zerados"] = sum(1 for u in st.session_state.usuarios if u['saldo'] == 0)
-            
-            # Adicionar estatísticas de usuários ativos por perfil
-            stats_rodada_casa["usuarios_ativos_por_perfil"] = {}
-            for perfil in LISTA_PERFIS:
-                stats_rodada_casa["usuarios_ativos_por_perfil"][perfil] = sum(
-                    1 for u in st.session_state.usuarios if u['perfil'] == perfil and u['saldo'] > 0
-                )
-            
-            st.session_state.historico_casa.append(stats_rodada_casa)
-
-            # Atualizar estatísticas acumuladas
-            st.session_state.casa_stats_acumuladas["total_apostado"] += stats_rodada_casa["total_apostado_rodada"]
-            st.session_state.casa_stats_acumuladas["total_pago"] += stats_rodada_casa["total_pago_rodada"]
-            st.session_state.casa_stats_acumuladas["ggr"] = st.session_state.casa_stats_acumuladas["total_apostado"] - \
-                                                          st.session_state.casa_stats_acumuladas["total_pago"]
-            st.session_state.casa_stats_acumuladas["num_apostas"] += stats_rodada_casa["num_apostas_rodada"]
-            for p in LISTA_PERFIS:
-                st.session_state.casa_stats_acumuladas["apostado_por_perfil"][p] += stats_rodada_casa["apostado_por_perfil_rodada"][p]
-                st.session_state.casa_stats_acumuladas["pago_por_perfil"][p] += stats_rodada_casa["pago_por_perfil_rodada"][p]
-                st.session_state.casa_stats_acumuladas["ggr_por_perfil"][p] = st.session_state.casa_stats_acumuladas["apostado_por_perfil"][p] - \
-                                                                            st.session_state.casa_stats_acumuladas["pago_por_perfil"][p]
-                st.session_state.casa_stats_acumuladas["num_apostas_por_perfil"][p] += stats_rodada_casa["num_apostas_por_perfil_rodada"][p]
-
+        if st.button("▶️ Iniciar / Próxima Rodada", type="primary", use_container_width=True,
+                     disabled=not (pode_continuar and simulacao_livre)):
+            executar_rodadas(1, num_usuarios_input, saldo_inicial_input, margem_casa_input, semente_input)
 
     with col2_btn:
         if st.button("🔄 Resetar Simulação", use_container_width=True):
-            # Mantém as configs da sidebar, mas reseta o resto
-            st.session_state.simulacao_iniciada = False
-            st.session_state.rodada_atual = 0
-            st.session_state.usuarios = []
-            st.session_state.historico_casa = []
-            st.session_state.jogos_da_rodada_anterior = []
-            st.session_state.apostas_da_rodada_anterior = []
-            st.session_state.historico_jogos = []
-            st.session_state.historico_apostas = []
-            # Resetar saldo inicial também
-            if 'saldo_inicial' in st.session_state:
-                del st.session_state.saldo_inicial
-            # Não resetar st.session_state.perfis_config_dinamico aqui
-            st.session_state.casa_stats_acumuladas = {
-                "total_apostado": 0.0, "total_pago": 0.0, "ggr": 0.0,
-                "num_apostas": 0,
-                "apostado_por_perfil": {p: 0.0 for p in LISTA_PERFIS},
-                "pago_por_perfil": {p: 0.0 for p in LISTA_PERFIS},
-                "ggr_por_perfil": {p: 0.0 for p in LISTA_PERFIS},
-                "num_apostas_por_perfil": {p: 0 for p in LISTA_PERFIS}
-            }
+            # Mantém as configs da sidebar (perfis_config_dinamico), mas descarta a simulação
+            if execucao_fundo is not None:
+                execucao_fundo.cancelar()  # Espera a rodada em andamento antes de fechar a simulação
+                st.session_state.simulacao = execucao_fundo.sim  # Pode ter mudado com o último trecho
+                del st.session_state.execucao_fundo
+            if st.session_state.simulacao is not None:
+                st.session_state.simulacao.fechar(apagar=True)  # Arquivos do armazenamento em disco, se houver
+            st.session_state.simulacao = None
+            st.session_state.cache_derivados.limpar()
+            st.session_state.pop("arquivo_simulacao", None)
+            st.session_state.pop("config_compartilhavel", None)
             st.rerun()
 
-# --- Painel Principal ---
-if not st.session_state.simulacao_iniciada:
-    st.info("👈 Configure os parâmetros na barra lateral e clique em 'Iniciar / Próxima Rodada'.")
-    if not pode_continuar:
-        st.error("Existem erros de configuração nos Perfis de Apostador na barra lateral. Ajuste-os para continuar.")
-else:
-    st.title("🎲 Simulador Principal: Os números 'ocultos' da casa de apostas! ")
-    st.header(f"📊 Resultados da Rodada: {st.session_state.rodada_atual}")
-    
-    if st.session_state.historico_casa:
-        stats_ultima_rodada = st.session_state.historico_casa[-1]
-        
-        # PRIMEIRA LINHA - Métricas da Casa/Rodada
-        m_col1, m_col2, m_col3, m_col4, m_col5 = st.columns(5)
-        
-        # Faturamento, Pagamentos, Lucro
-        m_col1.metric("Faturamento Rodada", f"R$ {stats_ultima_rodada['total_apostado_rodada']:.2f}")
-        m_col2.metric("Pagamentos Rodada", f"R$ {stats_ultima_rodada['total_pago_rodada']:.2f}")
-        
-        ggr_rodada_val = stats_ultima_rodada['ggr_rodada']
-        handle_rodada = stats_ultima_rodada['total_apostado_rodada']
-        
-        # Calcular percentual do Lucro em relação ao Faturamento
-        if handle_rodada > 0:
-            percentual_ggr = (ggr_rodada_val / handle_rodada) * 100
-        else:
-            percentual_ggr = 0
-        
-        delta_text = f"{percentual_ggr:.1f}%"
-        delta_color_ggr = "normal"
-        
-        m_col3.metric("Lucro Rodada", f"R$ {ggr_rodada_val:.2f}", 
-                      delta=delta_text, delta_color=delta_color_ggr)
-        
-        # Número de apostas
-        num_apostas = stats_ultima_rodada['num_apostas_rodada']
-        m_col4.metric("Nº Apostas Rodada", num_apostas)
-        
-        # Valor médio apostado na rodada
-        valor_medio_apostado = (handle_rodada / num_apostas) if num_apostas > 0 else 0
-        m_col5.metric("Valor Médio Apostado", f"R$ {valor_medio_apostado:.2f}")
-
-        # SEGUNDA LINHA - Métricas dos Usuários
-        u_col1, u_col2, u_col3, u_col4, u_col5 = st.columns(5)
-        
-        total_usuarios = len(st.session_state.usuarios)
-        
-        # Calcular usuários lucrativos (saldo > saldo inicial)
-        saldo_inicial_ref = getattr(st.session_state, 'saldo_inicial', 100.0)  # Fallback para 100 se não existir
-        usuarios_lucrativos = sum(1 for u in st.session_state.usuarios if u['saldo'] > saldo_inicial_ref)
-        perc_lucrativos = (usuarios_lucrativos / total_usuarios * 100) if total_usuarios > 0 else 0
-        
-        # Calcular usuários ativos (saldo > 0)
-        usuarios_ativos = sum(1 for u in st.session_state.usuarios if u['saldo'] > 0) 
-        
-        # Calcular usuários falidos (saldo = 0)
-        usuarios_falidos = sum(1 for u in st.session_state.usuarios if u['saldo'] == 0) 
-        
-        # Saldo médio (total de dinheiro / total de usuários)
-        total_dinheiro = sum(u['saldo'] for u in st.session_state.usuarios)
-        saldo_medio = total_dinheiro / total_usuarios if total_usuarios > 0 else 0
-        
-        u_col1.metric("Total de Usuários", total_usuarios)
-        u_col2.metric("Usuários Lucrativos", usuarios_lucrativos)
-        u_col3.metric("Usuários Ativos", usuarios_ativos, help="Saldo > R$ 0,00 (ainda tem dinheiro)")
-        u_col4.metric("Usuários Falidos", usuarios_falidos, help="Saldo = R$ 0,00 (sem dinheiro)")
-        u_col5.metric("Saldo Médio", f"R$ {saldo_medio:.2f}")
-
-         
-        
-        # Criar 5 colunas para as métricas
-        result_col1, result_col2, result_col3, result_col4, result_col5 = st.columns(5)
-        
-        if st.session_state.apostas_da_rodada_anterior:
-            apostas = st.session_state.apostas_da_rodada_anterior
-            
-            # Volume por perfil (3 primeiras colunas)
-            volume_por_perfil = {}
-            for a in apostas:
-                perfil = a['perfil_usuario']
-                volume_por_perfil[perfil] = volume_por_perfil.get(perfil, 0) + a['valor_apostado']
-            
-            result_col1.metric("Volume Conservador", f"R$ {volume_por_perfil.get('Conservador', 0):.2f}")
-            result_col2.metric("Volume Moderado", f"R$ {volume_por_perfil.get('Moderado', 0):.2f}")
-            result_col3.metric("Volume Arriscado", f"R$ {volume_por_perfil.get('Arriscado', 0):.2f}") 
+    # Avanço rápido: as rodadas rodam numa thread de fundo; o painel mostra o progresso e volta no final
+    st.subheader("⏩ Avanço Rápido")
+    num_rodadas_avanco = st.number_input("Número de Rodadas", min_value=1, max_value=1000, value=50, step=10, key="num_rodadas_avanco")
+    if st.button(f"⏩ Simular {num_rodadas_avanco} Rodadas", use_container_width=True,
+                 disabled=not (pode_continuar and simulacao_livre)):
+        try:
+            executar_rodadas(num_rodadas_avanco, num_usuarios_input, saldo_inicial_input, margem_casa_input,
+                             semente_input, em_fundo=True)
+            st.rerun()  # Painel de progresso no lugar do painel da simulação
+        except FilaCheia as erro:
+            st.warning(f"Servidor ocupado: {erro}")
+    if 'avanco_cancelado_na_rodada' in st.session_state:
+        st.warning(f"Avanço rápido cancelado após a rodada {st.session_state.avanco_cancelado_na_rodada}.")
+        del st.session_state.avanco_cancelado_na_rodada
+    if 'erro_avanco' in st.session_state:
+        st.error(f"Avanço rápido interrompido por erro: {st.session_state.erro_avanco}")
+        del st.session_state.erro_avanco
+
+    # Ensemble: K replicações independentes com a configuração atual, em paralelo
+    st.subheader("🎲 Ensemble (Monte Carlo)")
+    ens_col1, ens_col2 = st.columns(2)
+    num_replicacoes = ens_col1.number_input("Replicações", min_value=2, max_value=MAX_REPLICACOES, value=32, step=8, key="num_replicacoes")
+    num_rodadas_ensemble = ens_col2.number_input("Rodadas", min_value=2, max_value=1000, value=100, step=10, key="num_rodadas_ensemble")
+    if st.button(f"🎲 Rodar {num_replicacoes} Replicações", use_container_width=True, disabled=not pode_continuar):
+        barra_ensemble = st.progress(0.0, text="Na fila...")
+        # Replicações vão para o agendador compartilhado; Cancelar pede um rerun, que as tira da fila
+        st.button("⏹️ Cancelar", use_container_width=True, key="cancelar_ensemble")
+        try:
+            st.session_state.resultado_ensemble = executar_ensemble(
+                config={
+                    "num_usuarios": int(num_usuarios_input),
+                    "saldo_inicial": float(saldo_inicial_input),
+                    "margem_casa": float(margem_casa_input),
+                    "perfis": st.session_state.perfis_config_dinamico
+                },
+                num_rodadas=int(num_rodadas_ensemble),
+                num_replicacoes=int(num_replicacoes),
+                semente=semente_input,
+                ao_concluir=lambda feitas, total: barra_ensemble.progress(feitas / total, text=f"Replicação {feitas}/{total}"),
+                agendador=agendador_simulacoes(),
+                sessao=st.session_state.id_sessao,
+                timeout=TIMEOUT_REPLICACAO,
+                ao_aguardar=lambda posicao: barra_ensemble.progress(
+                    0.0, text=f"Na fila: {posicao} trabalhos de outras sessões antes" if posicao else "Rodando...")
+            )
+        except FilaCheia as erro:
+            st.warning(f"Servidor ocupado: {erro}")
+        except TimeoutError:
+            st.error(f"Replicação passou do tempo limite ({TIMEOUT_REPLICACAO} s). Tente menos usuários ou rodadas.")
+        barra_ensemble.empty()
+
+    if st.session_state.simulacao is not None:
+        st.caption(f"🎲 Semente da simulação: `{st.session_state.simulacao.semente}`")
+
+    # Salvar / carregar: estado completo num arquivo .npz (colunas binárias); a simulação carregada continua igual
+    st.subheader("💾 Salvar / Carregar")
+    if st.session_state.simulacao is not None:
+        sim_atual = st.session_state.simulacao
+        arquivo_pronto = st.session_state.get("arquivo_simulacao")
+        if arquivo_pronto is not None and arquivo_pronto[0] == sim_atual.versao_cache:
+            st.download_button("⬇️ Baixar Arquivo", data=arquivo_pronto[1], use_container_width=True,
+                               file_name=f"simulacao_rodada_{sim_atual.rodada_atual}.npz",
+                               mime="application/octet-stream")
         else:
-            result_col1.write("Nenhuma estatística disponível.")
-        st.markdown("---")
- 
-        # Criar 2 colunas para as tabelas na proporção 1:2
-        analise_col1, analise_col2 = st.columns([1, 2], gap="large")
-        
-        with analise_col1:
-            st.markdown("#### 🎮 Jogos e Odds da Rodada")
-            if st.session_state.jogos_da_rodada_anterior and st.session_state.apostas_da_rodada_anterior:
-                # Calcular volume por jogo
-                volume_por_jogo = {}
-                for a in st.session_state.apostas_da_rodada_anterior:
-                    jogo = a['jogo_desc']
-                    volume_por_jogo[jogo] = volume_por_jogo.get(jogo, 0) + a['valor_apostado']
-                
-                jogos_info = []
-                for jogo in st.session_state.jogos_da_rodada_anterior:
-                    volume = volume_por_jogo.get(jogo["descricao"], 0)
-                    
-                    jogos_info.append({
-                        "Jogo": jogo["descricao"],
-                        "Vitória": f"{jogo['odds_casa'][0]:.2f}",
-                        "Empate": f"{jogo['odds_casa'][1]:.2f}",
-                        "Derrota": f"{jogo['odds_casa'][2]:.2f}",
-                        "Resultado": jogo["resultado_final"],
-                        "Volume": f"R$ {volume:.2f}"
-                    })
-                
-                df_jogos = pd.DataFrame(jogos_info)
-                st.dataframe(df_jogos, use_container_width=True, hide_index=True)
-            else:
-                st.write("Nenhum jogo na rodada anterior.")
-        
-        with analise_col2:
-            st.markdown("#### 💰 Top 10 Maiores Pagamentos da Rodada")
-            if st.session_state.apostas_da_rodada_anterior:
-                # Ordenar apostas por valor pago (maiores pagamentos primeiro)
-                apostas_ordenadas = sorted(st.session_state.apostas_da_rodada_anterior, 
-                                         key=lambda x: x["valor_ganho"], reverse=True)
-                
-                # Calcular quantas linhas mostrar para ter 6 colunas como a tabela de jogos
-                num_linhas = df_jogos.shape[0]  # Mesmo número de colunas que a tabela de jogos
-                
-                maiores_apostas = []
-                for i, aposta in enumerate(apostas_ordenadas[:num_linhas]):
-                    # Buscar nome do usuário
-                    usuario = next(u for u in st.session_state.usuarios if u['id'] == aposta['id_usuario'])
-                    
-                    maiores_apostas.append({
-                        "Usuário": usuario['nome'],
-                        "Perfil": aposta['perfil_usuario'],
-                        "Jogo": aposta['jogo_desc'],
-                        "Aposta": aposta['resultado_apostado'],
-                        "Valor": f"R$ {aposta['valor_apostado']:.2f}",
-                        "Odd": f"{aposta['odd_no_momento']:.2f}",
-                        "Pago": f"R$ {aposta['valor_ganho']:.2f}",
-                        "Status": "✅" if aposta['ganhou'] else "❌"
-                    })
-                
-                df_maiores_apostas = pd.DataFrame(maiores_apostas)
-                st.dataframe(df_maiores_apostas, use_container_width=True, hide_index=True)
-            else:
-                st.write("Nenhuma aposta na rodada anterior.")
-
-    st.markdown("---")
-    st.header("📈 Estatísticas Acumuladas da Casa")
-    
-    casa_acum = st.session_state.casa_stats_acumuladas
-    df_historico = pd.DataFrame(st.session_state.historico_casa)
-
-    # Métricas Chave Acumuladas - Todas na mesma linha
-    ac_col1, ac_col2, ac_col3, ac_col4, ac_col5, ac_col6 = st.columns(6)
-    
-    ac_col1.metric("Faturamento Acumulado", f"R$ {casa_acum['total_apostado']:.2f}")
-    ac_col2.metric("Pagamentos Acumulado", f"R$ {casa_acum['total_pago']:.2f}")
-    
-    ggr_acum_val = casa_acum['ggr']
-    # Para GGR negativo, queremos vermelho, então usamos valor positivo no delta com inverse
-    if ggr_acum_val < 0:
-        delta_val_acum = abs(ggr_acum_val)
-        delta_color_ggr_acum = "inverse"
-    else:
-        delta_val_acum = ggr_acum_val
-        delta_color_ggr_acum = "normal"
-    ac_col3.metric("Lucro Acumulado", f"R$ {ggr_acum_val:.2f}", 
-                   delta=f"{delta_val_acum:.2f}", delta_color=delta_color_ggr_acum)
-    
-    margem_ggr_acumulada = (casa_acum['ggr'] / casa_acum['total_apostado'] * 100) if casa_acum['total_apostado'] > 0 else 0
-    ac_col4.metric("Margem Lucro Acum. (%)", f"{margem_ggr_acumulada:.2f}%")
-    
-    # Lucro médio por rodada
-    num_rodadas = st.session_state.rodada_atual if st.session_state.rodada_atual > 0 else 1
-    lucro_medio_por_rodada = ggr_acum_val / num_rodadas
-    ac_col5.metric("Lucro Médio/Rodada", f"R$ {lucro_medio_por_rodada:.2f}")
-    
-    ac_col6.metric("Total Apostas Acum.", casa_acum['num_apostas'])
-    
-    # Gráficos Acumulados em Colunas
+            st.session_state.pop("arquivo_simulacao", None)  # De uma rodada anterior
+            # Gerado só sob demanda: montar o arquivo a cada rerun custaria uma cópia do histórico inteiro
+            st.button("💾 Gerar Arquivo da Simulação", use_container_width=True, on_click=gerar_arquivo_simulacao,
+                      disabled=not (simulacao_livre or execucao_fundo.pausada))
+    st.file_uploader("Arquivo salvo (.npz)", type=["npz"], key="upload_simulacao")
+    st.button("📂 Carregar Simulação", use_container_width=True, on_click=carregar_simulacao,
+              disabled=st.session_state.get("upload_simulacao") is None or not simulacao_livre)
+    if 'erro_carregamento' in st.session_state:
+        st.error(f"Não foi possível carregar o arquivo: {st.session_state.erro_carregamento}")
+        del st.session_state.erro_carregamento
+
+def tabela_pagamentos(apostas, nomes_usuarios, descricoes_jogos, com_rodada=False):
+    """Tabela de exibição dos maiores pagamentos (usuário, perfil, jogo e aposta resolvidos pelos índices de cada aposta)."""
+    df_top = dataframe_apostas(apostas, nomes_usuarios, descricoes_jogos)
+    tabela = pd.DataFrame({
+        "Usuário": df_top['nome_usuario'],
+        "Perfil": df_top['perfil_usuario'],
+        "Jogo": df_top['jogo_desc'],
+        "Aposta": df_top['resultado_apostado'],
+        "Valor": df_top['valor_apostado'].map("R$ {:.2f}".format),
+        "Odd": df_top['odd_no_momento'].map("{:.2f}".format),
+        "Pago": df_top['valor_ganho'].map("R$ {:.2f}".format),
+        "Status": np.where(df_top['ganhou'], "✅", "❌")
+    })
+    if com_rodada:
+        tabela.insert(0, "Rodada", df_top['rodada'])
+    return tabela
+
+
+# --- Seções do Painel ---
+# Cada seção é um fragmento: mexer num widget dela reexecuta só a seção, não a página inteira.
+# O cache (versao_cache) continua valendo dentro dos fragmentos.
+
+@st.fragment
+def secao_graficos_evolucao(sim):
+    """Gráficos de evolução da casa e dos usuários, rodada a rodada."""
+    cache = st.session_state.cache_derivados
+    versao = sim.versao_cache
+    df_historico = cache.obter("df_historico", versao, lambda: pd.DataFrame(sim.historico_casa))
     if len(df_historico) > 1: # Alterado de > 0 para > 1
         g_col1, g_col2 = st.columns(2)
         with g_col1:
             st.subheader("Evolução do Lucro da Casa") # Lucro por rodada + Lucro Acumulado
-            df_historico_acum_plot = df_historico.set_index('rodada').copy()
-            df_historico_acum_plot['Lucro Acumulado'] = df_historico_acum_plot['ggr_rodada'].cumsum()
-            df_historico_acum_plot['Lucro na Rodada'] = df_historico_acum_plot['ggr_rodada']
-            st.line_chart(df_historico_acum_plot[['Lucro na Rodada', 'Lucro Acumulado']], 
+            def montar_evolucao_lucro():
+                df_historico_acum_plot = df_historico.set_index('rodada').copy()
+                df_historico_acum_plot['Lucro Acumulado'] = df_historico_acum_plot['ggr_rodada'].cumsum()
+                df_historico_acum_plot['Lucro na Rodada'] = df_historico_acum_plot['ggr_rodada']
+                return df_historico_acum_plot[['Lucro na Rodada', 'Lucro Acumulado']]
+            st.line_chart(cache.obter("evolucao_lucro", versao, montar_evolucao_lucro), 
                           color=["#006400", "#90ee90"]) 
 
         with g_col2:
             st.subheader("Faturamento vs. Pagamentos")
-            df_faturamento_pagamentos = df_historico.set_index('rodada')[['total_apostado_rodada', 'total_pago_rodada']].copy()
-            df_faturamento_pagamentos.columns = ['Faturamento', 'Pagamentos']
+            df_faturamento_pagamentos = cache.obter(
+                "faturamento_pagamentos", versao,
+                lambda: df_historico.set_index('rodada')[['total_apostado_rodada', 'total_pago_rodada']]
+                .set_axis(['Faturamento', 'Pagamentos'], axis=1))
             st.line_chart(df_faturamento_pagamentos)
 
         # Nova seção com 3 colunas
@@ -652,16 +392,19 @@ else:
             st.markdown("### Evolução dos Usuários (%)")
             # A condição len(df_historico) > 1 já está aqui e é a correta
             # Calcular proporções em relação ao total de usuários
-            total_usuarios_sim = len(st.session_state.usuarios) # Usar uma variável diferente para evitar conflito
+            total_usuarios_sim = len(sim.usuarios) # Usar uma variável diferente para evitar conflito
             if total_usuarios_sim > 0: # Adicionar verificação para evitar divisão por zero
-                df_usuarios_evolucao = df_historico.set_index('rodada')[['usuarios_lucrativos', 'usuarios_zerados']].copy()
-                
-                # Converter para percentuais
-                df_usuarios_evolucao['Lucrativos (%)'] = (df_usuarios_evolucao['usuarios_lucrativos'] / total_usuarios_sim * 100).round(1)
-                df_usuarios_evolucao['Zerados (%)'] = (df_usuarios_evolucao['usuarios_zerados'] / total_usuarios_sim * 100).round(1)
+                def montar_evolucao_usuarios():
+                    df_usuarios_evolucao = df_historico.set_index('rodada')[['usuarios_lucrativos', 'usuarios_zerados']].copy()
+                    
+                    # Converter para percentuais
+                    df_usuarios_evolucao['Lucrativos (%)'] = (df_usuarios_evolucao['usuarios_lucrativos'] / total_usuarios_sim * 100).round(1)
+                    df_usuarios_evolucao['Zerados (%)'] = (df_usuarios_evolucao['usuarios_zerados'] / total_usuarios_sim * 100).round(1)
+                    
+                    # Usar apenas as colunas de percentual
+                    return df_usuarios_evolucao[['Lucrativos (%)', 'Zerados (%)']].copy()
                 
-                # Usar apenas as colunas de percentual
-                df_usuarios_evolucao_perc = df_usuarios_evolucao[['Lucrativos (%)', 'Zerados (%)']].copy()
+                df_usuarios_evolucao_perc = cache.obter("evolucao_usuarios", versao, montar_evolucao_usuarios)
                 st.line_chart(df_usuarios_evolucao_perc, color=["#006400", "#d62728"])  # Verde Escuro, Vermelho
             else:
                 st.write("Nenhum usuário na simulação para calcular percentuais.")
@@ -669,15 +412,11 @@ else:
         with g_col4:
             st.subheader("Usuários Ativos por Perfil")
             # A condição len(df_historico) > 1 já está aqui e é a correta
-            # Criar DataFrame com usuários ativos por perfil
-            dados_perfil = []
-            for _, row in df_historico.iterrows():
-                linha_perfil = {'rodada': row['rodada']}
-                for perfil_nome in LISTA_PERFIS: # Renomear para evitar conflito com a variável 'perfil' de st.expander
-                    linha_perfil[perfil_nome] = row['usuarios_ativos_por_perfil'][perfil_nome]
-                dados_perfil.append(linha_perfil)
-            
-            df_perfil_evolucao = pd.DataFrame(dados_perfil).set_index('rodada') 
+            # Criar DataFrame com usuários ativos por perfil (uma linha por rodada, direto dos dicts do histórico)
+            df_perfil_evolucao = cache.obter(
+                "ativos_por_perfil", versao,
+                lambda: pd.DataFrame([h['usuarios_ativos_por_perfil'] for h in sim.historico_casa],
+                                     index=pd.Index(df_historico['rodada'], name='rodada'), columns=LISTA_PERFIS))
             cores_perfil_corrigidas_final = ["#d62728", "#20B2AA", "#FFD700"]
 
             st.line_chart(df_perfil_evolucao, color=cores_perfil_corrigidas_final)
@@ -685,29 +424,34 @@ else:
         with g_col5:
             st.subheader("Saldo Médio dos Usuários")
             # A condição len(df_historico) > 1 será verificada pelo if geral no início desta seção
-            df_saldo_medio = df_historico.set_index('rodada')[['saldo_medio_fim_rodada']].copy()
-            df_saldo_medio.columns = ['Saldo Médio']
+            df_saldo_medio = cache.obter(
+                "saldo_medio", versao,
+                lambda: df_historico.set_index('rodada')[['saldo_medio_fim_rodada']].set_axis(['Saldo Médio'], axis=1))
             st.line_chart(df_saldo_medio, color=["#2ca02c"]) # Verde
     else:
         st.write("Execute pelo menos 2 rodadas para visualizar os gráficos de evolução.")
 
 
-    # Seletor de rodada e detalhes
+@st.fragment
+def secao_explorador_rodadas(sim):
+    """Jogos e apostas de uma rodada escolhida no seletor."""
+    cache = st.session_state.cache_derivados
+    versao = sim.versao_cache
     st.markdown("--- ") # Adicionando um separador
     st.header("🔍 Explorar Jogos e Apostas por Rodada") # Adicionando um header para a seção
-    if st.session_state.historico_jogos:
+    if sim.historico_jogos:
         # Seletor de rodada
-        rodadas_disponiveis = [h["rodada"] for h in st.session_state.historico_jogos]
+        rodadas_disponiveis = sim.historico_jogos.rodadas
         rodada_selecionada = st.selectbox(
             "Selecione a rodada para visualizar:",
             options=rodadas_disponiveis,
             index=len(rodadas_disponiveis)-1,  # Última rodada por padrão
-            format_func=lambda x: f"Rodada {x}"
+            format_func=lambda x: f"Rodada {x}" + ("" if sim.historico_apostas.detalhada(x) else " (só resumo)")
         )
         
-        # Encontrar dados da rodada selecionada
-        jogos_rodada_selecionada = next(h["jogos"] for h in st.session_state.historico_jogos if h["rodada"] == rodada_selecionada)
-        apostas_rodada_selecionada = next(h["apostas"] for h in st.session_state.historico_apostas if h["rodada"] == rodada_selecionada)
+        # Dados da rodada selecionada: acesso direto pelo número da rodada
+        jogos_rodada_selecionada = sim.historico_jogos.jogos(rodada_selecionada)
+        apostas_rodada_selecionada = sim.historico_apostas.rodada(rodada_selecionada)
         
         # Tabs para jogos e apostas
         tab_jogos, tab_apostas = st.tabs(["🎮 Jogos", "💰 Apostas"])
@@ -731,13 +475,46 @@ else:
         
         with tab_apostas:
             st.subheader(f"Apostas da Rodada {rodada_selecionada}")
-            if apostas_rodada_selecionada:
-                # Criar DataFrame com todas as apostas e adicionar nome do usuário
-                df_apostas = pd.DataFrame(apostas_rodada_selecionada)
-                # Adicionar coluna com nome do usuário
-                df_apostas['nome_usuario'] = df_apostas['id_usuario'].apply(
-                    lambda user_id: next(u['nome'] for u in st.session_state.usuarios if u['id'] == user_id)
-                )
+            if apostas_rodada_selecionada is None:
+                # Rodada fora da janela de detalhe: só os agregados guardados pelo motor
+                resumo_rodada = sim.historico_apostas.resumo(rodada_selecionada)
+                st.info(f"A Rodada {rodada_selecionada} só tem resumo: as apostas uma a uma ficam guardadas apenas "
+                        f"nas últimas {sim.historico_apostas.rodadas_com_detalhe} rodadas. Os totais abaixo são exatos.")
+                
+                col1, col2, col3, col4 = st.columns(4)
+                col1.metric("Total de Apostas", resumo_rodada["num_apostas"])
+                col2.metric("Total Faturado", f"R$ {resumo_rodada['total_apostado']:.2f}")
+                col3.metric("Total Pago", f"R$ {resumo_rodada['total_pago']:.2f}")
+                col4.metric("Apostas Vencedoras", f"{resumo_rodada['apostas_vencedoras']}/{resumo_rodada['num_apostas']}")
+                
+                resumo_col1, resumo_col2 = st.columns(2)
+                with resumo_col1:
+                    st.markdown("##### Por Jogo")
+                    st.dataframe(pd.DataFrame({
+                        "Jogo": sim.historico_jogos.descricoes(rodada_selecionada),
+                        "Apostas": resumo_rodada["num_apostas_por_jogo"],
+                        "Faturado": resumo_rodada["apostado_por_jogo"],
+                        "Pago": resumo_rodada["pago_por_jogo"],
+                    }), column_config={
+                        "Faturado": st.column_config.NumberColumn("Faturado (R$)", format="R$ %.2f"),
+                        "Pago": st.column_config.NumberColumn("Pago (R$)", format="R$ %.2f"),
+                    }, use_container_width=True, hide_index=True)
+                with resumo_col2:
+                    st.markdown("##### Por Perfil")
+                    st.dataframe(pd.DataFrame({
+                        "Perfil": LISTA_PERFIS,
+                        "Apostas": resumo_rodada["num_apostas_por_perfil"],
+                        "Faturado": resumo_rodada["apostado_por_perfil"],
+                        "Pago": resumo_rodada["pago_por_perfil"],
+                    }), column_config={
+                        "Faturado": st.column_config.NumberColumn("Faturado (R$)", format="R$ %.2f"),
+                        "Pago": st.column_config.NumberColumn("Pago (R$)", format="R$ %.2f"),
+                    }, use_container_width=True, hide_index=True)
+            elif len(apostas_rodada_selecionada["id_usuario"]) > 0:
+                # Criar DataFrame com todas as apostas (nome do usuário, perfil, jogo e aposta por indexação direta)
+                df_apostas = cache.obter(("apostas_rodada", rodada_selecionada), versao,
+                                         lambda: dataframe_apostas(apostas_rodada_selecionada, sim.usuarios.nomes,
+                                                                   sim.historico_jogos.descricoes(rodada_selecionada)))
                 
                 # Métricas da rodada selecionada
                 total_apostas = len(df_apostas)
@@ -773,29 +550,24 @@ else:
                 st.write("Nenhuma aposta encontrada para esta rodada.")
     else:
         st.write("Nenhuma rodada foi realizada ainda. Execute pelo menos uma rodada para visualizar os dados.")
-            
+
+
+@st.fragment
+def secao_tabela_usuarios(sim):
+    """Tabela com saldo e contadores de todos os usuários."""
+    cache = st.session_state.cache_derivados
+    versao = sim.versao_cache
     st.markdown("--- ") # Adicionando um separador
     st.header("👤 Detalhes dos Usuários") # Adicionando um header para a seção
-    if st.session_state.usuarios:
-        # Calcular número de apostas por usuário
-        df_usuarios = pd.DataFrame(st.session_state.usuarios)
-        
-        # Contar apostas por usuário em todo o histórico
-        apostas_por_usuario = {}
-        for rodada_apostas in st.session_state.historico_apostas:
-            for aposta in rodada_apostas["apostas"]:
-                user_id = aposta["id_usuario"]
-                apostas_por_usuario[user_id] = apostas_por_usuario.get(user_id, 0) + 1
-        
-        # Adicionar coluna de número de apostas
-        df_usuarios['num_apostas_total'] = df_usuarios['id'].map(lambda x: apostas_por_usuario.get(x, 0))
-        
+    if sim.usuarios:
+        # Contadores por usuário (nº de apostas etc.) já vêm da tabela, sem varrer o histórico
         # Reordenar colunas para melhor visualização
         colunas_ordenadas = [
-            "nome", "perfil", "saldo", "num_apostas_total", "rodadas_apostou", 
+            "nome", "perfil", "saldo", "num_apostas", "rodadas_apostou", 
             "total_apostado_pessoal", "balanco_pessoal"
         ]
-        df_usuarios_ordenado = df_usuarios[colunas_ordenadas]
+        df_usuarios_ordenado = cache.obter("tabela_usuarios", versao,
+                                           lambda: sim.usuarios.para_dataframe()[colunas_ordenadas])
         
         st.dataframe(df_usuarios_ordenado,
                      column_config={
@@ -803,78 +575,80 @@ else:
                          "perfil": st.column_config.TextColumn("Perfil", width="small"),
                          "saldo": st.column_config.NumberColumn("Saldo (R$)", format="R$ %.2f", width="small",
                             help="Saldo atual do usuário."),
-                         "num_apostas_total": st.column_config.NumberColumn("Nº de Apostas Feitas", width="small",
+                         "num_apostas": st.column_config.NumberColumn("Nº de Apostas Feitas", width="small",
                             help="Número total de apostas feitas pelo usuário."),
                          "rodadas_apostou": st.column_config.NumberColumn("Nº Rodadas C/ Aposta", width="small"),
                          "total_apostado_pessoal": st.column_config.NumberColumn("Total Faturado (R$)", format="R$ %.2f", width="small"),
                          "balanco_pessoal": st.column_config.NumberColumn("Balanço Pessoal (R$)", format="R$ %.2f", width="small",
                             help="Ganhos - Perdas.")
                      }, use_container_width=True, height=400, hide_index=True)
-            
+
+
+@st.fragment
+def secao_historico_usuario(sim):
+    """Estatísticas, apostas e saldo por rodada do usuário escolhido no seletor."""
+    cache = st.session_state.cache_derivados
+    versao = sim.versao_cache
     st.markdown("--- ") # Adicionando um separador
     st.header("📊 Histórico Individual do Usuário") # Adicionando um header para a seção
-    if st.session_state.usuarios and st.session_state.historico_apostas:
+    if sim.usuarios and sim.historico_apostas:
         # Seletor de usuário (ordenado alfabeticamente)
-        usuarios_opcoes = [(u['id'], u['nome']) for u in st.session_state.usuarios]
-        usuarios_opcoes_ordenadas = sorted(usuarios_opcoes, key=lambda x: x[1])  # Ordenar por nome
+        usuarios = sim.usuarios
         usuario_selecionado_id = st.selectbox(
             "Selecione o usuário para visualizar o histórico:",
-            options=[u[0] for u in usuarios_opcoes_ordenadas],
-            format_func=lambda x: next(u[1] for u in usuarios_opcoes_ordenadas if u[0] == x),
+            options=np.argsort(usuarios.nomes, kind="stable").tolist(),  # Ordenar por nome
+            format_func=lambda x: usuarios.nomes[x],
             key="select_usuario_historico"
         )
         
         if usuario_selecionado_id is not None:
-            # Buscar dados do usuário selecionado
-            usuario_selecionado = next(u for u in st.session_state.usuarios if u['id'] == usuario_selecionado_id)
+            nome_usuario_selecionado = usuarios.nomes[usuario_selecionado_id]
             
-            # Coletar todas as apostas do usuário
-            apostas_usuario = []
-            for rodada_apostas in st.session_state.historico_apostas:
-                for aposta in rodada_apostas["apostas"]:
-                    if aposta["id_usuario"] == usuario_selecionado_id:
-                        aposta_com_rodada = aposta.copy()
-                        aposta_com_rodada["rodada"] = rodada_apostas["rodada"]
-                        apostas_usuario.append(aposta_com_rodada)
+            # Totais do usuário vêm dos contadores mantidos pelo motor na liquidação
+            resumo_usuario = usuarios.resumo_usuario(usuario_selecionado_id)
             
-            if apostas_usuario:
+            if resumo_usuario["num_apostas"] > 0:
                 # Métricas do usuário
-                st.markdown(f"### 📈 Estatísticas de {usuario_selecionado['nome']}")
+                st.markdown(f"### 📈 Estatísticas de {nome_usuario_selecionado}")
                 
                 hist_col1, hist_col2, hist_col3, hist_col4, hist_col5 = st.columns(5)
                 
-                total_apostas_usuario = len(apostas_usuario)
-                total_apostado_usuario = sum(a['valor_apostado'] for a in apostas_usuario)
-                total_ganho_usuario = sum(a['valor_ganho'] for a in apostas_usuario)
-                apostas_vencedoras_usuario = sum(1 for a in apostas_usuario if a['ganhou'])
-                taxa_acerto_usuario = (apostas_vencedoras_usuario / total_apostas_usuario * 100) if total_apostas_usuario > 0 else 0
-                
-                hist_col1.metric("Total de Apostas", total_apostas_usuario)
-                hist_col2.metric("Total Apostado", f"R$ {total_apostado_usuario:.2f}")
-                hist_col3.metric("Total Ganho", f"R$ {total_ganho_usuario:.2f}")
-                hist_col4.metric("Taxa de Acerto", f"{taxa_acerto_usuario:.1f}%")
-                hist_col5.metric("Lucro/Prejuízo", f"R$ {total_ganho_usuario - total_apostado_usuario:.2f}")
+                hist_col1.metric("Total de Apostas", resumo_usuario["num_apostas"],
+                                 help=f"Última aposta na rodada {resumo_usuario['ultima_rodada']}")
+                hist_col2.metric("Total Apostado", f"R$ {resumo_usuario['total_apostado']:.2f}")
+                hist_col3.metric("Total Ganho", f"R$ {resumo_usuario['total_ganho']:.2f}")
+                hist_col4.metric("Taxa de Acerto", f"{resumo_usuario['taxa_acerto']:.1f}%")
+                hist_col5.metric("Lucro/Prejuízo", f"R$ {resumo_usuario['total_ganho'] - resumo_usuario['total_apostado']:.2f}")
                 
                 st.markdown("---")
                 
                 # Tabela com histórico completo
                 st.markdown("### 📋 Histórico Completo de Apostas")
                 
-                # Preparar dados para a tabela
-                historico_dados = []
-                for aposta in sorted(apostas_usuario, key=lambda x: x['rodada'], reverse=True):
-                    historico_dados.append({
-                        "Rodada": aposta['rodada'],
-                        "Jogo": aposta['jogo_desc'],
-                        "Aposta": aposta['resultado_apostado'],
-                        "Valor": f"R$ {aposta['valor_apostado']:.2f}",
-                        "Odd": f"{aposta['odd_no_momento']:.2f}",
-                        "Resultado": "✅" if aposta['ganhou'] else "❌",
-                        "Prêmio": f"R$ {aposta['valor_ganho']:.2f}",
-                        "Lucro": f"R$ {aposta['valor_ganho'] - aposta['valor_apostado']:.2f}"
+                # Coletar as apostas do usuário (colunas do livro, com a rodada de cada aposta)
+                apostas_usuario = sim.historico_apostas.apostas_do_usuario(usuario_selecionado_id)
+                if sim.historico_apostas.primeira_detalhada > 1:
+                    st.caption(f"Apostas a partir da Rodada {sim.historico_apostas.primeira_detalhada}: as rodadas anteriores "
+                               "ficam só resumidas. As estatísticas acima e o saldo por rodada incluem todas as rodadas.")
+                
+                def montar_historico_usuario():
+                    # Preparar dados para a tabela (rodadas mais recentes primeiro)
+                    df_apostas_usuario = dataframe_apostas(apostas_usuario, usuarios.nomes,
+                                                           sim.historico_jogos.descricoes(sim.rodada_atual))
+                    df_apostas_usuario = df_apostas_usuario.iloc[np.argsort(-apostas_usuario['rodada'], kind="stable")]
+                    return pd.DataFrame({
+                        "Rodada": df_apostas_usuario['rodada'],
+                        "Jogo": df_apostas_usuario['jogo_desc'],
+                        "Aposta": df_apostas_usuario['resultado_apostado'],
+                        "Valor": df_apostas_usuario['valor_apostado'].map("R$ {:.2f}".format),
+                        "Odd": df_apostas_usuario['odd_no_momento'].map("{:.2f}".format),
+                        "Resultado": np.where(df_apostas_usuario['ganhou'], "✅", "❌"),
+                        "Prêmio": df_apostas_usuario['valor_ganho'].map("R$ {:.2f}".format),
+                        "Lucro": (df_apostas_usuario['valor_ganho'] - df_apostas_usuario['valor_apostado']).map("R$ {:.2f}".format)
                     })
                 
-                df_historico_usuario = pd.DataFrame(historico_dados)
+                df_historico_usuario = cache.obter(("historico_usuario", usuario_selecionado_id), versao,
+                                                   montar_historico_usuario)
                 st.dataframe(df_historico_usuario,
                              column_config={
                                  "Rodada": st.column_config.NumberColumn("Rodada", width="small"),
@@ -888,100 +662,302 @@ else:
                              }, use_container_width=True, hide_index=True)
                 
                 # Gráfico de saldo por rodada (se houver múltiplas rodadas)
-                rodadas_usuario = sorted(list(set(a['rodada'] for a in apostas_usuario)))
-                if len(rodadas_usuario) > 1:
+                # Contador mantido pelo motor (vale também para as rodadas já resumidas)
+                if usuarios.rodadas_apostou[usuario_selecionado_id] > 1:
                     st.markdown("### 📈 Saldo por Rodada")
                     
-                    # Calcular saldo ao final de cada rodada para TODOS os usuários
-                    saldo_inicial_ref = getattr(st.session_state, 'saldo_inicial', 100.0)
-                    
-                    # Coletar todas as rodadas que existem
-                    todas_rodadas = set()
-                    for rodada_apostas in st.session_state.historico_apostas:
-                        todas_rodadas.add(rodada_apostas["rodada"])
-                    todas_rodadas = sorted(list(todas_rodadas))
-                    
-                    # Criar DataFrame com saldo de todos os usuários por rodada
-                    dados_todos_usuarios = {}
-                    dados_usuario_selecionado = {}
-                    
-                    # Incluir rodada 0 (inicial) para mostrar o ponto de partida
-                    rodadas_para_grafico = [0] + todas_rodadas
-                    
-                    for usuario in st.session_state.usuarios:
-                        # Coletar apostas deste usuário
-                        apostas_user = []
-                        for rodada_apostas in st.session_state.historico_apostas:
-                            for aposta in rodada_apostas["apostas"]:
-                                if aposta["id_usuario"] == usuario['id']:
-                                    aposta_com_rodada = aposta.copy()
-                                    aposta_com_rodada["rodada"] = rodada_apostas["rodada"]
-                                    apostas_user.append(aposta_com_rodada)
-                        
-                        # Calcular saldo por rodada para este usuário
-                        saldo_atual = saldo_inicial_ref
-                        dados_saldo_user = [saldo_inicial_ref]  # Começar com saldo inicial
-                        
-                        for rodada in todas_rodadas:
-                            # Calcular resultado da rodada
-                            apostas_rodada = [a for a in apostas_user if a['rodada'] == rodada]
-                            resultado_rodada = sum(a['valor_ganho'] - a['valor_apostado'] for a in apostas_rodada)
-                            saldo_atual += resultado_rodada
-                            dados_saldo_user.append(saldo_atual)
-                        
-                        # Separar usuário selecionado dos outros
-                        nome_usuario = usuario['nome']
-                        if usuario['id'] == usuario_selecionado_id:
-                            dados_usuario_selecionado[nome_usuario] = dados_saldo_user
-                        else:
-                            dados_todos_usuarios[nome_usuario] = dados_saldo_user
-                    
-                    # Criar gráfico com plotly
-                    fig = go.Figure()
-                    
-                    # Primeiro adicionar as linhas cinzas (outros usuários)
-                    for nome_usuario, dados_saldo in dados_todos_usuarios.items():
-                        fig.add_trace(go.Scatter(
-                            x=rodadas_para_grafico,
-                            y=dados_saldo,
-                            mode='lines',
-                            name=nome_usuario,
-                            line=dict(color='rgba(192, 192, 192, 0.5)', width=1),
-                            showlegend=False,
-                            hovertemplate=f'<b>{nome_usuario}</b><br>Rodada: %{{x}}<br>Saldo: R$ %{{y:.2f}}<extra></extra>'
-                        ))
-                    
-                    # Depois adicionar a linha verde do usuário selecionado (por cima)
-                    usuario_selecionado_nome = next(u['nome'] for u in st.session_state.usuarios if u['id'] == usuario_selecionado_id)
-                    if dados_usuario_selecionado:
-                        for nome_usuario, dados_saldo in dados_usuario_selecionado.items():
-                            fig.add_trace(go.Scatter(
-                                x=rodadas_para_grafico,
-                                y=dados_saldo,
-                                mode='lines',
-                                name=f'{nome_usuario} (Selecionado)',
-                                line=dict(color='#2ca02c', width=3),
-                                showlegend=False,
-                                hovertemplate=f'<b>{nome_usuario} (Selecionado)</b><br>Rodada: %{{x}}<br>Saldo: R$ %{{y:.2f}}<extra></extra>'
-                            ))
-                    
-                    # Adicionar linha horizontal do saldo inicial
-                    fig.add_hline(y=saldo_inicial_ref, line_dash="dash", line_color="green", 
-                                 opacity=0.5, annotation_text=f"Saldo Inicial (R$ {saldo_inicial_ref:.2f})")
-                    
-                    # Configurar layout
-                    fig.update_layout(
-                        title="Evolução do Saldo - Todos os Usuários",
-                        xaxis_title="Rodada",
-                        yaxis_title="Saldo (R$)", 
-                        showlegend=False,
-                        height=500
-                    )
+                    # Saldo de cada usuário ao fim de cada rodada, gravado pelo motor na liquidação.
+                    # Demais usuários num único trace WebGL (reduzido acima do orçamento de pontos);
+                    # o selecionado vai por cima com todos os pontos.
+                    fig = cache.obter(("saldos_usuario", usuario_selecionado_id), versao,
+                                      lambda: figura_saldos_usuarios(sim.historico_saldos.matriz, usuario_selecionado_id,
+                                                                     nome_usuario_selecionado, sim.saldo_inicial))
                     
                     # Mostrar gráfico
                     st.plotly_chart(fig, use_container_width=True)
                     
             else:
-                st.write(f"{usuario_selecionado['nome']} ainda não fez nenhuma aposta.")
+                st.write(f"{nome_usuario_selecionado} ainda não fez nenhuma aposta.")
+    else:
+        st.write("Nenhum usuário ou histórico de apostas disponível.")
+
+
+@st.fragment(run_every=1.0)
+def secao_execucao_fundo(execucao):
+    """Progresso do avanço rápido em fundo, com o histórico parcial e os controles de pausa e cancelamento."""
+    if not execucao.ativa:
+        st.rerun()  # Terminou: a página inteira volta com o painel completo
+    historico = execucao.historico_parcial()
+    st.header(f"⏩ Avanço Rápido: rodada {execucao.rodada_inicial + execucao.rodadas_feitas}")
+    posicao = execucao.posicao_na_fila
+    st.progress(execucao.progresso, text=f"{execucao.rodadas_feitas}/{execucao.num_rodadas} rodadas "
+                f"({execucao.rodadas_por_segundo:.1f} rodadas/s)" + (" — pausado" if execucao.pausada else "")
+                + (f" — na fila: {posicao} trabalhos de outras sessões antes" if posicao is not None else ""))
+
+    ctrl_col1, ctrl_col2 = st.columns(2)
+    if execucao.pausada:
+        if ctrl_col1.button("▶️ Retomar", use_container_width=True):
+            execucao.retomar()
+            st.rerun()  # Esconde o painel da simulação, que volta a mudar
+    elif ctrl_col1.button("⏸️ Pausar", use_container_width=True):
+        execucao.pausar()
+        st.rerun()  # Pausada, a simulação pode ser lida: mostra o painel completo
+    if ctrl_col2.button("⏹️ Cancelar", use_container_width=True):
+        execucao.cancelar()
+        st.rerun()
+
+    if historico:
+        df_parcial = pd.DataFrame({
+            "Rodada": [h["rodada"] for h in historico],
+            "Lucro Acumulado": np.cumsum([h["ggr_rodada"] for h in historico]),
+            "Usuários Ativos": [h["usuarios_ativos"] for h in historico],
+        }).set_index("Rodada")
+        ultima = historico[-1]
+        parc_col1, parc_col2, parc_col3 = st.columns(3)
+        parc_col1.metric("Lucro Acumulado", f"R$ {df_parcial['Lucro Acumulado'].iloc[-1]:.2f}")
+        parc_col2.metric("Usuários Ativos", ultima["usuarios_ativos"])
+        parc_col3.metric("Saldo Médio", f"R$ {ultima['saldo_medio_fim_rodada']:.2f}")
+        graf_col1, graf_col2 = st.columns(2)
+        graf_col1.line_chart(df_parcial["Lucro Acumulado"], height=250)
+        graf_col2.line_chart(df_parcial["Usuários Ativos"], height=250)
+
+
+# --- Painel Principal ---
+if execucao_fundo is not None:
+    secao_execucao_fundo(execucao_fundo)
+
+if st.session_state.simulacao is None:
+    st.info("👈 Configure os parâmetros na barra lateral e clique em 'Iniciar / Próxima Rodada'.")
+    if not pode_continuar:
+        st.error("Existem erros de configuração nos Perfis de Apostador na barra lateral. Ajuste-os para continuar.")
+elif execucao_fundo is not None and not execucao_fundo.pausada:
+    # A thread está alterando a simulação: o painel completo só com ela pausada ou encerrada
+    st.caption("O painel completo aparece quando o avanço terminar ou for pausado.")
+else:
+    sim = st.session_state.simulacao
+    # Tudo que sai do cache é reaproveitado enquanto nenhuma rodada nova terminar
+    cache = st.session_state.cache_derivados
+    versao = sim.versao_cache
+    st.title("🎲 Simulador Principal: Os números 'ocultos' da casa de apostas! ")
+    st.header(f"📊 Resultados da Rodada: {sim.rodada_atual}")
+    
+    if sim.historico_casa:
+        stats_ultima_rodada = sim.historico_casa[-1]
+        
+        # PRIMEIRA LINHA - Métricas da Casa/Rodada
+        m_col1, m_col2, m_col3, m_col4, m_col5 = st.columns(5)
+        
+        # Faturamento, Pagamentos, Lucro
+        m_col1.metric("Faturamento Rodada", f"R$ {stats_ultima_rodada['total_apostado_rodada']:.2f}")
+        m_col2.metric("Pagamentos Rodada", f"R$ {stats_ultima_rodada['total_pago_rodada']:.2f}")
+        
+        ggr_rodada_val = stats_ultima_rodada['ggr_rodada']
+        handle_rodada = stats_ultima_rodada['total_apostado_rodada']
+        
+        # Calcular percentual do Lucro em relação ao Faturamento
+        if handle_rodada > 0:
+            percentual_ggr = (ggr_rodada_val / handle_rodada) * 100
+        else:
+            percentual_ggr = 0
+        
+        delta_text = f"{percentual_ggr:.1f}%"
+        delta_color_ggr = "normal"
+        
+        m_col3.metric("Lucro Rodada", f"R$ {ggr_rodada_val:.2f}", 
+                      delta=delta_text, delta_color=delta_color_ggr)
+        
+        # Número de apostas
+        num_apostas = stats_ultima_rodada['num_apostas_rodada']
+        m_col4.metric("Nº Apostas Rodada", num_apostas)
+        
+        # Valor médio apostado na rodada
+        valor_medio_apostado = (handle_rodada / num_apostas) if num_apostas > 0 else 0
+        m_col5.metric("Valor Médio Apostado", f"R$ {valor_medio_apostado:.2f}")
+
+        # SEGUNDA LINHA - Métricas dos Usuários
+        u_col1, u_col2, u_col3, u_col4, u_col5 = st.columns(5)
+        
+        usuarios = sim.usuarios
+        total_usuarios = len(usuarios)
+        
+        # Usuários lucrativos (saldo > saldo inicial), ativos (saldo > 0) e falidos (saldo = 0)
+        usuarios_lucrativos = usuarios.usuarios_lucrativos()
+        usuarios_ativos = usuarios.usuarios_ativos()
+        usuarios_falidos = usuarios.usuarios_zerados()
+        
+        # Saldo médio (total de dinheiro / total de usuários)
+        saldo_medio = usuarios.saldo_medio()
+        
+        u_col1.metric("Total de Usuários", total_usuarios)
+        u_col2.metric("Usuários Lucrativos", usuarios_lucrativos)
+        u_col3.metric("Usuários Ativos", usuarios_ativos, help="Saldo > R$ 0,00 (ainda tem dinheiro)")
+        u_col4.metric("Usuários Falidos", usuarios_falidos, help="Saldo = R$ 0,00 (sem dinheiro)")
+        u_col5.metric("Saldo Médio", f"R$ {saldo_medio:.2f}")
+
+         
+        
+        # Criar 5 colunas para as métricas
+        result_col1, result_col2, result_col3, result_col4, result_col5 = st.columns(5)
+        
+        apostas_ultima_rodada = sim.historico_apostas.ultima_rodada()
+        tem_apostas_ultima_rodada = apostas_ultima_rodada is not None and len(apostas_ultima_rodada["id_usuario"]) > 0
+        if tem_apostas_ultima_rodada:
+            # Volume por perfil (3 primeiras colunas)
+            volume_por_perfil = np.bincount(apostas_ultima_rodada["perfil"], weights=apostas_ultima_rodada["valor_apostado"],
+                                            minlength=len(LISTA_PERFIS))
+            
+            result_col1.metric("Volume Conservador", f"R$ {volume_por_perfil[LISTA_PERFIS.index('Conservador')]:.2f}")
+            result_col2.metric("Volume Moderado", f"R$ {volume_por_perfil[LISTA_PERFIS.index('Moderado')]:.2f}")
+            result_col3.metric("Volume Arriscado", f"R$ {volume_por_perfil[LISTA_PERFIS.index('Arriscado')]:.2f}") 
+        else:
+            result_col1.write("Nenhuma estatística disponível.")
+        st.markdown("---")
+ 
+        # Criar 2 colunas para as tabelas na proporção 1:2
+        analise_col1, analise_col2 = st.columns([1, 2], gap="large")
+        jogos_da_rodada_anterior = sim.jogos_da_rodada_anterior
+        
+        with analise_col1:
+            st.markdown("#### 🎮 Jogos e Odds da Rodada")
+            if jogos_da_rodada_anterior and tem_apostas_ultima_rodada:
+                def montar_tabela_jogos():
+                    # Calcular volume por jogo
+                    volume_por_jogo = np.bincount(apostas_ultima_rodada["id_jogo"], weights=apostas_ultima_rodada["valor_apostado"],
+                                                  minlength=len(jogos_da_rodada_anterior))
+                    
+                    jogos_info = []
+                    for jogo, volume in zip(jogos_da_rodada_anterior, volume_por_jogo):
+                        jogos_info.append({
+                            "Jogo": jogo["descricao"],
+                            "Vitória": f"{jogo['odds_casa'][0]:.2f}",
+                            "Empate": f"{jogo['odds_casa'][1]:.2f}",
+                            "Derrota": f"{jogo['odds_casa'][2]:.2f}",
+                            "Resultado": jogo["resultado_final"],
+                            "Volume": f"R$ {volume:.2f}"
+                        })
+                    return pd.DataFrame(jogos_info)
+                
+                df_jogos = cache.obter("tabela_jogos", versao, montar_tabela_jogos)
+                st.dataframe(df_jogos, use_container_width=True, hide_index=True)
+            else:
+                st.write("Nenhum jogo na rodada anterior.")
+        
+        with analise_col2:
+            st.markdown("#### 💰 Top 10 Maiores Pagamentos da Rodada")
+            if tem_apostas_ultima_rodada:
+                def montar_maiores_pagamentos():
+                    # Calcular quantas linhas mostrar para ter 6 colunas como a tabela de jogos
+                    num_linhas = len(jogos_da_rodada_anterior)  # Mesmo número de linhas que a tabela de jogos
+                    
+                    # Maiores pagamentos já vêm ordenados do motor (mantidos na liquidação, sem ordenar a rodada)
+                    maiores = selecionar_apostas(sim.maiores_pagamentos.da_rodada, slice(0, num_linhas))
+                    return tabela_pagamentos(maiores, usuarios.nomes, [j["descricao"] for j in jogos_da_rodada_anterior])
+                
+                df_maiores_apostas = cache.obter("maiores_pagamentos", versao, montar_maiores_pagamentos)
+                st.dataframe(df_maiores_apostas, use_container_width=True, hide_index=True)
+            else:
+                st.write("Nenhuma aposta na rodada anterior.")
+
+    st.markdown("---")
+    st.header("📈 Estatísticas Acumuladas da Casa")
+    
+    casa_acum = sim.casa_stats_acumuladas
+
+    # Métricas Chave Acumuladas - Todas na mesma linha
+    ac_col1, ac_col2, ac_col3, ac_col4, ac_col5, ac_col6 = st.columns(6)
+    
+    ac_col1.metric("Faturamento Acumulado", f"R$ {casa_acum.total_apostado:.2f}")
+    ac_col2.metric("Pagamentos Acumulado", f"R$ {casa_acum.total_pago:.2f}")
+    
+    ggr_acum_val = casa_acum.ggr
+    # Para GGR negativo, queremos vermelho, então usamos valor positivo no delta com inverse
+    if ggr_acum_val < 0:
+        delta_val_acum = abs(ggr_acum_val)
+        delta_color_ggr_acum = "inverse"
     else:
-        st.write("Nenhum usuário ou histórico de apostas disponível.")
\ No newline at end of file
+        delta_val_acum = ggr_acum_val
+        delta_color_ggr_acum = "normal"
+    ac_col3.metric("Lucro Acumulado", f"R$ {ggr_acum_val:.2f}", 
+                   delta=f"{delta_val_acum:.2f}", delta_color=delta_color_ggr_acum)
+    
+    ac_col4.metric("Margem Lucro Acum. (%)", f"{casa_acum.margem_ggr:.2f}%")
+    
+    # Lucro médio por rodada
+    ac_col5.metric("Lucro Médio/Rodada", f"R$ {casa_acum.lucro_medio_por_rodada:.2f}")
+    
+    ac_col6.metric("Total Apostas Acum.", casa_acum.num_apostas)
+    
+    # Tendência recente: somas da janela móvel mantida pelo motor (não percorre o histórico)
+    recentes = casa_acum.recentes()
+    if recentes["rodadas"] > 0:
+        rec_col1, rec_col2, rec_col3, rec_col4 = st.columns(4)
+        rec_col1.metric(f"Lucro (últimas {recentes['rodadas']})", f"R$ {recentes['ggr']:.2f}")
+        rec_col2.metric(f"Margem (últimas {recentes['rodadas']})", f"{recentes['margem_ggr']:.2f}%",
+                        delta=f"{recentes['margem_ggr'] - casa_acum.margem_ggr:.2f} p.p. vs. acumulada")
+        rec_col3.metric(f"Apostas (últimas {recentes['rodadas']})", recentes["num_apostas"])
+        rec_col4.metric("Lucro Médio/Rodada (recente)", f"R$ {recentes['ggr'] / recentes['rodadas']:.2f}")
+    
+    # Ranking histórico mantido pelo motor na liquidação (não varre o histórico de apostas)
+    if len(sim.maiores_pagamentos.historico["valor_ganho"]) > 0:
+        st.markdown("#### 🏆 Maiores Pagamentos de Todas as Rodadas")
+        df_ranking = cache.obter(
+            "ranking_pagamentos", versao,
+            lambda: tabela_pagamentos(sim.maiores_pagamentos.historico, sim.usuarios.nomes,
+                                      sim.historico_jogos.descricoes(sim.rodada_atual), com_rodada=True))
+        st.dataframe(df_ranking, use_container_width=True, hide_index=True)
+    
+    # Gráficos Acumulados em Colunas
+    secao_graficos_evolucao(sim)
+
+    # Seletor de rodada e detalhes
+    secao_explorador_rodadas(sim)
+    secao_tabela_usuarios(sim)
+    secao_historico_usuario(sim)
+
+
+# --- Ensemble de Monte Carlo ---
+ensemble = st.session_state.get("resultado_ensemble")
+if ensemble is not None:
+    st.markdown("---")
+    st.header(f"🎲 Ensemble: {ensemble.num_replicacoes} Replicações de {ensemble.num_rodadas} Rodadas")
+    st.caption("Faixas por rodada: mediana, 50% centrais (p25–p75) e 90% centrais (p5–p95) das replicações. "
+               f"Sementes: {ensemble.sementes[0]}, {ensemble.sementes[1]}, ...")
+
+    resumo_ensemble = ensemble.resumo_final()
+    margens = resumo_ensemble["margem_ggr_acumulada"]
+    ruina_metade = ensemble.rodada_de_ruina(50)
+    ens_m1, ens_m2, ens_m3, ens_m4 = st.columns(4)
+    ens_m1.metric("Margem Lucro Final (mediana)", f"{margens.median():.2f}%",
+                  help=f"p5–p95: {margens.quantile(0.05):.2f}% a {margens.quantile(0.95):.2f}%")
+    ens_m2.metric("Replicações com Prejuízo", f"{(resumo_ensemble['lucro_acumulado'] < 0).mean() * 100:.1f}%")
+    ens_m3.metric("Falidos ao Final (mediana)", f"{resumo_ensemble['fracao_falidos'].median():.1f}%")
+    ens_m4.metric("Rodada com 50% Falidos (mediana)",
+                  f"{np.nanmedian(ruina_metade):.0f}" if not np.isnan(ruina_metade).all() else "—",
+                  help=f"Atingido em {np.count_nonzero(~np.isnan(ruina_metade))} de {ensemble.num_replicacoes} replicações")
+
+    def grafico_faixas(metrica, titulo, cor):
+        faixas = ensemble.quantis(metrica, QUANTIS_PADRAO)
+        x = faixas.index.tolist()
+        fig = go.Figure()
+        for inferior, superior, opacidade in (("p5", "p95", 0.15), ("p25", "p75", 0.3)):
+            fig.add_trace(go.Scatter(x=x, y=faixas[superior], mode='lines', line=dict(width=0),
+                                     showlegend=False, hoverinfo='skip'))
+            fig.add_trace(go.Scatter(x=x, y=faixas[inferior], mode='lines', line=dict(width=0), fill='tonexty',
+                                     fillcolor=f'rgba({cor}, {opacidade})', name=f"{inferior}–{superior}"))
+        fig.add_trace(go.Scatter(x=x, y=faixas["p50"], mode='lines', line=dict(color=f'rgb({cor})', width=2),
+                                 name="Mediana"))
+        fig.update_layout(title=titulo, xaxis_title="Rodada", height=400, hovermode="x unified")
+        st.plotly_chart(fig, use_container_width=True)
+
+    faixa_col1, faixa_col2 = st.columns(2)
+    with faixa_col1:
+        grafico_faixas("lucro_acumulado", "Lucro Acumulado", "0, 100, 0")
+    with faixa_col2:
+        grafico_faixas("saldo_medio", "Saldo Médio", "44, 160, 44")
+
+    st.markdown("#### Usuários Falidos por Perfil ao Final (%)")
+    colunas_falidos = [f"fracao_falidos_{p}" for p in LISTA_PERFIS]
+    df_falidos_perfil = resumo_ensemble[colunas_falidos].quantile(list(QUANTIS_PADRAO)).T
+    df_falidos_perfil.index = LISTA_PERFIS
+    df_falidos_perfil.columns = [f"p{round(q * 100)}" for q in QUANTIS_PADRAO]
+    st.dataframe(df_falidos_perfil.round(1), use_container_width=True)
@@ -0,0 +1,88 @@
+"""
+Execução da simulação pela linha de comando, sem Streamlit.
+
+Exemplo:
+    python simular_cli.py --usuarios 10000 --rodadas 500 --saida resultados/
+
+Grava em `--saida`:
+    config.json           configuração usada
+    historico_casa.csv    uma linha por rodada (campos de stats_rodada_casa)
+    usuarios.csv          estado final de cada usuário
+    apostas.csv           apostas das rodadas com detalhe (apenas com --salvar-apostas)
+"""
+import argparse
+import json
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from motor_simulacao import CONFIG_PADRAO, Simulacao, dataframe_apostas
+
+
+def criar_parser():
+    parser = argparse.ArgumentParser(description="Simulador da casa de apostas (modo sem interface).")
+    parser.add_argument("--usuarios", type=int, default=CONFIG_PADRAO["num_usuarios"], help="Número de usuários")
+    parser.add_argument("--saldo-inicial", type=float, default=CONFIG_PADRAO["saldo_inicial"], help="Saldo inicial por usuário (R$)")
+    parser.add_argument("--margem", type=float, default=CONFIG_PADRAO["margem_casa"] * 100, help="Margem da casa nas odds (%%)")
+    parser.add_argument("--jogos", type=int, default=CONFIG_PADRAO["num_jogos_por_rodada"], help="Jogos por rodada")
+    parser.add_argument("--rodadas", type=int, default=100, help="Número de rodadas a simular")
+    parser.add_argument("--semente", type=int, default=None, help="Semente da simulação (padrão: aleatória)")
+    parser.add_argument("--rodadas-com-detalhe", type=int, default=None,
+                        help="Guarda as apostas uma a uma só das últimas N rodadas (padrão: todas)")
+    parser.add_argument("--diretorio-dados", default=None,
+                        help="Grava apostas e saldos por rodada em arquivos mapeados neste diretório (históricos longos)")
+    parser.add_argument("--saida", type=Path, default=Path("resultados"), help="Diretório de saída")
+    parser.add_argument("--salvar-apostas", action="store_true", help="Também grava todas as apostas (pode ser grande)")
+    return parser
+
+
+def salvar_resultados(sim, saida, salvar_apostas=False):
+    """Grava a configuração, o histórico da casa, os usuários e (opcionalmente) as apostas em `saida`."""
+    saida.mkdir(parents=True, exist_ok=True)
+    with open(saida / "config.json", "w", encoding="utf-8") as f:
+        json.dump({**sim.config, "semente": sim.semente}, f, ensure_ascii=False, indent=2)
+
+    # Campos por perfil viram colunas (ex.: apostado_por_perfil_rodada.Conservador)
+    pd.json_normalize(sim.historico_casa).to_csv(saida / "historico_casa.csv", index=False)
+    sim.usuarios.para_dataframe().to_csv(saida / "usuarios.csv", index=False)
+
+    if salvar_apostas:
+        descricoes_jogos = [f"Jogo {j + 1}" for j in range(sim.config["num_jogos_por_rodada"])]
+        with open(saida / "apostas.csv", "w", encoding="utf-8", newline="") as f:
+            # Rodadas já resumidas (fora de --rodadas-com-detalhe) não têm mais as apostas
+            rodadas = sim.historico_apostas.rodadas_detalhadas
+            for rodada in rodadas:
+                apostas = sim.historico_apostas.rodada(rodada)
+                df = dataframe_apostas(apostas, sim.usuarios.nomes, descricoes_jogos)
+                df.insert(0, "rodada", np.full(len(df), rodada))
+                df.to_csv(f, index=False, header=(rodada == rodadas[0]))
+
+
+def main(argv=None):
+    args = criar_parser().parse_args(argv)
+    sim = Simulacao({
+        "num_usuarios": args.usuarios,
+        "saldo_inicial": args.saldo_inicial,
+        "margem_casa": args.margem / 100.0,
+        "num_jogos_por_rodada": args.jogos,
+        "rodadas_com_detalhe": args.rodadas_com_detalhe,
+        "diretorio_dados": args.diretorio_dados,
+    }, semente=args.semente)
+
+    inicio = time.perf_counter()
+    sim.avancar(args.rodadas)
+    duracao = time.perf_counter() - inicio
+
+    salvar_resultados(sim, args.saida, args.salvar_apostas)
+    sim.fechar()  # Arquivos de --diretorio-dados ficam no disco
+    acumuladas = sim.casa_stats_acumuladas
+    print(f"{args.rodadas} rodadas com {args.usuarios} usuários em {duracao:.2f}s (semente {sim.semente})")
+    print(f"Lucro acumulado: R$ {acumuladas.ggr:.2f} ({acumuladas.margem_ggr:.2f}% do faturamento)")
+    print(f"Usuários falidos: {sim.usuarios.usuarios_zerados()} de {len(sim.usuarios)}")
+    print(f"Resultados gravados em {args.saida}/")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+"""
+Verificação do agendador compartilhado (agendador.AgendadorSimulacoes) com várias sessões concorrentes.
+
+Cada sessão roda na sua thread, como as sessões do Streamlit, e submete trabalhos
+curtos ao mesmo agendador. Confere que:
+  - cada resultado volta para a sessão que o pediu e nunca rodam mais trabalhos
+    ao mesmo tempo que o limite de processos;
+  - a divisão justa não deixa as sessões leves esperando a fila inteira da pesada;
+  - cancelamento, tempo limite e limite de fila por sessão (FilaCheia) funcionam;
+  - simulações de verdade dão o mesmo resultado em sessões diferentes;
+  - o avanço rápido em trechos (execucao_fundo.ExecucaoEmFundo com agendador) de
+    várias sessões ao mesmo tempo chega ao mesmo resultado que `avancar` direto;
+  - um trabalho que não serializa, ou um processo que morreu parado, só faz
+    aquele trabalho falhar: o agendador continua atendendo as filas.
+Um erro interrompe a verificação com AssertionError.
+
+Uso:
+    python verificar_agendador.py
+"""
+import itertools
+import os
+import threading
+import time
+from concurrent.futures import CancelledError
+
+from agendador import AgendadorSimulacoes, FilaCheia
+from execucao_fundo import CANCELADA, CONCLUIDA, ExecucaoEmFundo
+
+MAX_PROCESSOS = 3
+
+
+def tarefa_espera(sessao, indice, duracao):
+    """Espera `duracao` s e devolve quem a pediu, com os horários de início e fim."""
+    inicio = time.time()
+    time.sleep(duracao)
+    return {"sessao": sessao, "indice": indice, "inicio": inicio, "fim": time.time(), "pid": os.getpid()}
+
+
+def simulacao_curta(sessao, indice, semente):
+    """Trabalho com a simulação de verdade (como uma replicação do ensemble)."""
+    from motor_simulacao import Simulacao
+    sim = Simulacao({"num_usuarios": 1000, "rodadas_com_detalhe": 1}, semente=semente)
+    sim.avancar(30)
+    return {"sessao": sessao, "indice": indice, "ggr": sim.casa_stats_acumuladas.ggr}
+
+
+def tarefa_que_derruba_o_processo(atraso):
+    """Responde e, `atraso` s depois, encerra o próprio processo (que fica parado, com o pipe quebrado)."""
+    threading.Timer(atraso, os._exit, args=(1,)).start()
+    return os.getpid()
+
+
+def verificar_sessoes_concorrentes(agendador):
+    resultados = {}
+
+    def sessao(nome, num_trabalhos, duracao, atraso=0.0, cancelar_depois=None, timeout=None):
+        time.sleep(atraso)
+        trabalhos = [agendador.submeter(nome, tarefa_espera, nome, i, duracao, timeout=timeout)
+                     for i in range(num_trabalhos)]
+        posicoes = [agendador.posicao(t) for t in trabalhos]
+        if cancelar_depois is not None:
+            time.sleep(cancelar_depois)
+            agendador.cancelar_sessao(nome)
+        recebidos = []
+        for trabalho in agendador.concluidos(trabalhos):
+            try:
+                recebidos.append(trabalho.resultado())
+            except (CancelledError, TimeoutError) as erro:
+                recebidos.append(type(erro).__name__)
+        resultados[nome] = {"trabalhos": trabalhos, "recebidos": recebidos, "posicoes": posicoes}
+
+    cenario = [
+        ("pesada", dict(num_trabalhos=12, duracao=0.3)),
+        ("leve-1", dict(num_trabalhos=2, duracao=0.3, atraso=0.2)),
+        ("leve-2", dict(num_trabalhos=2, duracao=0.3, atraso=0.25)),
+        ("desiste", dict(num_trabalhos=6, duracao=0.3, atraso=0.1, cancelar_depois=0.5)),
+        ("lenta", dict(num_trabalhos=2, duracao=5.0, atraso=0.3, timeout=0.6)),
+    ] + [(f"sessao-{i}", dict(num_trabalhos=1, duracao=0.1, atraso=0.05 * i)) for i in range(8)]
+
+    inicio = time.time()
+    threads = [threading.Thread(target=sessao, args=(nome,), kwargs=kw) for nome, kw in cenario]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    print(f"{len(cenario)} sessões em {time.time() - inicio:.1f} s com {MAX_PROCESSOS} processos")
+
+    # Cada resultado voltou para a sessão que o pediu
+    for nome, r in resultados.items():
+        for recebido in r["recebidos"]:
+            assert not isinstance(recebido, dict) or recebido["sessao"] == nome, (nome, recebido)
+    assert all(isinstance(x, dict) for x in resultados["pesada"]["recebidos"])
+
+    # Nunca mais de MAX_PROCESSOS trabalhos ao mesmo tempo
+    execucoes = [x for r in resultados.values() for x in r["recebidos"] if isinstance(x, dict)]
+    eventos = sorted([(x["inicio"], 1) for x in execucoes] + [(x["fim"], -1) for x in execucoes])
+    simultaneos = max(itertools.accumulate(delta for _, delta in eventos))
+    assert simultaneos <= MAX_PROCESSOS, simultaneos
+    print("máximo simultâneo:", simultaneos, "| processos distintos:", len({x["pid"] for x in execucoes}))
+
+    # Divisão justa: as sessões leves não esperam a fila inteira da pesada
+    ultimo_pesada = max(t.iniciado_em for t in resultados["pesada"]["trabalhos"])
+    for nome in ("leve-1", "leve-2"):
+        assert all(t.iniciado_em < ultimo_pesada for t in resultados[nome]["trabalhos"]), nome
+    print("posições ao submeter (leve-1):", resultados["leve-1"]["posicoes"],
+          "| pesada:", resultados["pesada"]["posicoes"][:4], "...")
+
+    # Cancelamento e tempo limite
+    estados = [t.estado for t in resultados["desiste"]["trabalhos"]]
+    assert "cancelado" in estados and set(estados) <= {"concluido", "cancelado"}, estados
+    assert [t.estado for t in resultados["lenta"]["trabalhos"]] == ["expirado", "expirado"]
+    print("desiste:", estados, "| lenta:", resultados["lenta"]["recebidos"])
+
+
+def verificar_fila_cheia(agendador):
+    """Passando de `max_na_fila_por_sessao` trabalhos esperando, `submeter` recusa; as outras sessões não."""
+    trabalhos = []
+    try:
+        for i in range(agendador.max_na_fila_por_sessao + MAX_PROCESSOS + 1):
+            trabalhos.append(agendador.submeter("enche", tarefa_espera, "enche", i, 0.05))
+        raise AssertionError("a fila da sessão deveria encher")
+    except FilaCheia as erro:
+        print("fila cheia:", erro)
+    outra = agendador.submeter("outra", tarefa_espera, "outra", 0, 0.05)
+    agendador.cancelar(*trabalhos)
+    assert outra.resultado(timeout=30)["sessao"] == "outra"
+
+
+def verificar_simulacao(agendador):
+    """Simulações de verdade de duas sessões, com a mesma semente: mesmo resultado."""
+    pares = [agendador.submeter(s, simulacao_curta, s, 0, 42) for s in ("a", "b")]
+    ggr = [t.resultado()["ggr"] for t in pares]
+    assert ggr[0] == ggr[1] and [t.resultado()["sessao"] for t in pares] == ["a", "b"]
+    print("simulação via agendador ok, GGR", round(ggr[0], 2))
+
+
+def verificar_avanco_em_trechos():
+    """
+    Avanços rápidos de várias sessões dividem os processos e dão o mesmo resultado que `avancar` direto.
+    O agendador é como o do app: processos sem o __main__ (os trechos são funções de execucao_fundo.py).
+    """
+    from motor_simulacao import Simulacao
+    agendador = AgendadorSimulacoes(max_processos=MAX_PROCESSOS, importar_main=False)
+    config = {"num_usuarios": 1000, "rodadas_com_detalhe": 50}
+    direta = Simulacao(config, semente=7)
+    direta.avancar(1200)
+    execucoes = [ExecucaoEmFundo(Simulacao(config, semente=7), 1200, agendador=agendador, sessao=f"avanco-{i}")
+                 for i in range(MAX_PROCESSOS + 1)]
+    cancelada = ExecucaoEmFundo(Simulacao(config, semente=7), 100_000, agendador=agendador, sessao="avanco-cancelado")
+    while any(e.ativa for e in execucoes):
+        time.sleep(0.1)
+    cancelada.cancelar()
+    for execucao in execucoes:
+        assert execucao.estado == CONCLUIDA, (execucao.estado, execucao.erro)
+        assert execucao.sim.casa_stats_acumuladas.ggr == direta.casa_stats_acumuladas.ggr
+    assert cancelada.estado == CANCELADA and cancelada.sim.rodada_atual == cancelada.rodadas_feitas
+    print(f"avanço em trechos ok: {len(execucoes)} sessões, cancelado na rodada {cancelada.sim.rodada_atual}")
+    agendador.encerrar()
+
+
+def verificar_nao_serializavel(agendador):
+    """Trabalho que não serializa: só ele falha, e o agendador segue atendendo as outras sessões."""
+    invalido = agendador.submeter("nao-serializa", lambda: 1)
+    valido = agendador.submeter("depois", tarefa_espera, "depois", 0, 0.1)
+    try:
+        invalido.resultado(timeout=10)
+        raise AssertionError("lambda não deveria serializar")
+    except Exception as erro:
+        assert invalido.estado == "erro", (invalido.estado, erro)
+        print("não serializável:", type(erro).__name__)
+    assert valido.resultado(timeout=10)["sessao"] == "depois"
+
+
+def verificar_processo_morto():
+    """Processo que morre parado: o envio seguinte falha só para aquele trabalho e o processo é substituído."""
+    agendador = AgendadorSimulacoes(max_processos=1)
+    pid = agendador.submeter("x", tarefa_que_derruba_o_processo, 0.2).resultado(timeout=30)
+    time.sleep(1.0)
+    perdido = agendador.submeter("x", tarefa_espera, "x", 0, 0.1)
+    try:
+        perdido.resultado(timeout=10)
+        raise AssertionError("o envio para o processo morto deveria falhar")
+    except RuntimeError as erro:
+        print("processo morto:", erro)
+    substituto = agendador.submeter("x", tarefa_espera, "x", 1, 0.1).resultado(timeout=30)
+    assert substituto["pid"] != pid
+    agendador.encerrar()
+
+
+if __name__ == "__main__":
+    agendador = AgendadorSimulacoes(max_processos=MAX_PROCESSOS, max_na_fila_por_sessao=30)
+    verificar_sessoes_concorrentes(agendador)
+    verificar_fila_cheia(agendador)
+    verificar_simulacao(agendador)
+    verificar_nao_serializavel(agendador)
+    time.sleep(0.5)  # Trabalhos cancelados em execução: o despachante encerra os processos e esquece as sessões
+    assert not agendador.sessoes, agendador.sessoes  # Sessões ociosas esquecidas
+    agendador.encerrar()
+    verificar_processo_morto()
+    verificar_avanco_em_trechos()
+    print("ok")
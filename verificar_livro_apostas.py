@@ -0,0 +1,115 @@
+"""
+Verificação do índice por usuário do LivroApostas (motor_simulacao.LivroApostas.apostas_do_usuario).
+
+Registra rodadas sintéticas, com rodadas sem nenhuma aposta no meio, e compara as
+apostas de cada usuário devolvidas pelo índice com um filtro direto por
+`id_usuario` nas rodadas detalhadas. Roda com e sem retenção de detalhe e com os
+blocos em memória e em disco. No fim, faz o mesmo numa Simulacao pequena, onde
+rodadas sem apostas acontecem de verdade. Sai com código 1 se alguma busca divergir.
+
+Uso:
+    python verificar_livro_apostas.py
+    python verificar_livro_apostas.py --rodadas 300 --usuarios 50
+"""
+import argparse
+import sys
+import tempfile
+
+import numpy as np
+
+from motor_simulacao import COLUNAS_APOSTAS, LivroApostas, Simulacao
+
+NUM_JOGOS = 10
+
+
+def gerar_rodada(num_usuarios, rng, vazia):
+    """Colunas de uma rodada fora de ordem de usuário (o livro ordena); `vazia` = nenhuma aposta."""
+    num_apostas = 0 if vazia else int(rng.integers(1, 3 * num_usuarios))
+    return {
+        "id_usuario": rng.integers(0, num_usuarios, num_apostas),
+        "perfil": rng.integers(0, 3, num_apostas),
+        "id_jogo": rng.integers(0, NUM_JOGOS, num_apostas),
+        "idx_resultado_apostado": rng.integers(0, 3, num_apostas),
+        "valor_apostado": rng.uniform(1, 50, num_apostas),
+        "odd_no_momento": rng.uniform(1.1, 8, num_apostas),
+        "valor_ganho": rng.uniform(0, 100, num_apostas),
+        "ganhou": rng.random(num_apostas) < 0.4,
+    }
+
+
+def por_forca_bruta(rodadas, primeira_detalhada, id_usuario):
+    """Apostas de `id_usuario` filtrando cada rodada detalhada (ordem estável, como o livro guarda)."""
+    partes = []
+    for rodada, apostas in enumerate(rodadas, start=1):
+        if rodada < primeira_detalhada:
+            continue
+        ordem = np.argsort(apostas["id_usuario"], kind="stable")
+        mascara = apostas["id_usuario"][ordem] == id_usuario
+        parte = {col: np.asarray(apostas[col], dtype=tipo)[ordem][mascara] for col, tipo in COLUNAS_APOSTAS.items()}
+        parte["rodada"] = np.full(np.count_nonzero(mascara), rodada, dtype=np.int32)
+        partes.append(parte)
+    tipos = dict(COLUNAS_APOSTAS, rodada=np.int32)
+    return {col: np.concatenate([p[col] for p in partes]) if partes else np.zeros(0, dtype=tipo)
+            for col, tipo in tipos.items()}
+
+
+def divergencias(livro, rodadas, num_usuarios):
+    """Usuários cujas apostas pelo índice diferem do filtro direto (ou cuja busca falha)."""
+    errados = []
+    for id_usuario in range(num_usuarios + 1):  # +1: usuário que nunca apostou
+        esperado = por_forca_bruta(rodadas, livro.primeira_detalhada, id_usuario)
+        try:
+            obtido = livro.apostas_do_usuario(id_usuario)
+        except ValueError:  # Trechos inconsistentes (ex.: fim antes do início) quebram o np.repeat
+            errados.append(id_usuario)
+            continue
+        if any(not np.array_equal(obtido[col], esperado[col]) for col in esperado):
+            errados.append(id_usuario)
+    return errados
+
+
+def verificar_sintetico(num_rodadas, num_usuarios, rodadas_com_detalhe, em_disco, rng):
+    with tempfile.TemporaryDirectory() as diretorio:
+        livro = LivroApostas(rodadas_com_detalhe, NUM_JOGOS, diretorio=diretorio if em_disco else None)
+        rodadas = []
+        errados = set()
+        for rodada in range(1, num_rodadas + 1):
+            vazia = rodada % 7 == 3 or rng.random() < 0.1
+            rodadas.append(gerar_rodada(num_usuarios, rng, vazia))
+            livro.registrar_rodada(rodada, rodadas[-1])
+            # Confere antes e depois de cada fusão do índice (trechos pendentes e fundidos)
+            if rodada % 5 == 0 or rodada == num_rodadas:
+                errados.update(divergencias(livro, rodadas, num_usuarios))
+        vazias = sum(len(r["id_usuario"]) == 0 for r in rodadas)
+        ok = not errados
+        print(f"sintético, detalhe={rodadas_com_detalhe}, {'disco' if em_disco else 'memória'}: "
+              f"{num_rodadas} rodadas ({vazias} sem apostas)  "
+              f"{'ok' if ok else f'DIVERGE para os usuários {sorted(errados)[:10]}'}")
+        return ok
+
+
+def verificar_simulacao(num_rodadas, semente):
+    """Simulação com poucos usuários: rodadas sem apostas aparecem naturalmente."""
+    sim = Simulacao({"num_usuarios": 3, "rodadas_com_detalhe": None}, semente=semente)
+    sim.avancar(num_rodadas)
+    livro = sim.historico_apostas
+    rodadas = [livro.rodada(r) for r in livro.rodadas]
+    vazias = sum(len(r["id_usuario"]) == 0 for r in rodadas)
+    errados = divergencias(livro, rodadas, len(sim.usuarios))
+    ok = not errados
+    print(f"simulação, 3 usuários: {num_rodadas} rodadas ({vazias} sem apostas)  "
+          f"{'ok' if ok else f'DIVERGE para os usuários {errados}'}")
+    return ok
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rodadas", type=int, default=120)
+    parser.add_argument("--usuarios", type=int, default=20)
+    parser.add_argument("--semente", type=int, default=0)
+    args = parser.parse_args()
+    rng = np.random.default_rng(args.semente)
+    resultados = [verificar_sintetico(args.rodadas, args.usuarios, detalhe, em_disco, rng)
+                  for detalhe in (None, 10) for em_disco in (False, True)]
+    resultados.append(verificar_simulacao(args.rodadas, args.semente))
+    sys.exit(0 if all(resultados) else 1)
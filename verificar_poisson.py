@@ -0,0 +1,126 @@
+"""
+Verificação estatística da Poisson truncada em 1 em lote (motor_simulacao.poisson_truncada_em_1_lote).
+
+Para cada λ, compara as amostras da versão em lote com:
+  - a pmf exata da Poisson truncada em 1 (qui-quadrado de aderência);
+  - o laço de rejeição do sim1.py original (qui-quadrado de homogeneidade).
+As categorias com contagem esperada pequena são juntadas na cauda. Sai com código 1
+se algum teste rejeitar ao nível --alfa.
+
+Uso:
+    python verificar_poisson.py
+    python verificar_poisson.py --amostras 500000 --lambdas 0.5 3.5 7 50 800
+"""
+import argparse
+import math
+import sys
+
+import numpy as np
+
+from motor_simulacao import poisson_truncada_em_1_lote
+
+ESPERADO_MINIMO = 5  # Contagem esperada mínima por categoria do qui-quadrado
+
+
+def poisson_truncada_em_1_rejeicao(lambda_param, rng):
+    """Laço de rejeição do sim1.py original (com um Generator no lugar do np.random global)."""
+    while True:
+        valor = rng.poisson(lambda_param)
+        if valor >= 1:
+            return valor
+
+
+def pmf_truncada(k, lambda_param):
+    """P(K = k) da Poisson truncada em 1, em escala log (vale para λ grande)."""
+    k = np.asarray(k, dtype=float)
+    log_pmf = (k * math.log(lambda_param) - lambda_param - np.vectorize(math.lgamma)(k + 1)
+               - math.log1p(-math.exp(-lambda_param)))
+    return np.exp(log_pmf)
+
+
+def p_valor_qui_quadrado(estatistica, graus):
+    """P(X² >= estatistica) com `graus` graus de liberdade (função gama incompleta regularizada Q)."""
+    a, x = graus / 2, estatistica / 2
+    if x <= 0:
+        return 1.0
+    if x < a + 1:  # Série de P(a, x)
+        termo = soma = 1 / a
+        n = a
+        while abs(termo) > abs(soma) * 1e-15:
+            n += 1
+            termo *= x / n
+            soma += termo
+        return 1 - soma * math.exp(-x + a * math.log(x) - math.lgamma(a))
+    # Fração contínua de Q(a, x) (Lentz)
+    minimo = 1e-300
+    b = x + 1 - a
+    c, d = 1 / minimo, 1 / b
+    h = d
+    for i in range(1, 1000):
+        an = -i * (i - a)
+        b += 2
+        d = an * d + b
+        d = minimo if abs(d) < minimo else d
+        c = b + an / c
+        c = minimo if abs(c) < minimo else c
+        d = 1 / d
+        h *= d * c
+        if abs(d * c - 1) < 1e-15:
+            break
+    return math.exp(-x + a * math.log(x) - math.lgamma(a)) * h
+
+
+def categorias(lambda_param, num_amostras):
+    """Bordas [k_min, k_max] com contagem esperada >= ESPERADO_MINIMO; o resto vai para as pontas."""
+    centro = max(1, int(lambda_param))
+    largura = int(10 * math.sqrt(lambda_param) + 10)
+    ks = np.arange(max(1, centro - largura), centro + largura + 1)
+    bons = ks[pmf_truncada(ks, lambda_param) * num_amostras >= ESPERADO_MINIMO]
+    return int(bons.min()), int(bons.max())
+
+
+def contar(amostras, k_min, k_max):
+    """Contagens por categoria: (<= k_min), k_min+1, ..., (>= k_max)."""
+    return np.bincount(np.clip(amostras, k_min, k_max) - k_min, minlength=k_max - k_min + 1)
+
+
+def verificar(lambda_param, num_amostras, alfa, rng):
+    lote = poisson_truncada_em_1_lote(np.full(num_amostras, lambda_param), rng)
+    rejeicao = np.array([poisson_truncada_em_1_rejeicao(lambda_param, rng) for _ in range(num_amostras)])
+    assert lote.min() >= 1, "amostra < 1"
+
+    k_min, k_max = categorias(lambda_param, num_amostras)
+    probs = pmf_truncada(np.arange(k_min, k_max + 1), lambda_param)
+    probs[0] = pmf_truncada(np.arange(1, k_min + 1), lambda_param).sum()
+    probs[-1] = 1 - probs[:-1].sum()
+
+    # Aderência à pmf exata
+    observados = contar(lote, k_min, k_max)
+    esperados = probs * num_amostras
+    graus = len(observados) - 1
+    p_aderencia = (p_valor_qui_quadrado(float(((observados - esperados) ** 2 / esperados).sum()), graus)
+                   if graus else 1.0)
+
+    # Homogeneidade contra a rejeição antiga (tabela 2 × categorias)
+    tabela = np.vstack([observados, contar(rejeicao, k_min, k_max)])
+    esperados = tabela.sum(axis=1, keepdims=True) * tabela.sum(axis=0) / tabela.sum()
+    p_homogeneidade = (p_valor_qui_quadrado(float(((tabela - esperados) ** 2 / esperados).sum()), graus)
+                       if graus else 1.0)
+
+    ok = p_aderencia >= alfa and p_homogeneidade >= alfa
+    print(f"λ = {lambda_param:>6g}: {graus + 1:>3} categorias  |  média lote {lote.mean():8.3f}, "
+          f"rejeição {rejeicao.mean():8.3f}  |  p aderência {p_aderencia:.3f}, "
+          f"p homogeneidade {p_homogeneidade:.3f}  {'ok' if ok else 'REJEITA'}")
+    return ok
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--lambdas", type=float, nargs="+", default=[0.5, 3.5, 7, 50, 800])
+    parser.add_argument("--amostras", type=int, default=200_000, help="amostras por λ (padrão: 200 mil)")
+    parser.add_argument("--alfa", type=float, default=0.001, help="nível de significância (padrão: 0.001)")
+    parser.add_argument("--semente", type=int, default=0)
+    args = parser.parse_args()
+    rng = np.random.default_rng(args.semente)
+    resultados = [verificar(lambda_param, args.amostras, args.alfa, rng) for lambda_param in args.lambdas]
+    sys.exit(0 if all(resultados) else 1)
@@ -1,7 +1,10 @@
 import streamlit as st
 import numpy as np
 import pandas as pd
-import random
+from motor_simulacao import (
+    RESULTADOS_POSSIVEIS, FluxosAleatorios,
+    calcular_odds_casa_lote, gerar_probabilidades_futebol_lote, sortear_resultados_jogos
+)
 
 # --- Configurações e Constantes ---
 SALDO_INICIAL = 100.0
@@ -18,64 +21,23 @@ TIMES_BRASILEIROS = [
 
 # --- Funções Auxiliares ---
 
-def gerar_probabilidades_futebol():
-    """Gera probabilidades para jogos de futebol (Vitória, Empate, Derrota)"""
-    prob_vitoria = round(random.uniform(0.05, 0.70), 2)
-    prob_empate = round(random.uniform(0.10, 0.25), 2)
-    prob_derrota = round(1.0 - prob_vitoria - prob_empate, 2)
-    
-    if prob_derrota < 0:
-        prob_empate = round(1.0 - prob_vitoria, 2)
-        prob_derrota = 0.0
-    
-    total = prob_vitoria + prob_empate + prob_derrota
-    if total != 1.0:
-        prob_derrota = round(1.0 - prob_vitoria - prob_empate, 2)
-    
-    return [prob_vitoria, prob_empate, prob_derrota]
-
-def calcular_odds_casa(probabilidades_reais, margem_casa=0.05):
-    """Calcula as odds da casa com margem"""
-    final_odds = []
-    for p_real in probabilidades_reais:
-        if p_real == 0:
-            final_odds.append(999.0)
-        else:
-            fair_odd = 1 / p_real
-            house_odd = round(fair_odd * (1 - margem_casa), 2)
-            final_odds.append(max(1.01, house_odd))
-    return final_odds
-
-def simular_resultado_jogo(probabilidades_reais):
-    """Simula o resultado de um jogo baseado nas probabilidades"""
-    resultados = ["Vitória", "Empate", "Derrota"]
-    return np.random.choice(resultados, p=probabilidades_reais)
+def gerar_jogos_rodada(rng, num_jogos=6, margem_casa=0.05):
+    """Gera os jogos da rodada (6 por padrão) com times brasileiros"""
+    # Times sorteados sem reposição: nenhum time joga duas vezes na rodada
+    times = rng.choice(len(TIMES_BRASILEIROS), size=2 * num_jogos, replace=False)
+    probabilidades = gerar_probabilidades_futebol_lote(num_jogos, rng)
+    odds = calcular_odds_casa_lote(probabilidades, margem_casa)
 
-def gerar_jogos_rodada():
-    """Gera 6 jogos para a rodada com times brasileiros"""
     jogos = []
-    times_usados = []
-    
-    for i in range(6):
-        # Selecionar dois times diferentes que ainda não foram usados
-        times_disponiveis = [t for t in TIMES_BRASILEIROS if t not in times_usados]
-        time_casa = random.choice(times_disponiveis)
-        times_disponiveis.remove(time_casa)
-        time_fora = random.choice(times_disponiveis)
-        
-        times_usados.extend([time_casa, time_fora])
-        
-        probabilidades = gerar_probabilidades_futebol()
-        odds = calcular_odds_casa(probabilidades)
-        
+    for i in range(num_jogos):
         jogos.append({
             "id": i,
-            "time_casa": time_casa,
-            "time_fora": time_fora,
-            "probabilidades": probabilidades,
-            "odds_vitoria": odds[0],
-            "odds_empate": odds[1],
-            "odds_derrota": odds[2],
+            "time_casa": TIMES_BRASILEIROS[times[2 * i]],
+            "time_fora": TIMES_BRASILEIROS[times[2 * i + 1]],
+            "probabilidades": probabilidades[i].tolist(),
+            "odds_vitoria": float(odds[i, 0]),
+            "odds_empate": float(odds[i, 1]),
+            "odds_derrota": float(odds[i, 2]),
             "resultado": None  # Será definido quando calcular
         })
     
@@ -91,6 +53,8 @@ if 'voce_aposta_iniciado' not in st.session_state:
     st.session_state.historico_rodadas = []
     st.session_state.rodada_atual = 0
     st.session_state.aguardando_resultado = False
+    # Uma semente por jogo: jogos e resultados de cada rodada vêm de geradores próprios
+    st.session_state.fluxos_voce_aposta = FluxosAleatorios()
 
 # --- Interface Principal ---
 st.title("🎲 Você Aposta!")
@@ -109,7 +73,7 @@ with st.sidebar:
         # Estado inicial - mostrar botão de começar
         if st.button("🎮 Começar a Jogar", type="primary", use_container_width=True):
             st.session_state.voce_aposta_iniciado = True
-            st.session_state.jogos_atual = gerar_jogos_rodada()
+            st.session_state.jogos_atual = gerar_jogos_rodada(st.session_state.fluxos_voce_aposta.jogos(st.session_state.rodada_atual + 1))
             st.session_state.apostas_jogador = {}
             st.session_state.apostas_selecionadas = {}
             st.session_state.rodada_atual += 1
@@ -120,7 +84,7 @@ with st.sidebar:
         # Estado vendo resultados - mostrar botão de próxima rodada
         if st.session_state.saldo_jogador >= VALOR_APOSTA_MINIMA:
             if st.button("⚽ Próxima Rodada", type="primary", use_container_width=True):
-                st.session_state.jogos_atual = gerar_jogos_rodada()
+                st.session_state.jogos_atual = gerar_jogos_rodada(st.session_state.fluxos_voce_aposta.jogos(st.session_state.rodada_atual + 1))
                 st.session_state.apostas_jogador = {}
                 st.session_state.apostas_selecionadas = {}
                 st.session_state.rodada_atual += 1
@@ -142,9 +106,11 @@ with st.sidebar:
             total_apostado = sum(float(valor) for valor in st.session_state.apostas_jogador.values())
             resultados_detalhados = []
             
-            for jogo in st.session_state.jogos_atual:
-                resultado = simular_resultado_jogo(jogo["probabilidades"])
-                jogo["resultado"] = resultado
+            probabilidades = np.array([jogo["probabilidades"] for jogo in st.session_state.jogos_atual])
+            idx_resultados = sortear_resultados_jogos(
+                probabilidades, st.session_state.fluxos_voce_aposta.resultados(st.session_state.rodada_atual))
+            for jogo, idx_resultado in zip(st.session_state.jogos_atual, idx_resultados):
+                jogo["resultado"] = RESULTADOS_POSSIVEIS[idx_resultado]
             
             # Criar resultados para TODOS os jogos (apostados ou não)
             for jogo in st.session_state.jogos_atual:
@@ -219,6 +185,7 @@ with st.sidebar:
     # Botão de resetar sempre disponível quando o jogo estiver iniciado
     if st.session_state.voce_aposta_iniciado:
         st.divider()
+        st.caption(f"🎲 Semente do jogo: `{st.session_state.fluxos_voce_aposta.semente}`")
         if st.button("🔄 Resetar Jogo", use_container_width=True):
             st.session_state.voce_aposta_iniciado = False
             st.session_state.saldo_jogador = SALDO_INICIAL
@@ -228,6 +195,7 @@ with st.sidebar:
             st.session_state.historico_rodadas = []
             st.session_state.rodada_atual = 0
             st.session_state.aguardando_resultado = False
+            st.session_state.fluxos_voce_aposta = FluxosAleatorios()
             st.rerun()
 
 # --- Métricas do Cabeçalho ---